@@ -1,4 +1,7 @@
-from mlx_lm import load, generate
+from backends import SamplingParams, get_backend
+from prompt_budget import dedupe_assert_shapes, fit_prompt, strip_test_noise
+from profiling import set_task, stage
+from testgen_stream import assert_keys, stream_summary, stream_tests
 
 import importlib.util, json, re, types
 from pathlib import Path
@@ -8,7 +11,7 @@ from datasets import load_dataset
 # MODEL_ID = "mlx-community/gemma-2-2b-it-4bit"
 MODEL_ID = "mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit"
 
-model, tokenizer = load(MODEL_ID)
+backend = get_backend(MODEL_ID)
 
 
 
@@ -17,6 +20,16 @@ model, tokenizer = load(MODEL_ID)
 
 
 def make_prompt(assertions, existing_tests):
+    """Spec-driven test prompt; existing tests are de-noised and fit to the prompt token budget."""
+    def render(existing_tests):
+        return _render_prompt(assertions, existing_tests)
+
+    return fit_prompt(render, {"existing_tests": existing_tests}, backend.count_tokens, "test-gen prompt",
+                      always={"existing_tests": [strip_test_noise]},
+                      lossy={"existing_tests": [dedupe_assert_shapes]})
+
+
+def _render_prompt(assertions, existing_tests):
     prompt = f'''
 You are an expert Python software tester specializing in coverage-driven test generation.
 
@@ -90,7 +103,7 @@ Provide ONLY the new Pytest test function definitions and NOTHING ELSE.
 
     '''.strip()
 
-    prompt_2 = '''
+    prompt_2 = f'''
 
 You are an expert Python software tester specializing in coverage-driven test generation.
 
@@ -179,7 +192,7 @@ Existing Tests:
 Provide ONLY the new Pytest test function definitions and NOTHING ELSE.
     '''.strip()
     messages = [{"role": "user", "content": prompt_2}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    return backend.apply_chat_template(messages)
 
 
 
@@ -237,15 +250,20 @@ assert all(
 }
 
 existing_test = [TESTS['HumanEval/20'], TESTS['HumanEval/10']]
-prompt = make_prompt(assertions_correct["HumanEval/10"], existing_test[1])
+set_task("HumanEval/10")
+with stage("prompt"):
+    prompt = make_prompt(assertions_correct["HumanEval/10"], existing_test[1])
 
 
-tests = generate(
-            model,
-            tokenizer,
-            prompt=prompt,
-            max_tokens=300,
-        ).strip()
+NEW_TESTS = 8           # stop generating once this many new tests have arrived
+entry_point = {ex["task_id"]: ex["entry_point"] for ex in dataset}["HumanEval/10"]
+with stage("decode"):
+    tests = "\n\n".join(stream_tests(
+                backend, prompt, NEW_TESTS,
+                SamplingParams(max_tokens=300, temperature=0.0),  # mlx_lm.generate default: greedy
+                seen=assert_keys(existing_test[1], {"candidate": entry_point}),
+            ))
 
 
-print(tests)
\ No newline at end of file
+print(tests)
+print(f"🧪 {stream_summary()}")
\ No newline at end of file
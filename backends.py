@@ -0,0 +1,394 @@
+import hashlib, json, os, queue, re, threading, time
+from dataclasses import dataclass, field
+from http.client import HTTPConnection
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+from urllib.parse import urlparse
+
+
+# --------- SAMPLING & COUNTERS ----------
+@dataclass
+class SamplingParams:
+    """
+    Sampling knobs shared by every backend, with the same meaning everywhere:
+    - temperature 0 means greedy decoding,
+    - top_p is nucleus sampling (1.0 disables it),
+    - seed makes a sampled generation reproducible,
+    - max_tokens caps generated tokens, stop strings cut the text (the stop string is dropped).
+    """
+    max_tokens: int = 2024
+    temperature: float = 0.2
+    top_p: float = 0.95
+    seed: Optional[int] = None
+    stop: List[str] = field(default_factory=list)
+
+    def key(self) -> str:
+        return json.dumps(self.__dict__, sort_keys=True)
+
+
+@dataclass
+class GenStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.completion_tokens / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.requests} requests | prompt {self.prompt_tokens} tok | "
+                f"generated {self.completion_tokens} tok | {self.seconds:.1f}s | "
+                f"{self.tokens_per_second:.1f} tok/s")
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _plain_chat_template(messages: Sequence[Dict[str, str]]) -> str:
+    parts = [f"<|{m['role']}|>\n{m['content']}" for m in messages]
+    return "\n".join(parts) + "\n<|assistant|>\n"
+
+
+# --------- BASE ----------
+class Backend:
+    """
+    A text generation engine. Subclasses implement `_stream` (yield text pieces) and may
+    override `count_tokens` / `apply_chat_template`; timing, stop strings, token counting
+    and record mode (COT_RECORD=<jsonl>) are shared here so every backend reports alike.
+    """
+    name = "base"
+    supports_logits_processors = False
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self.stats = GenStats()
+        self._lock = threading.Lock()
+        self._record_path = os.environ.get("COT_RECORD")
+
+    # tokenizer-facing helpers
+    def apply_chat_template(self, messages: Sequence[Dict[str, str]]) -> str:
+        return _plain_chat_template(messages)
+
+    def count_tokens(self, text: str) -> int:
+        return max(1, len(text) // 4) if text else 0
+
+    # generation
+    def _stream(self, prompt: str, params: SamplingParams,
+                logits_processors: Optional[list] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, params: Optional[SamplingParams] = None,
+               logits_processors: Optional[list] = None) -> Iterator[str]:
+        """Yield generated text pieces as they arrive; counters are updated when the stream ends."""
+        params = params or SamplingParams()
+        if logits_processors and not self.supports_logits_processors:
+            logits_processors = None
+        t0 = time.perf_counter()
+        text, pending = "", ""
+        hold = max((len(s) for s in params.stop), default=0)
+        try:
+            for piece in self._stream(prompt, params, logits_processors):
+                pending += piece
+                cut = min((pending.find(s) for s in params.stop if s in pending), default=-1)
+                if cut >= 0:
+                    text += pending[:cut]
+                    yield pending[:cut]
+                    pending = ""
+                    break
+                # Hold back a possible partial stop string
+                emit = pending[:len(pending) - hold] if hold else pending
+                if emit:
+                    text += emit
+                    pending = pending[len(emit):]
+                    yield emit
+            else:
+                if pending:
+                    text += pending
+                    yield pending
+        finally:
+            self._account(prompt, text, time.perf_counter() - t0)
+
+    def generate(self, prompt: str, params: Optional[SamplingParams] = None,
+                 logits_processors: Optional[list] = None) -> str:
+        return "".join(self.stream(prompt, params, logits_processors))
+
+    def _account(self, prompt: str, text: str, seconds: float):
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.prompt_tokens += self.count_tokens(prompt)
+            self.stats.completion_tokens += self.count_tokens(text)
+            self.stats.seconds += seconds
+            if self._record_path:
+                with open(self._record_path, "a") as f:
+                    f.write(json.dumps({"prompt_sha": prompt_hash(prompt), "text": text}) + "\n")
+
+
+# --------- MLX (Apple silicon) ----------
+class MLXBackend(Backend):
+    name = "mlx"
+    supports_logits_processors = True
+
+    def __init__(self, model_id: str):
+        super().__init__(model_id)
+        self._model = self._tokenizer = None
+
+    def _load(self):
+        if self._model is None:
+            from mlx_lm import load
+            self._model, self._tokenizer = load(self.model_id)  # downloads if missing
+        return self._model, self._tokenizer
+
+    @property
+    def tokenizer(self):
+        return self._load()[1]
+
+    def apply_chat_template(self, messages):
+        return self.tokenizer.apply_chat_template(list(messages), tokenize=False, add_generation_prompt=True)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text)) if text else 0
+
+    def _stream(self, prompt, params, logits_processors=None):
+        import mlx.core as mx
+        from mlx_lm import stream_generate
+        from mlx_lm.sample_utils import make_sampler
+        model, tokenizer = self._load()
+        if params.seed is not None:
+            mx.random.seed(params.seed)
+        sampler = make_sampler(params.temperature, top_p=params.top_p)
+        for resp in stream_generate(model, tokenizer, prompt=prompt, max_tokens=params.max_tokens,
+                                    sampler=sampler, logits_processors=logits_processors):
+            yield resp.text
+
+
+# --------- TRANSFORMERS ON CPU ----------
+class TransformersCPUBackend(Backend):
+    name = "cpu"
+
+    def __init__(self, model_id: str):
+        super().__init__(model_id)
+        self._model = self._tokenizer = None
+
+    def _load(self):
+        if self._model is None:
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+            self._model = AutoModelForCausalLM.from_pretrained(self.model_id, device_map="cpu")
+        return self._model, self._tokenizer
+
+    def apply_chat_template(self, messages):
+        return self._load()[1].apply_chat_template(list(messages), tokenize=False, add_generation_prompt=True)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._load()[1].encode(text, add_special_tokens=False)) if text else 0
+
+    def _stream(self, prompt, params, logits_processors=None):
+        import torch
+        from transformers import TextIteratorStreamer
+        model, tokenizer = self._load()
+        if params.seed is not None:
+            torch.manual_seed(params.seed)
+        inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        kwargs = dict(**inputs, max_new_tokens=params.max_tokens, streamer=streamer,
+                      pad_token_id=tokenizer.eos_token_id)
+        if params.temperature > 0:
+            kwargs.update(do_sample=True, temperature=params.temperature, top_p=params.top_p)
+        else:
+            kwargs.update(do_sample=False)
+        worker = threading.Thread(target=model.generate, kwargs=kwargs, daemon=True)
+        worker.start()
+        yield from streamer
+        worker.join()
+
+
+# --------- OPENAI-COMPATIBLE HTTP (llama.cpp server, vLLM, ...) ----------
+class OpenAIHTTPBackend(Backend):
+    """
+    Talks to a local `/v1/completions` endpoint over pooled keep-alive connections.
+    The chat template and token counts come from a local tokenizer (COT_TOKENIZER) if set,
+    else from the server's `/apply-template` and `/tokenize` (model_server.py, llama.cpp),
+    so prompts are byte-identical to the in-process backends.
+    """
+    name = "http"
+
+    def __init__(self, model_id: str, base_url: Optional[str] = None, pool_size: int = 8,
+                 tokenizer_id: Optional[str] = None, timeout: float = 600.0):
+        super().__init__(model_id)
+        url = urlparse(base_url or os.environ.get("COT_BASE_URL", "http://127.0.0.1:8080"))
+        self.host, self.port = url.hostname, url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._tokenizer_id = tokenizer_id or os.environ.get("COT_TOKENIZER")
+        self._tokenizer = None
+        self._unsupported: set = set()
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None and self._tokenizer_id:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self._tokenizer_id)
+        return self._tokenizer
+
+    def apply_chat_template(self, messages):
+        if self.tokenizer is not None:
+            return self.tokenizer.apply_chat_template(list(messages), tokenize=False, add_generation_prompt=True)
+        reply = self._post_json("/apply-template", {"model": self.model_id, "messages": list(messages)})
+        return reply["prompt"] if reply else _plain_chat_template(messages)
+
+    def count_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        reply = self._post_json("/tokenize", {"model": self.model_id, "content": text})
+        return len(reply["tokens"]) if reply else super().count_tokens(text)
+
+    def _post_json(self, path: str, payload: dict) -> Optional[dict]:
+        """POST to a helper endpoint; None (and never again) if the server lacks it."""
+        if path in self._unsupported:
+            return None
+        conn = self._conn()
+        try:
+            conn.request("POST", f"{self.prefix}{path}", body=json.dumps(payload),
+                         headers={"Content-Type": "application/json", "Connection": "keep-alive"})
+            resp = conn.getresponse()
+            data = resp.read()
+        except OSError:
+            conn.close()
+            raise
+        self._release(conn)
+        if resp.status != 200:
+            self._unsupported.add(path)
+            return None
+        return json.loads(data)
+
+    def _conn(self) -> HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, conn: HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _stream(self, prompt, params, logits_processors=None):
+        body = {"model": self.model_id, "prompt": prompt, "max_tokens": params.max_tokens,
+                "temperature": params.temperature, "top_p": params.top_p, "stream": True}
+        if params.seed is not None:
+            body["seed"] = params.seed
+        conn = self._conn()
+        ok = False
+        try:
+            conn.request("POST", f"{self.prefix}/v1/completions", body=json.dumps(body),
+                         headers={"Content-Type": "application/json", "Connection": "keep-alive"})
+            resp = conn.getresponse()
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}: {resp.read()[:300]!r}")
+            for raw in resp:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if "error" in event:
+                    raise RuntimeError(f"server error: {event['error'].get('message')}")
+                piece = event["choices"][0].get("text", "")
+                if piece:
+                    yield piece
+            resp.read()
+            ok = True
+        finally:
+            if ok:
+                self._release(conn)
+            else:
+                conn.close()
+
+
+# --------- DETERMINISTIC STUB / REPLAY ----------
+class StubBackend(Backend):
+    """
+    Deterministic backend for tests and benchmarks.
+
+    Lookup order: a replay file (JSONL of {"prompt_sha", "text"} as written by COT_RECORD),
+    then `responses` (a list, cycled per call unless temperature is 0 or a seed is given,
+    or a callable prompt -> text), then a default CotOutput JSON that stubs the last
+    `def` found in the prompt. Tokens are whitespace-separated words.
+    """
+    name = "stub"
+
+    def __init__(self, model_id: str = "stub", responses: Union[None, Sequence[str], Callable[[str], str]] = None,
+                 replay: Optional[str] = None, delay_per_token: float = 0.0):
+        super().__init__(model_id)
+        self.responses = responses
+        self.delay_per_token = delay_per_token
+        self.replay: Dict[str, str] = {}
+        replay = replay or os.environ.get("COT_REPLAY")
+        if replay:
+            with open(replay) as f:
+                for line in f:
+                    rec = json.loads(line)
+                    self.replay[rec.get("prompt_sha") or prompt_hash(rec["prompt"])] = rec["text"]
+        self._calls = 0
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def _text_for(self, prompt: str, params: SamplingParams) -> str:
+        self._calls += 1
+        sha = prompt_hash(prompt)
+        if sha in self.replay:
+            return self.replay[sha]
+        if callable(self.responses):
+            return self.responses(prompt)
+        if self.responses:
+            if params.temperature == 0:
+                idx = 0
+            elif params.seed is not None:
+                idx = params.seed
+            else:
+                idx = self._calls - 1
+            return self.responses[idx % len(self.responses)]
+        sigs = re.findall(r"^def .*?:\s*$", prompt, flags=re.M)
+        sig = sigs[-1].strip() if sigs else "def solution():"
+        return json.dumps({"reasoning": "Stub answer.", "code": f"{sig}\n    return None\n"})
+
+    def _stream(self, prompt, params, logits_processors=None):
+        pieces = re.findall(r"\s*\S+", self._text_for(prompt, params))
+        for piece in pieces[:params.max_tokens]:
+            if self.delay_per_token:
+                time.sleep(self.delay_per_token)
+            yield piece
+
+
+# --------- SELECTION ----------
+BACKENDS = {
+    "mlx": MLXBackend,
+    "cpu": TransformersCPUBackend,
+    "http": OpenAIHTTPBackend,
+    "stub": StubBackend,
+}
+
+_INSTANCES: Dict[tuple, Backend] = {}
+
+
+def get_backend(model_id: str, name: Optional[str] = None, **kwargs: Any) -> Backend:
+    """
+    Backend for `model_id`, chosen by `name` or COT_BACKEND (default mlx). Instances are
+    cached so scripts importing each other share one model; models load on first use.
+    """
+    name = name or os.environ.get("COT_BACKEND", "mlx")
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r} (choose from {', '.join(BACKENDS)})")
+    key = (name, model_id)
+    if key not in _INSTANCES:
+        _INSTANCES[key] = BACKENDS[name](model_id, **kwargs)
+    return _INSTANCES[key]
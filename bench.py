@@ -0,0 +1,265 @@
+import argparse, ast, contextlib, glob, io, json, os, sys, tempfile, time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List
+
+os.environ.setdefault("COT_BACKEND", "stub")   # no model is ever loaded by the benchmarks
+
+BASELINE = "bench_baseline.json"    # committed, so every checkout compares against the same numbers
+THRESHOLD = 0.25      # fail when a stage's p50 latency, relative to calibrate(), is this much slower than its baseline
+
+
+@dataclass
+class StageResult:
+    stage: str
+    items: int
+    seconds: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def line(self) -> str:
+        return (f"{self.stage:<20} {self.items:>6} items  {self.throughput:>9.1f}/s  "
+                f"p50 {self.p50_ms:8.3f} ms  p90 {self.p90_ms:8.3f} ms  p99 {self.p99_ms:8.3f} ms")
+
+
+class StageSkipped(Exception):
+    """A stage that cannot run meaningfully here; main skips it, like one whose imports are missing."""
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+# --------- COMMITTED DATA ----------
+def committed_completions() -> List[str]:
+    out = []
+    for path in sorted(glob.glob("results/samples_*.jsonl")):
+        if path.endswith("_results.jsonl"):
+            continue
+        with open(path) as f:
+            out.extend(json.loads(line)["completion"] for line in f if line.strip())
+    return out
+
+
+def model_outputs(completions: List[str]) -> List[str]:
+    """Raw generations as the model produces them: clean JSON, prose-wrapped JSON and docstring-broken JSON."""
+    outs = []
+    for i, code in enumerate(completions):
+        obj = json.dumps({"reasoning": "Iterate once and track the best pair.", "code": code.strip()})
+        if i % 3 == 0:
+            outs.append(obj)
+        elif i % 3 == 1:
+            outs.append(f"Here is the solution:\n{obj}\nHope this helps!")
+        else:   # an unescaped docstring inside the JSON string: invalid, needs the regex repair
+            code_json = json.dumps(code.strip())
+            cut = code_json.find("\\n")
+            outs.append(obj if cut < 0 else obj.replace(
+                code_json, code_json[:cut] + '\\n    """Docstring."""' + code_json[cut:]))
+    return outs
+
+
+def raw_outputs(completions: List[str]) -> List[str]:
+    """Generations with the code pasted unescaped into the JSON string, as small models often do."""
+    return [f'{{"reasoning": "Check each pair.", "code": "{code.strip()}"}}' + ("\nLet me know!" if i % 2 else "")
+            for i, code in enumerate(completions)]
+
+
+def function_from_script(path: str, name: str) -> Callable:
+    """
+    Compile one top-level function out of a script without running the script's side effects.
+    Only its imports of the stdlib and of this repo's modules (e.g. testgen_stream) are kept.
+    """
+    def importable(module: str) -> bool:
+        top = module.split(".")[0]
+        return top in sys.stdlib_module_names or Path(f"{top}.py").exists()
+
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    keep = [n for n in tree.body if isinstance(n, ast.Import) and all(importable(a.name) for a in n.names)]
+    keep += [n for n in tree.body if isinstance(n, ast.ImportFrom) and n.module and importable(n.module)]
+    keep += [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == name]
+    ns: dict = {}
+    exec(compile(ast.Module(body=keep, type_ignores=[]), path, "exec"), ns)
+    return ns[name]
+
+
+# --------- STAGES ----------
+# Each stage returns (items, fn): fn(item) is timed once per item per round.
+def stage_extract_json():
+    import mlx_humaneval_structured as mhs
+    return model_outputs(committed_completions()), mhs.extract_json
+
+
+def stage_generate_structured():
+    import mlx_humaneval_structured as mhs
+    from backends import StubBackend
+    outputs = model_outputs(committed_completions())
+    backend = StubBackend("bench", responses=lambda prompt: outputs[int(prompt.rsplit("#", 1)[-1])])
+    mhs.backend = backend
+
+    def run(i):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return mhs.generate_structured(f"bench prompt #{i}", retries=1)
+    return list(range(len(outputs))), run
+
+
+def stage_json_repair():
+    from json_repair import repair_json
+    completions = committed_completions()
+    return model_outputs(completions) + raw_outputs(completions), repair_json
+
+
+def stage_finalize_llm_tests():
+    finalize = function_from_script("llm_coverage_improvement.py", "finalize_llm_tests")
+    tests = [Path(p).read_text(encoding="utf-8") for p in sorted(glob.glob("*_tests.py"))]
+    raws = [f"```python\n{t}\n{t}\n```" for t in tests if "def test_" in t]   # fenced, duplicated
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    return raws, lambda raw: finalize(raw, os.path.join(out_dir, "new_tests.py"), "fn", "mod")
+
+
+def stage_verify_candidates():
+    from candidate_pack import DEFAULT_PACK, PackReader
+    from verify import static_verify
+    # loose candidate files (not the package's import-hook __init__.py), then the packed ones
+    sources = {Path(p).stem: Path(p).read_text(encoding="utf-8")
+               for p in sorted(glob.glob("generated_cot_qwen/*.py")) if Path(p).name != "__init__.py"}
+    if os.path.exists(DEFAULT_PACK):
+        with PackReader(DEFAULT_PACK) as pack:
+            sources.update({name: src for name, _, _, src in pack.items() if name not in sources})
+
+    def run(item):
+        name, src = item
+        if static_verify(src, context="") is None:
+            exec(compile(src, f"generated_cot_qwen/{name}.py", "exec"), {})
+    return list(sources.items()), run
+
+
+def stage_test_humaneval():
+    import pytest   # collection + execution of the generated candidates, as run by `pytest`
+    args = ["-q", "-p", "no:cacheprovider", "test_humaneval.py"]
+
+    def run(_):
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = pytest.main(args)
+        if code not in (0, 1):      # 1: some candidates fail their tests, as expected
+            raise StageSkipped(f"pytest exited with {int(code)}, e.g. a collection error")
+    return [0], run
+
+
+def stage_passk():
+    from results_store import ResultsStore
+    paths = sorted(glob.glob("results/*_results.jsonl"))
+
+    def run(_):
+        store = ResultsStore(":memory:")
+        store.ingest(paths, verbose=False)
+        store.pass_at_k(1), store.pass_at_k(3)
+        store.close()
+    return [0], run
+
+
+STAGES: Dict[str, Callable] = {
+    "extract_json": stage_extract_json,
+    "generate_structured": stage_generate_structured,
+    "json_repair": stage_json_repair,
+    "finalize_llm_tests": stage_finalize_llm_tests,
+    "verify_candidates": stage_verify_candidates,
+    "test_humaneval": stage_test_humaneval,
+    "passk": stage_passk,
+}
+
+
+def run_stage(name: str, rounds: int = 5, warmup: int = 1) -> StageResult:
+    items, fn = STAGES[name]()
+    for _ in range(warmup):
+        for item in items:
+            fn(item)
+    timings = []
+    t_start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            timings.append(time.perf_counter() - t0)
+    total = time.perf_counter() - t_start
+    timings.sort()
+    return StageResult(name, len(timings), total, *(1000 * percentile(timings, q) for q in (0.5, 0.9, 0.99)))
+
+
+# --------- BASELINES ----------
+def calibrate(rounds: int = 7) -> float:
+    """
+    Median ms of a fixed pure-Python workload (JSON, sorting, parsing). Baselines store each
+    stage's p50 as a multiple of it, so one saved on a laptop still holds on a slower CI box.
+    """
+    data = [{"task_id": f"HumanEval/{i}", "completion": "def f(x):\n    return x + 1\n"} for i in range(2000)]
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        rows = json.loads(json.dumps(data))
+        rows.sort(key=lambda r: r["task_id"])
+        for r in rows[:200]:
+            ast.parse(r["completion"])
+        times.append(time.perf_counter() - t0)
+    return 1000 * sorted(times)[rounds // 2]
+
+
+def compare(results: List[StageResult], baseline: Dict[str, dict], calibration_ms: float,
+            threshold: float = THRESHOLD) -> List[str]:
+    """Stages whose calibrated p50 latency regressed more than `threshold` against the baseline."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r.stage)
+        rel = r.p50_ms / calibration_ms
+        if base and base["p50_rel"] > 0 and rel > base["p50_rel"] * (1 + threshold):
+            regressions.append(f"{r.stage}: p50 {base['p50_rel']:.4f} → {rel:.4f} × calibration "
+                               f"(+{100 * (rel / base['p50_rel'] - 1):.0f}%)")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pipeline stages on committed data with a stub model.")
+    ap.add_argument("stages", nargs="*", help=f"subset of: {', '.join(STAGES)}")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = ap.parse_args()
+
+    results = []
+    for name in args.stages or STAGES:
+        try:
+            res = run_stage(name, rounds=1 if name == "test_humaneval" else args.rounds)
+        except (ImportError, StageSkipped) as e:
+            print(f"⏭️ {name:<20} skipped ({e})")
+            continue
+        results.append(res)
+        print(res.line())
+
+    calibration_ms = calibrate()
+    print(f"⚖️ calibration workload: {calibration_ms:.2f} ms")
+    saved = json.loads(Path(args.baseline).read_text()) if os.path.exists(args.baseline) else {}
+    baseline = saved.get("stages", {})
+    if args.save_baseline:
+        baseline.update({r.stage: {**asdict(r), "p50_rel": r.p50_ms / calibration_ms} for r in results})
+        baseline = {"calibration_ms": calibration_ms, "stages": baseline}
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.baseline).write_text(json.dumps(baseline, indent=2))
+        print(f"💾 Baseline saved to {args.baseline}")
+        return
+    regressions = compare(results, baseline, calibration_ms, args.threshold)
+    if regressions:
+        print("❌ Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    if baseline:
+        print(f"✅ No stage slower than its baseline by more than {100 * args.threshold:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import hashlib, importlib.abc, importlib.machinery, importlib.util, json, mmap, os, struct, sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+# Layout: MAGIC | source bytes ... | JSON index | footer (index offset, index length, MAGIC)
+# The index maps a module name (<id>__cN) to [offset, length, task_id, index]; sources are
+# read straight out of a memory map, so opening a pack costs one file regardless of its size.
+MAGIC = b"CPACK001"
+_FOOTER = struct.Struct("<QQ8s")
+DEFAULT_PACK = "generated_cot_qwen.pack"
+DEFAULT_PACKAGE = "generated_cot_qwen"
+
+
+def _digest(task_id: str, source: str) -> Tuple[str, str]:
+    return task_id, hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+class PackWriter:
+    """
+    Add candidates one at a time; the index is written on close. A pack is rewritten unless
+    `append`: then new candidates go after the old ones, and a candidate whose source the
+    pack already holds for its task is skipped (add returns False), so re-running the same
+    samples leaves the pack as it was.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.index: Dict[str, list] = {}
+        self._held: Counter = Counter()     # (task_id, source hash) of what an appended-to pack holds
+        if append and os.path.exists(path) and os.path.getsize(path) > len(MAGIC):
+            with PackReader(path) as old:
+                self.index, end = dict(old.index), old.index_offset
+                self._held.update(_digest(task_id, src) for _, task_id, _, src in old.items())
+            self._f = open(path, "r+b")
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            self._f = open(path, "wb")
+            self._f.write(MAGIC)
+
+    def add(self, name: str, source: str, task_id: str, index: int) -> bool:
+        key = _digest(task_id, source)
+        if self._held[key]:
+            self._held[key] -= 1
+            return False
+        data = source.encode("utf-8")
+        self.index[name] = [self._f.tell(), len(data), task_id, index]
+        self._f.write(data)
+        return True
+
+    def next_index(self, task_id: str) -> int:
+        return 1 + max((rec[3] for rec in self.index.values() if rec[2] == task_id), default=0)
+
+    def close(self):
+        blob = json.dumps(self.index, separators=(",", ":")).encode("utf-8")
+        offset = self._f.tell()
+        self._f.write(blob)
+        self._f.write(_FOOTER.pack(offset, len(blob), MAGIC))
+        self._f.close()
+
+    def __enter__(self) -> "PackWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, length, magic = _FOOTER.unpack(self._mm[-_FOOTER.size:])
+        if magic != MAGIC or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a candidate pack")
+        self.index_offset = offset
+        self.index: Dict[str, list] = json.loads(self._mm[offset:offset + length])
+
+    def source(self, name: str) -> str:
+        offset, length = self.index[name][:2]
+        return self._mm[offset:offset + length].decode("utf-8")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def items(self) -> Iterator[Tuple[str, str, int, str]]:
+        """(name, task_id, index, source) in archive order."""
+        for name, (_, _, task_id, index) in sorted(self.index.items(), key=lambda kv: kv[1][0]):
+            yield name, task_id, index, self.source(name)
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self) -> "PackReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --------- IMPORT HOOK ----------
+class _PackLoader(importlib.abc.InspectLoader):
+    def __init__(self, reader: PackReader, name: str):
+        self.reader, self.name = reader, name
+
+    def get_source(self, fullname: str) -> str:
+        return self.reader.source(self.name)
+
+    def get_code(self, fullname: str):
+        # the filename names a path inside the archive, never a real file, so linecache (and
+        # tracebacks) ask get_source instead of reading a stale loose file of the same name
+        return compile(self.get_source(fullname), self.get_filename(fullname), "exec")
+
+    def get_filename(self, fullname: str) -> str:
+        return os.path.join(os.path.abspath(self.reader.path), f"{self.name}.py")
+
+    def is_package(self, fullname: str) -> bool:
+        return False
+
+
+class PackFinder(importlib.abc.MetaPathFinder):
+    """
+    Serves `<package>.<name>` modules from a pack, ahead of the path finders. Names that are
+    not in the pack (e.g. the *_bug.py files in generated_cot_qwen/) fall through to them.
+    """
+
+    def __init__(self, reader: PackReader, package: str = DEFAULT_PACKAGE):
+        self.reader, self.package = reader, package
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == self.package:
+            if os.path.isdir(self.package):
+                return None    # the real package (its __init__ installs this finder when a pack exists)
+            return importlib.machinery.ModuleSpec(fullname, None, is_package=True)
+        pkg, _, name = fullname.rpartition(".")
+        if pkg == self.package and name in self.reader:
+            loader = _PackLoader(self.reader, name)
+            spec = importlib.util.spec_from_loader(fullname, loader, origin=loader.get_filename(fullname))
+            spec.has_location = True    # sets __file__, like a module loaded from disk
+            return spec
+        return None
+
+
+def install(pack: str = DEFAULT_PACK, package: str = DEFAULT_PACKAGE) -> PackFinder:
+    """Make `import <package>.<id>__cN` resolve from `pack` (first on sys.meta_path)."""
+    pack = os.path.abspath(pack)
+    for finder in sys.meta_path:
+        if isinstance(finder, PackFinder) and finder.package == package and finder.reader.path == pack:
+            return finder
+    finder = PackFinder(PackReader(pack), package)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+# --------- MANIFEST RECORDS ----------
+def read_candidate(rec: dict) -> str:
+    """Source of a manifest record, from its pack if it has one, else from its .py file."""
+    if rec.get("pack"):
+        return install(rec["pack"]).reader.source(Path(rec["module"]).stem)
+    return Path(rec["module"]).read_text(encoding="utf-8")
+
+
+def import_candidate(rec: dict, package: str = DEFAULT_PACKAGE):
+    """Import a manifest record as a module (packed records through the import hook)."""
+    name = Path(rec["module"]).stem
+    if rec.get("pack"):
+        install(rec["pack"], package)
+        return importlib.import_module(f"{package}.{name}")
+    spec = importlib.util.spec_from_file_location(name, rec["module"])
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
@@ -0,0 +1,356 @@
+import ast, builtins, codeop, re, typing, warnings
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except Exception:
+    HAVE_NUMPY = False
+
+# What the constraint did in this process (mlx_humaneval_structured prints it)
+CODE_STATS: Counter = Counter()
+
+TOP_K = 64              # highest-scoring tokens checked per step; tokens below them are masked
+CACHE_STATES = 4096     # per-state verdict tables kept (LRU), shared by every processor of a tokenizer
+
+_CODE_KEY = re.compile(r'(?<!\\)"code"\s*:\s*"$')
+_CLOSE = {")": "(", "]": "[", "}": "{"}
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"'}
+_HEX = set("0123456789abcdefABCDEF")
+# typing names the prompts forbid without an import (static_verify rejects them as undefined)
+TYPING_NAMES = frozenset(n for n in typing.__all__ if n[:1].isupper() and not hasattr(builtins, n))
+
+
+class Reject(Exception):
+    """The text would make the code field unparseable or break a quoting rule of the prompt."""
+
+
+# --------- INCREMENTAL CHECKER ----------
+@dataclass
+class CodeState:
+    """
+    Scanner state over the raw generation. Before the `"code": "` key it only watches for
+    that key; inside the value it undoes JSON escapes and tracks Python lexing (strings,
+    brackets, indentation blocks, identifiers); after the closing quote it accepts anything.
+    Every field but `code`/`tail`/`compiled` is part of `key()`, so a token's verdict depends
+    on the key alone unless it ends a logical line or closes the value: then the code so far
+    is compiled (codeop tells an incomplete block from a syntax error) and `compiled` counts it.
+    """
+    phase: str = "pre"                # pre | code | post
+    tail: str = ""                    # last characters before the code value
+    json_esc: str = ""                # pending JSON escape: "\\" or "\\uXX.."
+    mode: str = "code"                # code | str | str_esc | cont (after a continuation backslash)
+    empty: int = 0                    # 1 just after an opening quote, 2 just after `''` (a third quote is banned)
+    stack: str = ""                   # open brackets
+    indents: Tuple[int, ...] = (0,)
+    indent: int = 0                   # indentation of the current line while it is still blank, else -1
+    expect_indent: bool = False       # the last logical line ended with ':'
+    last: str = ""                    # last non-blank character of the logical line
+    ident: str = ""                   # identifier being written
+    dotted: bool = False              # ... after a '.', so an attribute rather than a name
+    imported: bool = False
+    n: int = 0                        # code characters seen, capped at 4 (the 'def ' prefix)
+    code: str = ""
+    compiled: int = 0                 # times `code` was compiled; a verdict that did so is not cached
+
+    def key(self) -> tuple:
+        return (self.phase, self.json_esc, self.mode, self.empty, self.stack, self.indents, self.indent,
+                self.expect_indent, self.last, self.ident, self.dotted, self.imported, self.n)
+
+    def feed(self, text: str):
+        for c in text:
+            if self.phase == "code":
+                self._json(c)
+            elif self.phase == "pre":
+                self.tail = (self.tail + c)[-24:]
+                if _CODE_KEY.search(self.tail):
+                    self.phase = "code"
+
+    def _json(self, c: str):
+        if self.json_esc:
+            self.json_esc += c
+            if self.json_esc[1] == "u":
+                if len(self.json_esc) > 2 and c not in _HEX:
+                    raise Reject("invalid \\u escape")
+                if len(self.json_esc) == 6:
+                    ch, self.json_esc = chr(int(self.json_esc[2:], 16)), ""
+                    self._py(ch)
+                return
+            if c not in _JSON_ESCAPES:
+                raise Reject(f"invalid JSON escape \\{c}")
+            self.json_esc = ""
+            self._py(_JSON_ESCAPES[c])
+        elif c == "\\":
+            self.json_esc = c
+        elif c == '"':
+            self._finish()
+            self.phase = "post"
+        elif c < " ":
+            raise Reject("raw control character in a JSON string")
+        else:
+            self._py(c)
+
+    def _py(self, c: str):
+        if self.n < 4:
+            if c != "def "[self.n]:
+                raise Reject("code must start with 'def '")
+            self.n += 1
+        self.code += c
+        if self.mode == "str_esc":
+            self.mode = "str"
+            return
+        if self.mode == "str":
+            if c == "\n":
+                raise Reject("unterminated string literal")
+            if c == "\\":
+                self.mode = "str_esc"
+            elif c == "'":
+                self.mode, self.last = "code", c
+                self.empty = 2 if self.empty == 1 else 0
+                return
+            self.empty = 0
+            return
+        if self.mode == "cont":
+            if c != "\n":
+                raise Reject("backslash continuation not at the end of a line")
+            self.mode = "code"
+            return
+        if c == '"':
+            raise Reject("double quote in code")
+        if c == "#":
+            raise Reject("comment in code")
+        if c > "~":
+            raise Reject("non-ASCII character outside a string")
+        if c == "'" and self.empty == 2:
+            raise Reject("triple-quoted string")
+        self.empty = 0
+        if self.indent >= 0:
+            if c in " \t":
+                self.indent += 1
+                return
+            if c == "\n":
+                self.indent = 0            # blank line
+                return
+            self._indentation()
+        if c.isalnum() or c == "_":
+            if not self.ident:
+                self.dotted = self.last == "."
+            self.ident += c
+            self.last = c
+            return
+        if self.ident:
+            self._end_ident()
+        if c in " \t":
+            return
+        if c == "\n":
+            if not self.stack:             # inside brackets a newline just continues the line
+                self._logical_line()
+                self.expect_indent, self.last, self.indent = self.last == ":", "", 0
+            return
+        if c == "\\":
+            self.mode = "cont"
+            return
+        if c == "'":
+            self.mode, self.empty = "str", 1
+            return
+        if c in "([{":
+            self.stack += c
+        elif c in _CLOSE:
+            if not self.stack or self.stack[-1] != _CLOSE[c]:
+                raise Reject(f"unmatched '{c}'")
+            self.stack = self.stack[:-1]
+        self.last = c
+
+    def _indentation(self):
+        level, self.indent = self.indent, -1
+        if self.expect_indent:
+            if level <= self.indents[-1]:
+                raise Reject("expected an indented block")
+            self.indents += (level,)
+            self.expect_indent = False
+        elif level > self.indents[-1]:
+            raise Reject("unexpected indent")
+        else:
+            while level < self.indents[-1]:
+                self.indents = self.indents[:-1]
+            if level != self.indents[-1]:
+                raise Reject("unindent does not match any outer indentation level")
+
+    def _logical_line(self):
+        """A finished logical line must leave the code complete or incomplete, never invalid."""
+        self.compiled += 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            try:
+                codeop.compile_command(self.code, "<code>", "exec")
+            except (SyntaxError, ValueError, OverflowError) as e:
+                raise Reject(f"invalid line: {getattr(e, 'msg', e)}")
+
+    def _end_ident(self):
+        name, self.ident = self.ident, ""
+        if name == "import":
+            self.imported = True
+        elif name in TYPING_NAMES and not self.dotted and not self.imported:
+            raise Reject(f"'{name}' used without an import")
+
+    def _finish(self):
+        self.compiled += 1
+        if self.ident:
+            self._end_ident()
+        if self.n < 4 or self.mode != "code" or self.stack:
+            raise Reject("code ends inside a string or bracket")
+        try:
+            ast.parse(self.code)
+        except (SyntaxError, ValueError) as e:
+            raise Reject(f"code does not parse: {e}")
+
+
+# --------- TOKENS ----------
+class TokenTable:
+    """Token id -> text as it appears mid-sequence, plus the per-state verdict cache."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self._text: Dict[int, str] = {}
+        self.special = set(getattr(tokenizer, "all_special_ids", None) or [])
+        eos = getattr(tokenizer, "eos_token_id", None)
+        if eos is not None:
+            self.special.add(eos)
+        # decode after an anchor token: SentencePiece drops a leading space on a lone token
+        try:
+            self._anchor = list(tokenizer.encode("a", add_special_tokens=False))[-1:]
+        except TypeError:
+            self._anchor = list(tokenizer.encode("a"))[-1:]
+        self._prefix = tokenizer.decode(self._anchor)
+        self.verdicts: "OrderedDict[tuple, Dict[int, bool]]" = OrderedDict()
+
+    def text(self, token: int) -> str:
+        if token not in self._text:
+            with_anchor = self.tokenizer.decode(self._anchor + [token])
+            self._text[token] = (with_anchor[len(self._prefix):] if with_anchor.startswith(self._prefix)
+                                 else self.tokenizer.decode([token]))
+        return self._text[token]
+
+    def table(self, key: tuple) -> Dict[int, bool]:
+        if key in self.verdicts:
+            self.verdicts.move_to_end(key)
+            return self.verdicts[key]
+        CODE_STATS["states"] += 1
+        self.verdicts[key] = {}
+        if len(self.verdicts) > CACHE_STATES:
+            self.verdicts.popitem(last=False)
+        return self.verdicts[key]
+
+
+_TABLES: Dict[int, TokenTable] = {}
+
+
+def token_table(tokenizer) -> TokenTable:
+    if id(tokenizer) not in _TABLES:
+        _TABLES[id(tokenizer)] = TokenTable(tokenizer)
+    return _TABLES[id(tokenizer)]
+
+
+def _to_numpy(x):
+    if type(x).__module__.startswith("mlx"):
+        import mlx.core as mx
+        return np.array(x.astype(mx.float32))
+    return np.asarray(x, dtype=np.float32)
+
+
+def _like(a, x):
+    if type(x).__module__.startswith("mlx"):
+        import mlx.core as mx
+        return mx.array(a).astype(x.dtype)
+    return a
+
+
+# --------- LOGITS PROCESSOR ----------
+class PythonCodeProcessor:
+    """
+    mlx_lm logits processor `(tokens, logits) -> logits` that keeps the `code` value of a
+    CotOutput JSON parseable while it is generated. Within the value only the TOP_K
+    best-scoring tokens are checked, each against a copy of the scanner, and every token
+    that was not accepted is masked; verdicts are cached per scanner state, so repeated
+    states (most indentation and identifier positions) cost one dict lookup per token.
+    If none of the top tokens fits, the step is left unconstrained (verify/repair still run).
+    One instance can be reused across generations; a new one is detected from `tokens`.
+    `prefix` is answer text already forced into the prompt (a continuation after a cut).
+    """
+
+    def __init__(self, tokenizer, top_k: int = TOP_K, prefix: str = ""):
+        self.table = token_table(tokenizer)
+        self.top_k, self.prefix = top_k, prefix
+        self._start()
+        self._seen, self._tail = -1, None
+
+    def _start(self):
+        self.state, self.off = CodeState(), False
+        try:
+            self.state.feed(self.prefix)
+        except Reject:
+            self.off = True
+
+    def _check(self, token: int, verdicts: Dict[int, bool]) -> bool:
+        if token in verdicts:
+            return verdicts[token]
+        text = self.table.text(token)
+        probe = replace(self.state)
+        if token in self.table.special:
+            ok = False                      # ending the generation would truncate the JSON
+        else:
+            try:
+                probe.feed(text)
+                # a token ending on a whole typing name (` List`) would only be caught by the
+                # next token, after the model is already committed to the name
+                ok = not (probe.ident in TYPING_NAMES and not probe.dotted and not probe.imported)
+            except Reject:
+                ok = False
+        # a line end or the closing quote (also one spelled by a JSON escape an earlier token
+        # began) compiles `code`, which the key leaves out: that verdict holds for this code only
+        if probe.compiled == self.state.compiled:
+            verdicts[token] = ok
+        return ok
+
+    def __call__(self, tokens, logits):
+        n = tokens.shape[-1]
+        last = int(tokens[-1].item())
+        if n == self._seen + 1 and n > 1 and int(tokens[-2].item()) == self._tail:
+            if not self.off:
+                try:
+                    self.state.feed(self.table.text(last))
+                except Reject:
+                    # sampled outside the checked tokens (e.g. a fallback step); stop constraining
+                    self.off = True
+                    CODE_STATS["abandoned"] += 1
+        else:
+            self._start()
+            CODE_STATS["generations"] += 1
+        self._seen, self._tail = n, last
+        if self.off or self.state.phase != "code":
+            return logits
+
+        scores = _to_numpy(logits)
+        flat = scores.reshape(-1)
+        k = min(self.top_k, flat.size)
+        top = np.argpartition(-flat, k - 1)[:k]
+        verdicts = self.table.table(self.state.key())
+        allowed: List[int] = [t for t in top.tolist() if self._check(t, verdicts)]
+        CODE_STATS["steps"] += 1
+        if not allowed:
+            CODE_STATS["unconstrained"] += 1
+            return logits
+        CODE_STATS["masked"] += k - len(allowed)
+        out = np.full_like(flat, -np.inf)
+        out[allowed] = flat[allowed]
+        return _like(out.reshape(scores.shape), logits)
+
+
+def code_stats_summary() -> Optional[str]:
+    if not CODE_STATS["steps"]:
+        return None
+    return (f"{CODE_STATS['steps']} constrained steps over {CODE_STATS['generations']} generations, "
+            f"{CODE_STATS['masked']} top-{TOP_K} tokens masked, {CODE_STATS['states']} states cached, "
+            f"{CODE_STATS['unconstrained']} unconstrained steps, {CODE_STATS['abandoned']} abandoned")
@@ -0,0 +1,285 @@
+import argparse, fcntl, json, os, random, re, socket, threading, time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from multiprocessing import Process
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+LEASE_TTL = 120.0           # seconds without a heartbeat before a unit is handed to another worker
+HEARTBEAT = LEASE_TTL / 4
+MAX_ATTEMPTS = 3            # units that crash this often are recorded as failed
+POLL = 10.0                 # seconds an idle worker waits for leases held elsewhere to finish or expire
+STRATEGIES = ("cot", "edit", "custom")   # custom = self-debug, as in samples_custom_*.jsonl
+
+
+# --------- WORK UNITS ----------
+@dataclass
+class WorkUnit:
+    task_id: str
+    strategy: str
+    model: str
+    sample: int
+    prompt: str
+    test: str
+
+    @property
+    def uid(self) -> str:
+        return f"{model_label(self.model)}__{self.strategy}__{self.task_id.replace('/', '-')}__{self.sample}"
+
+
+def model_label(model_id: str) -> str:
+    """'mlx-community/gemma-2-2b-it-4bit' -> 'gemma' (the suffix used in results/ file names)."""
+    name = model_id.rsplit("/", 1)[-1].lower()
+    m = re.match(r"[a-z]+", name)
+    return m.group(0) if m else name
+
+
+def task_num(task_id: str) -> int:
+    return int(task_id.rsplit("/", 1)[-1])
+
+
+class RunDir:
+    """
+    Work queue on a shared directory (NFS, SMB, a synced volume), no server needed:
+
+        units/<uid>.json    planned work (immutable)
+        leases/<uid>.json   owner + attempts; the file mtime is the heartbeat
+        done/<uid>.json     result record, written atomically
+        queue.lock          flock taken only while claiming, so claims never race
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        for sub in ("units", "leases", "done"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, kind: str, uid: str) -> Path:
+        return self.root / kind / f"{uid}.json"
+
+    @contextmanager
+    def _locked(self):
+        with open(self.root / "queue.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _uids(self, kind: str) -> List[str]:
+        return [e.name[:-5] for e in os.scandir(self.root / kind) if e.name.endswith(".json")]
+
+    def add(self, units: List[WorkUnit]) -> int:
+        new = 0
+        for u in units:
+            path = self._path("units", u.uid)
+            if not path.exists():
+                _write_atomic(path, asdict(u))
+                new += 1
+        return new
+
+    def unit(self, uid: str) -> WorkUnit:
+        return WorkUnit(**json.loads(self._path("units", uid).read_text()))
+
+    def claim(self, owner: str, model: Optional[str] = None) -> Optional[str]:
+        """
+        Lease one pending or expired unit to `owner`; None when nothing is left to do. Units
+        of `model` (the one the worker has loaded) come first, so it switches models only
+        once that model's work is gone.
+        """
+        with self._locked():
+            done = set(self._uids("done"))
+            todo = [u for u in self._uids("units") if u not in done]
+            random.shuffle(todo)   # spread workers over tasks instead of all hitting one
+            if model is not None:
+                loaded = model_label(model)
+                todo.sort(key=lambda u: u.split("__", 1)[0] != loaded)   # stable: shuffled within a model
+            now = time.time()
+            for uid in todo:
+                lease = self._path("leases", uid)
+                attempts = 0
+                if lease.exists():
+                    if now - lease.stat().st_mtime < LEASE_TTL:
+                        continue                        # live lease held by someone else
+                    attempts = json.loads(lease.read_text()).get("attempts", 0)
+                if attempts >= MAX_ATTEMPTS:
+                    self.complete(uid, {"task_id": self.unit(uid).task_id, "completion": None,
+                                        "error": f"gave up after {attempts} expired leases"})
+                    continue
+                _write_atomic(lease, {"owner": owner, "attempts": attempts + 1, "claimed": now})
+                return uid
+        return None
+
+    def heartbeat(self, uid: str):
+        try:
+            os.utime(self._path("leases", uid))
+        except FileNotFoundError:
+            pass
+
+    def release(self, uid: str):
+        """Give a unit up after a crash: its lease counts as expired now (attempts are kept)."""
+        try:
+            os.utime(self._path("leases", uid), (0, 0))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, uid: str, record: dict):
+        _write_atomic(self._path("done", uid), record)
+        try:
+            self._path("leases", uid).unlink()
+        except FileNotFoundError:
+            pass
+
+    def results(self) -> Iterator[tuple]:
+        for uid in self._uids("done"):
+            yield self.unit(uid), json.loads(self._path("done", uid).read_text())
+
+    def status(self) -> Dict[str, float]:
+        units, done = set(self._uids("units")), set(self._uids("done"))
+        now = time.time()
+        live = expired = 0
+        for uid in set(self._uids("leases")) - done:
+            try:
+                fresh = now - self._path("leases", uid).stat().st_mtime < LEASE_TTL
+            except FileNotFoundError:
+                continue
+            live, expired = live + fresh, expired + (not fresh)
+        finished = sorted(self._path("done", u).stat().st_mtime for u in done)
+        window = [t for t in finished if now - t < 600]
+        return {"units": len(units), "done": len(done), "leased": live, "expired": expired,
+                "pending": len(units - done) - live,
+                "units_per_min_10m": round(len(window) / 10, 2)}
+
+
+def _write_atomic(path: Path, obj: dict):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(obj))
+    os.replace(tmp, path)
+
+
+# --------- PLAN ----------
+def plan(run: RunDir, models: List[str], strategies: List[str], n_samples: int,
+         tasks: Optional[slice] = None) -> int:
+    from datasets import load_dataset
+    dataset = load_dataset("openai_humaneval")["test"]
+    problems = [dataset[i] for i in range(len(dataset))][tasks or slice(None)]
+    units = [WorkUnit(p["task_id"], strategy, model, k, p["prompt"], p["test"])
+             for model in models for strategy in strategies for p in problems for k in range(n_samples)]
+    return run.add(units)
+
+
+# --------- WORKER ----------
+def solve(unit: WorkUnit) -> Optional[str]:
+    import mlx_humaneval_structured as mhs
+    from backends import get_backend
+    if mhs.MODEL_ID != unit.model:
+        mhs.MODEL_ID, mhs.backend = unit.model, get_backend(unit.model)
+    if unit.strategy == "edit":
+        result = mhs.solve_with_self_edit(unit.prompt)
+    elif unit.strategy == "custom":
+        result = mhs.solve_with_self_debug(unit.prompt, unit.test)
+    else:
+        result = mhs.generate_structured(mhs.make_cot_prompt(unit.prompt))
+    return result.code.strip() + "\n" if result else None
+
+
+def worker(root: str, max_units: Optional[int] = None) -> int:
+    """
+    Claim, solve and complete units until every unit is done (or `max_units` are). With
+    nothing to claim but leases still live elsewhere it polls, so a unit whose lease later
+    expires is still retried.
+    """
+    run = RunDir(root)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    n, model = 0, None
+    while max_units is None or n < max_units:
+        uid = run.claim(owner, model)
+        if uid is None:
+            st = run.status()
+            if st["done"] >= st["units"]:
+                break
+            time.sleep(POLL)
+            continue
+        unit = run.unit(uid)
+        model = unit.model
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT):
+                run.heartbeat(uid)
+        threading.Thread(target=beat, daemon=True).start()
+        t0 = time.perf_counter()
+        try:
+            completion = solve(unit)
+        except Exception as e:
+            print(f"⚠️ [{owner}] {uid}: {type(e).__name__}: {e}")
+            stop.set()
+            run.release(uid)
+            continue   # the unit is retried (up to MAX_ATTEMPTS)
+        stop.set()
+        run.complete(uid, {"task_id": unit.task_id, "completion": completion,
+                           "owner": owner, "seconds": round(time.perf_counter() - t0, 2)})
+        n += 1
+        print(f"✅ [{owner}] {uid} ({time.perf_counter() - t0:.1f}s)")
+    return n
+
+
+# --------- MERGE ----------
+def merge(run: RunDir, out_dir: str = ".") -> List[str]:
+    """Write one samples_<strategy>_structured_<model>.jsonl per (model, strategy), in task/sample order."""
+    groups: Dict[tuple, list] = {}
+    for unit, rec in run.results():
+        if rec.get("completion"):
+            key = (model_label(unit.model), unit.strategy)
+            groups.setdefault(key, []).append((task_num(unit.task_id), unit.sample, rec))
+    paths = []
+    for (label, strategy), rows in sorted(groups.items()):
+        path = os.path.join(out_dir, f"samples_{strategy}_structured_{label}.jsonl")
+        with open(path, "w") as f:
+            for _, _, rec in sorted(rows, key=lambda r: r[:2]):
+                f.write(json.dumps({"task_id": rec["task_id"], "completion": rec["completion"]}) + "\n")
+        paths.append(path)
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Shard a HumanEval sweep over workers sharing a directory.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("plan", help="enqueue (task, strategy, model, sample) units")
+    p.add_argument("--model", action="append", required=True, help="model id (repeatable)")
+    p.add_argument("--strategy", action="append", choices=STRATEGIES, help="default: all")
+    p.add_argument("--samples", type=int, default=3, help="completions per task")
+    p.add_argument("--tasks", default=":", help="python slice over the 164 tasks, e.g. 0:100:10")
+    w = sub.add_parser("worker", help="pull units until the queue is empty")
+    w.add_argument("--procs", type=int, default=1, help="local worker processes "
+                   "(with COT_BACKEND=http they share one model_server.py batch)")
+    w.add_argument("--max-units", type=int)
+    sub.add_parser("status")
+    m = sub.add_parser("merge", help="write samples_*.jsonl from finished units")
+    m.add_argument("--out-dir", default=".")
+    for sp in (p, w, m, sub.choices["status"]):
+        sp.add_argument("--dir", default="runs/sweep", help="shared run directory")
+    args = ap.parse_args()
+
+    run = RunDir(args.dir)
+    if args.command == "plan":
+        tasks = slice(*[int(x) if x else None for x in args.tasks.split(":")])
+        new = plan(run, args.model, args.strategy or list(STRATEGIES), args.samples, tasks)
+        print(f"📋 Planned {new} new unit(s) in {args.dir}")
+    elif args.command == "worker":
+        if args.procs == 1:
+            worker(args.dir, args.max_units)
+        else:
+            procs = [Process(target=worker, args=(args.dir, args.max_units)) for _ in range(args.procs)]
+            for pr in procs:
+                pr.start()
+            for pr in procs:
+                pr.join()
+    elif args.command == "status":
+        print(json.dumps(run.status(), indent=2))
+    else:
+        for path in merge(run, args.out_dir):
+            print(f"Saved: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse, hashlib, json, re, sqlite3, time
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+INDEX_DIR = Path(".cache/covindex")
+
+
+# --------- BITMAPS ----------
+# Lines are bits of a Python int (bit n = line n): a file's coverage is two ints, and run
+# deltas are single &/~ operations regardless of file length.
+def members(bitmap: int) -> List[int]:
+    out, n = [], 0
+    while bitmap:
+        if bitmap & 1:
+            out.append(n)
+        bitmap >>= 1
+        n += 1
+    return out
+
+
+@dataclass
+class FileCov:
+    lines: int = 0                                        # bitmap of measured lines
+    covered: int = 0                                      # bitmap of executed lines
+    branches: Dict[int, int] = field(default_factory=dict)          # branch line -> number of arcs
+    missing: Dict[int, List[int]] = field(default_factory=dict)     # branch line -> targets never taken
+
+    def branch_counts(self) -> Tuple[int, int]:
+        total = sum(self.branches.values())
+        return total - sum(len(v) for v in self.missing.values()), total
+
+
+@dataclass
+class RunIndex:
+    name: str
+    sources: Dict[str, str] = field(default_factory=dict)              # input path -> sha256
+    files: Dict[str, FileCov] = field(default_factory=dict)
+    tests: Dict[str, Tuple[str, float]] = field(default_factory=dict)  # test id -> (outcome, seconds)
+    line_tests: Dict[str, Dict[int, List[str]]] = field(default_factory=dict)   # file -> line -> tests
+    arc_tests: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)    # file -> "a>b" -> tests
+
+    def save(self, root: Path = INDEX_DIR) -> Path:
+        root.mkdir(parents=True, exist_ok=True)
+        path = root / f"{self.name}.json"
+        data = asdict(self)
+        for fc in data["files"].values():
+            fc["lines"], fc["covered"] = hex(fc["lines"]), hex(fc["covered"])
+        path.write_text(json.dumps(data, separators=(",", ":")))
+        return path
+
+    @classmethod
+    def load(cls, name: str, root: Path = INDEX_DIR) -> "RunIndex":
+        data = json.loads((root / f"{name}.json").read_text())
+        files = {}
+        for fn, fc in data.pop("files").items():
+            files[fn] = FileCov(int(fc["lines"], 16), int(fc["covered"], 16),
+                                {int(k): v for k, v in fc["branches"].items()},
+                                {int(k): v for k, v in fc["missing"].items()})
+        return cls(data["name"], data["sources"], files,
+                   {k: tuple(v) for k, v in data["tests"].items()},
+                   {fn: {int(l): t for l, t in d.items()} for fn, d in data["line_tests"].items()},
+                   data["arc_tests"])
+
+
+def _sha(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# --------- STREAMING INGEST ----------
+def ingest_cobertura(run: RunIndex, path: str):
+    """Cobertura XML (coverage.py `coverage xml`); elements are freed as soon as a class is read."""
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, el in context:
+        if event != "end":
+            continue
+        if el.tag == "class":
+            fc = run.files.setdefault(el.get("filename"), FileCov())
+            for line in el.iter("line"):
+                n = int(line.get("number"))
+                fc.lines |= 1 << n
+                if int(line.get("hits", 0)):
+                    fc.covered |= 1 << n
+                if line.get("branch") == "true":
+                    m = re.search(r"\((\d+)/(\d+)\)", line.get("condition-coverage") or "")
+                    fc.branches[n] = int(m.group(2)) if m else 2
+                    missing = line.get("missing-branches")
+                    if missing:
+                        fc.missing[n] = [int(t) if t.lstrip("-").isdigit() else -1 for t in missing.split(",")]
+            el.clear()
+        elif el.tag in ("classes", "package", "packages"):
+            el.clear()
+    root.clear()
+    run.sources[path] = _sha(path)
+
+
+def ingest_junit(run: RunIndex, path: str):
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, el in context:
+        if event == "end" and el.tag == "testcase":
+            outcome = "passed"
+            for child in el:
+                if child.tag in ("failure", "error", "skipped"):
+                    outcome = child.tag
+                    break
+            run.tests[f"{el.get('classname')}::{el.get('name')}"] = (outcome, float(el.get("time") or 0))
+            el.clear()
+            root.clear()
+    run.sources[path] = _sha(path)
+
+
+def _numbits(blob: bytes) -> List[int]:
+    return [i * 8 + b for i, byte in enumerate(blob) for b in range(8) if byte & (1 << b)]
+
+
+def ingest_contexts(run: RunIndex, path: str):
+    """
+    Per-test attribution from a coverage.py data file recorded with dynamic contexts
+    (`pytest --cov --cov-context=test`): which tests executed each line / arc.
+    """
+    db = sqlite3.connect(path)
+    files = dict(db.execute("SELECT id, path FROM file"))
+    contexts = {i: c.split("|")[0] for i, c in db.execute("SELECT id, context FROM context")}
+
+    def key(abs_path: str) -> str:
+        # Cobertura names files relative to its <source>; match on the longest suffix
+        for fn in run.files:
+            if abs_path.endswith("/" + fn) or abs_path == fn:
+                return fn
+        return abs_path
+
+    for file_id, ctx_id, blob in db.execute("SELECT file_id, context_id, numbits FROM line_bits"):
+        if not contexts[ctx_id]:
+            continue
+        per_line = run.line_tests.setdefault(key(files[file_id]), {})
+        for n in _numbits(blob):
+            per_line.setdefault(n, []).append(contexts[ctx_id])
+    for file_id, ctx_id, a, b in db.execute("SELECT file_id, context_id, fromno, tono FROM arc"):
+        if contexts[ctx_id] and a > 0 and b > 0:
+            run.arc_tests.setdefault(key(files[file_id]), {}).setdefault(f"{a}>{b}", []).append(contexts[ctx_id])
+    db.close()
+    run.sources[path] = _sha(path)
+
+
+# --------- DIFF ----------
+@dataclass
+class FileDelta:
+    file: str
+    lines_before: Tuple[int, int]
+    lines_after: Tuple[int, int]
+    branches_before: Tuple[int, int]
+    branches_after: Tuple[int, int]
+    new_lines: List[int]
+    lost_lines: List[int]
+    new_arcs: List[Tuple[int, int]]           # branch arcs missing before and taken after
+    lost_arcs: List[Tuple[int, int]]
+    covered_by: Dict[str, List[str]] = field(default_factory=dict)   # "line 5" / "arc 3>4" -> tests
+
+
+def _arcs(fc: FileCov) -> Set[Tuple[int, int]]:
+    return {(l, t) for l, ts in fc.missing.items() for t in ts}
+
+
+def diff_runs(a: RunIndex, b: RunIndex) -> List[FileDelta]:
+    """Line and branch deltas from run `a` to run `b`, with the tests of `b` that reach each new line/arc."""
+    out = []
+    for fn in sorted(set(a.files) | set(b.files)):
+        fa, fb = a.files.get(fn, FileCov()), b.files.get(fn, FileCov())
+        both = fa.lines & fb.lines if fa.lines and fb.lines else fa.lines | fb.lines
+        new = members(fb.covered & ~fa.covered & both)
+        lost = members(fa.covered & ~fb.covered & both)
+        miss_a, miss_b = _arcs(fa), _arcs(fb)
+        shared = set(fa.branches) & set(fb.branches)
+        new_arcs = sorted(arc for arc in miss_a - miss_b if arc[0] in shared)
+        lost_arcs = sorted(arc for arc in miss_b - miss_a if arc[0] in shared)
+        if not (new or lost or new_arcs or lost_arcs) and fa.lines == fb.lines:
+            continue
+        delta = FileDelta(fn, (bin(fa.covered).count("1"), bin(fa.lines).count("1")),
+                          (bin(fb.covered).count("1"), bin(fb.lines).count("1")),
+                          fa.branch_counts(), fb.branch_counts(), new, lost, new_arcs, lost_arcs)
+        for l, t in new_arcs:
+            tests = b.arc_tests.get(fn, {}).get(f"{l}>{t}") or b.line_tests.get(fn, {}).get(t)
+            if tests:
+                delta.covered_by[f"arc {l}>{t}"] = sorted(set(tests))
+        for l in new:
+            tests = b.line_tests.get(fn, {}).get(l)
+            if tests:
+                delta.covered_by[f"line {l}"] = sorted(set(tests))
+        out.append(delta)
+    return out
+
+
+def test_changes(a: RunIndex, b: RunIndex) -> List[Tuple[str, str, str]]:
+    """(test, outcome before, outcome after) for tests whose outcome differs or that are new."""
+    return [(t, a.tests.get(t, ("-",))[0], o) for t, (o, _) in sorted(b.tests.items())
+            if a.tests.get(t, ("-",))[0] != o]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-run coverage/JUnit bitmap index and cross-run diffs.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ing = sub.add_parser("ingest", help="index one run")
+    ing.add_argument("run", help="run name, e.g. before, after_llm_20, after_bug_20")
+    ing.add_argument("--cobertura", action="append", default=[], help="coverage XML (repeatable)")
+    ing.add_argument("--junit", action="append", default=[], help="JUnit XML (repeatable)")
+    ing.add_argument("--contexts", help="coverage.py data file recorded with --cov-context=test")
+    d = sub.add_parser("diff", help="line/branch deltas between two runs")
+    d.add_argument("before")
+    d.add_argument("after")
+    d.add_argument("--json", action="store_true")
+    sub.add_parser("list")
+    args = ap.parse_args()
+
+    if args.command == "ingest":
+        t0 = time.perf_counter()
+        run = RunIndex(args.run)
+        for p in args.cobertura:
+            ingest_cobertura(run, p)
+        for p in args.junit:
+            ingest_junit(run, p)
+        if args.contexts:
+            ingest_contexts(run, args.contexts)
+        path = run.save()
+        print(f"📇 {args.run}: {len(run.files)} files, {len(run.tests)} tests → {path} "
+              f"({time.perf_counter() - t0:.2f}s)")
+    elif args.command == "list":
+        for p in sorted(INDEX_DIR.glob("*.json")):
+            run = RunIndex.load(p.stem)
+            covered = sum(bin(f.covered).count("1") for f in run.files.values())
+            total = sum(bin(f.lines).count("1") for f in run.files.values())
+            print(f"{p.stem:<24} {len(run.files):4d} files  lines {covered}/{total}  tests {len(run.tests)}")
+    else:
+        a, b = RunIndex.load(args.before), RunIndex.load(args.after)
+        deltas = diff_runs(a, b)
+        if args.json:
+            for fd in deltas:
+                print(json.dumps(asdict(fd)))
+            return
+        for fd in deltas:
+            print(f"{fd.file}: lines {fd.lines_before[0]}/{fd.lines_before[1]} → {fd.lines_after[0]}/{fd.lines_after[1]}, "
+                  f"branches {fd.branches_before[0]}/{fd.branches_before[1]} → {fd.branches_after[0]}/{fd.branches_after[1]}")
+            if fd.new_lines:
+                print(f"  + lines {fd.new_lines}")
+            if fd.lost_lines:
+                print(f"  - lines {fd.lost_lines}")
+            for l, t in fd.new_arcs:
+                who = fd.covered_by.get(f"arc {l}>{t}")
+                print(f"  + branch {l}->{t}" + (f"  by {', '.join(who)}" if who else ""))
+            for l, t in fd.lost_arcs:
+                print(f"  - branch {l}->{t}")
+        for t, before, after in test_changes(a, b):
+            print(f"🧪 {t}: {before} → {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import argparse, copy, hashlib, json, re, signal, threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from candidate_pack import read_candidate
+from input_gen import cached_inputs, input_size
+
+PREAMBLE = "from typing import *\n"
+CALL_TIMEOUT = 1.0      # seconds per candidate call
+CHUNK = 250             # inputs per worker job
+FLOAT_DIGITS = 6
+FN_CACHE_SIZE = 256     # exec'd candidates kept per process; each pins its module globals
+
+
+@dataclass
+class Counterexample:
+    args: str
+    expected: str
+    got: str
+
+
+@dataclass
+class CandidateReport:
+    name: str
+    disagreements: int
+    total: int
+    counterexample: Optional[Counterexample] = None
+
+
+# --------- EXECUTION (runs inside worker processes) ----------
+_FN_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+
+
+class _CallTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _CallTimeout()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def output_signature(value: Any) -> str:
+    """Comparable form of a return value; floats are rounded so 0.1+0.2 == 0.3."""
+    return repr(_normalize(value))
+
+
+def load_candidate(code: str, entry_point: str):
+    """Exec a candidate once per worker and return its entry point (or None)."""
+    key = hashlib.sha256(f"{entry_point}\n{code}".encode()).hexdigest()
+    if key in _FN_CACHE:
+        _FN_CACHE.move_to_end(key)
+    else:
+        ns: Dict[str, Any] = {}
+        try:
+            exec(PREAMBLE + code, ns, ns)
+            fn = ns.get(entry_point)
+            if fn is None:
+                m = re.search(r"^\s*def\s+(\w+)\s*\(", code, flags=re.M)
+                fn = ns.get(m.group(1)) if m else None
+        except BaseException:
+            fn = None
+        _FN_CACHE[key] = fn
+        if len(_FN_CACHE) > FN_CACHE_SIZE:
+            _FN_CACHE.popitem(last=False)
+    return _FN_CACHE[key]
+
+
+def run_chunk(job: Tuple[Sequence[Tuple[str, str]], str, Sequence[tuple], float]) -> List[List[str]]:
+    """
+    Run every candidate on every input of one chunk.
+    Returns one list of output signatures per candidate; errors show up as `!ExceptionName`.
+    Off the main thread (e.g. quick_verify from a worker thread) SIGALRM is unavailable, so
+    calls run without the timeout there.
+    """
+    sources, entry_point, inputs, timeout = job
+    timed = threading.current_thread() is threading.main_thread()
+    old = signal.signal(signal.SIGALRM, _on_alarm) if timed else None
+    out = []
+    try:
+        for _, code in sources:
+            fn = load_candidate(code, entry_point)
+            sigs, timed_out = [], False
+            for args in inputs:
+                if fn is None:
+                    sigs.append("!LoadError")
+                    continue
+                if timed_out:
+                    # One hang per chunk is enough evidence; don't burn the timeout on every input
+                    sigs.append("!Timeout")
+                    continue
+                try:
+                    if timed:
+                        signal.setitimer(signal.ITIMER_REAL, timeout)
+                    sigs.append(output_signature(fn(*copy.deepcopy(args))))
+                except _CallTimeout:
+                    sigs.append("!Timeout")
+                    timed_out = True
+                except BaseException as e:
+                    sigs.append(f"!{type(e).__name__}")
+                finally:
+                    if timed:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+            out.append(sigs)
+    finally:
+        if timed:
+            signal.signal(signal.SIGALRM, old)
+    return out
+
+
+def execute_candidates(sources: Sequence[Tuple[str, str]], entry_point: str, inputs: Sequence[tuple],
+                       pool: Optional[ProcessPoolExecutor] = None, chunk: int = CHUNK,
+                       timeout: float = CALL_TIMEOUT) -> Dict[str, List[str]]:
+    """Output signatures of each (name, code) candidate on `inputs`, batched across `pool` if given."""
+    jobs = [(sources, entry_point, inputs[i:i + chunk], timeout) for i in range(0, len(inputs), chunk)]
+    results = pool.map(run_chunk, jobs) if pool is not None else map(run_chunk, jobs)
+    merged: Dict[str, List[str]] = {name: [] for name, _ in sources}
+    for part in results:
+        for (name, _), sigs in zip(sources, part):
+            merged[name].extend(sigs)
+    return merged
+
+
+# --------- SHRINKING ----------
+def _shrink_value(v: Any) -> List[Any]:
+    if isinstance(v, bool):
+        return [False] if v else []
+    if isinstance(v, int):
+        return [x for x in (0, v // 2, -v if v < 0 else None) if x is not None and abs(x) < abs(v)]
+    if isinstance(v, float):
+        return [x for x in (0.0, float(round(v)), v / 2) if abs(x) < abs(v)]
+    if isinstance(v, (list, str, tuple)):
+        out = [v[:len(v) // 2], v[len(v) // 2:]] if len(v) > 1 else [v[:0]] if v else []
+        out += [v[:i] + v[i + 1:] for i in range(min(len(v), 20))]
+        if isinstance(v, list):
+            for i, x in enumerate(v[:20]):
+                out += [v[:i] + [s] + v[i + 1:] for s in _shrink_value(x)[:2]]
+        return out
+    return []
+
+
+def domain_floor(inputs: Sequence[tuple]) -> List[int]:
+    """Shortest length seen per argument; shrinking below it would leave the generated domain."""
+    floor = []
+    for pos in range(len(inputs[0]) if inputs else 0):
+        lens = [len(a[pos]) for a in inputs if isinstance(a[pos], (list, str, tuple))]
+        floor.append(min(lens) if lens else 0)
+    return floor
+
+
+def shrink_candidates(args: tuple, floor: Optional[List[int]] = None) -> List[tuple]:
+    out = []
+    for i, v in enumerate(args):
+        lo = floor[i] if floor else 0
+        out += [args[:i] + (s,) + args[i + 1:] for s in _shrink_value(v)
+                if not isinstance(s, (list, str, tuple)) or len(s) >= lo]
+    return out
+
+
+def shrink(args: tuple, oracle: Tuple[str, str], cand: Tuple[str, str], entry_point: str,
+           pool: Optional[ProcessPoolExecutor] = None, floor: Optional[List[int]] = None,
+           max_steps: int = 50) -> Tuple[tuple, str, str]:
+    """
+    Greedily shrink a counterexample while the candidate still disagrees with the oracle.
+    Inputs on which the oracle itself errors, or that are shorter than `floor`, are
+    rejected so shrinking stays inside the valid input domain.
+    """
+    expected = got = None
+    for _ in range(max_steps):
+        options = sorted(shrink_candidates(args, floor), key=input_size)
+        if not options:
+            break
+        sigs = execute_candidates([oracle, cand], entry_point, options, pool)
+        for opt, exp, g in zip(options, sigs[oracle[0]], sigs[cand[0]]):
+            if not exp.startswith("!") and exp != g and input_size(opt) < input_size(args):
+                args, expected, got = opt, exp, g
+                break
+        else:
+            break
+    if expected is None:
+        sigs = execute_candidates([oracle, cand], entry_point, [args], pool)
+        expected, got = sigs[oracle[0]][0], sigs[cand[0]][0]
+    return args, expected, got
+
+
+# --------- DIFFERENTIAL TESTING ----------
+def diff_task(task_id: str, prompt: str, entry_point: str, candidates: Dict[str, str],
+              canonical: Optional[str] = None, n: int = 2000, seed: int = 0,
+              pool: Optional[ProcessPoolExecutor] = None) -> List[CandidateReport]:
+    """
+    Run all candidates of a task on `n` generated inputs and compare them against the
+    canonical solution (prompt + canonical_solution) or, if absent, the per-input majority.
+    """
+    inputs = cached_inputs(task_id, prompt, entry_point, n=n, seed=seed)
+    sources = list(candidates.items())
+    if canonical is not None:
+        sources.append(("canonical", canonical))
+    sigs = execute_candidates(sources, entry_point, inputs, pool)
+
+    if canonical is not None:
+        oracle_sigs = sigs["canonical"]
+        oracle_of = lambda k: ("canonical", canonical)
+    else:
+        oracle_sigs, oracle_of_idx = [], []
+        for k in range(len(inputs)):
+            votes = Counter(sigs[name][k] for name in candidates)
+            top = votes.most_common(1)[0][0]
+            oracle_sigs.append(top)
+            oracle_of_idx.append(next(name for name in candidates if sigs[name][k] == top))
+        oracle_of = lambda k: (oracle_of_idx[k], candidates[oracle_of_idx[k]])
+
+    floor = domain_floor(inputs)
+    reports = []
+    for name, code in candidates.items():
+        bad = [k for k, (exp, got) in enumerate(zip(oracle_sigs, sigs[name]))
+               if exp != got and not exp.startswith("!")]
+        report = CandidateReport(name, len(bad), len(inputs))
+        if bad:
+            k = min(bad, key=lambda k: input_size(inputs[k]))
+            args, exp, got = shrink(inputs[k], oracle_of(k), (name, code), entry_point, pool, floor)
+            report.counterexample = Counterexample(repr(args), exp, got)
+        reports.append(report)
+    return reports
+
+
+def candidates_from_manifest(path: str = "generated_manifest_qwen.json") -> Dict[str, Dict[str, str]]:
+    """{HumanEval/<id>: {<id>__cN: code}} from a save_humaneval.py manifest."""
+    by_task: Dict[str, Dict[str, str]] = {}
+    for rec in json.loads(Path(path).read_text()):
+        by_task.setdefault(f"HumanEval/{rec['task_id']}", {})[Path(rec["module"]).stem] = read_candidate(rec)
+    return by_task
+
+
+def candidates_from_samples(path: str) -> Dict[str, Dict[str, str]]:
+    """{task_id: {<id>__cN: completion}} from a samples JSONL."""
+    by_task: Dict[str, Dict[str, str]] = {}
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            group = by_task.setdefault(rec["task_id"], {})
+            group[f"{rec['task_id'].split('/')[1]}__c{len(group) + 1}"] = rec["completion"]
+    return by_task
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Differential testing of candidates on generated inputs.")
+    ap.add_argument("samples", nargs="?", help="samples JSONL (default: generated_manifest_qwen.json)")
+    ap.add_argument("--n", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--no-oracle", action="store_true", help="use majority vote instead of canonical")
+    ap.add_argument("--out", default="difftest_report.jsonl")
+    args = ap.parse_args()
+
+    from datasets import load_dataset
+    problems = {ex["task_id"]: ex for ex in load_dataset("openai_humaneval")["test"]}
+    by_task = candidates_from_samples(args.samples) if args.samples else candidates_from_manifest()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, open(args.out, "w") as out:
+        for task_id, cands in by_task.items():
+            p = problems[task_id]
+            # Completions are whole functions; keep the prompt for its imports and helpers
+            cands = {name: p["prompt"] + "\n" + code for name, code in cands.items()}
+            canonical = None if args.no_oracle else p["prompt"] + p["canonical_solution"]
+            reports = diff_task(task_id, p["prompt"], p["entry_point"], cands, canonical,
+                                n=args.n, seed=args.seed, pool=pool)
+            for r in reports:
+                out.write(json.dumps({"task_id": task_id, **asdict(r)}) + "\n")
+                status = "✅ agrees" if not r.disagreements else f"❌ {r.disagreements}/{r.total} disagree"
+                print(f"{task_id} {r.name}: {status}")
+                if r.counterexample:
+                    ce = r.counterexample
+                    print(f"    smallest counterexample: {ce.args} -> expected {ce.expected}, got {ce.got}")
+    print(f"\nSaved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse, contextlib, copy, io, json, math, random, signal, time, tracemalloc
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from candidate_pack import read_candidate
+from difftest import load_candidate
+from input_gen import infer_signature
+from verify import verify
+
+SIZES = (16, 64, 256, 1024, 4096)   # nominal input scale (list/str length, int magnitude)
+INPUTS_PER_SIZE = 3
+CALL_BUDGET = 1.0                    # seconds; a slower call ends the ramp for that candidate
+MIN_TIMED = 0.002                    # repeat fast calls until this much time has been measured
+TIME_FLOOR = 1e-6                    # seconds / bytes below which differences are measurement noise
+MEM_FLOOR = 4096
+REPORT_PATH = "efficiency_report.jsonl"
+
+# name -> growth function; fitted as t ≈ c·f(n) in log space
+CLASSES: Dict[str, Callable[[float], float]] = {
+    "O(1)": lambda n: 1.0,
+    "O(log n)": lambda n: math.log2(n + 1),
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * math.log2(n + 1),
+    "O(n^2)": lambda n: n ** 2,
+    "O(n^3)": lambda n: n ** 3,
+}
+
+
+@dataclass
+class Profile:
+    points: Dict[Tuple[int, int], Tuple[float, float, float]] = field(default_factory=dict)  # (size, k) -> (n, s, bytes)
+    timed_out_at: Optional[int] = None     # nominal size whose call exceeded CALL_BUDGET
+    errors: int = 0
+
+
+@dataclass
+class EfficiencyReport:
+    task_id: str
+    candidate: str
+    time_class: str
+    canonical_time_class: str
+    memory_class: str
+    canonical_memory_class: str
+    slowdown: Optional[float]          # candidate / canonical time at the largest common size
+    memory_ratio: Optional[float]      # same, for peak allocated bytes
+    at_size: Optional[int]
+    timed_out_at: Optional[int] = None
+
+
+class _Budget(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _Budget()
+
+
+# --------- MEASUREMENT ----------
+def scale(args: tuple) -> float:
+    """Problem size n: container/str lengths (nested), magnitude of top-level ints."""
+    def inner(v: Any) -> int:
+        if isinstance(v, (list, tuple, set, dict)):
+            return len(v) + sum(inner(x) for x in v if isinstance(x, (list, tuple, set, dict, str)))
+        return len(v) if isinstance(v, str) else 0
+    n = 0
+    for a in args:
+        if isinstance(a, int) and not isinstance(a, bool):
+            n += abs(a)
+        else:
+            n += inner(a)
+    return max(n, 1)
+
+
+def time_call(fn: Callable, args: tuple) -> float:
+    """Best-of per-call time; fast calls are repeated until MIN_TIMED has been spent."""
+    best, spent = math.inf, 0.0
+    while spent < MIN_TIMED:
+        a = copy.deepcopy(args)
+        t0 = time.perf_counter()
+        fn(*a)
+        dt = time.perf_counter() - t0
+        best, spent = min(best, dt), spent + dt
+        if dt > MIN_TIMED:
+            break
+    return best
+
+
+def peak_bytes(fn: Callable, args: tuple) -> float:
+    a = copy.deepcopy(args)
+    tracemalloc.start()
+    try:
+        fn(*a)
+        return float(tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+
+def scaled_inputs(prompt: str, entry_point: str, seed: int = 0) -> Dict[int, List[tuple]]:
+    sig = infer_signature(prompt, entry_point)
+    rng = random.Random(seed)
+    return {size: [tuple(a.strategy(rng, size) for a in sig.args) for _ in range(INPUTS_PER_SIZE)]
+            for size in SIZES}
+
+
+def profile(fn: Callable, inputs: Dict[int, List[tuple]]) -> Profile:
+    """Time and peak memory per input, ramping sizes until a call exceeds CALL_BUDGET."""
+    prof = Profile()
+    old = signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        for size, batch in inputs.items():
+            for k, args in enumerate(batch):
+                signal.setitimer(signal.ITIMER_REAL, CALL_BUDGET)
+                try:
+                    t = time_call(fn, args)
+                    m = peak_bytes(fn, args)
+                except _Budget:
+                    prof.timed_out_at = size
+                    return prof
+                except Exception:
+                    prof.errors += 1
+                    continue
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+                prof.points[(size, k)] = (scale(args), t, m)
+    finally:
+        signal.signal(signal.SIGALRM, old)
+    return prof
+
+
+def fit_class(points: List[Tuple[float, float]], floor: float) -> str:
+    """
+    Growth class whose a + c·f(n) best fits the points (least squares on relative error,
+    so the constant call overhead does not read as growth). A more complex class must
+    beat the simpler ones by 10%.
+    """
+    pts = [(n, max(y, floor)) for n, y in points if n > 0]
+    if len({n for n, _ in pts}) < 3:
+        return "?"
+    best, best_err = "?", math.inf
+    for name, f in CLASSES.items():
+        err = _fit_error([(f(n), y) for n, y in pts])
+        if err < best_err * 0.9:
+            best, best_err = name, err
+    return best
+
+
+def _fit_error(pts: List[Tuple[float, float]]) -> float:
+    """Weighted (1/y²) residual of the best y ≈ a + c·x with a, c >= 0."""
+    w = [1 / y ** 2 for _, y in pts]
+    sw = sum(w)
+    sx = sum(wi * x for wi, (x, _) in zip(w, pts))
+    sy = sum(wi * y for wi, (_, y) in zip(w, pts))
+    sxx = sum(wi * x * x for wi, (x, _) in zip(w, pts))
+    sxy = sum(wi * x * y for wi, (x, y) in zip(w, pts))
+    det = sw * sxx - sx * sx
+    a, c = ((sxx * sy - sx * sxy) / det, (sw * sxy - sx * sy) / det) if det > 0 else (sy / sw, 0.0)
+    if c < 0:
+        a, c = sy / sw, 0.0
+    elif a < 0:
+        a, c = 0.0, sxy / sxx
+    return sum(wi * (y - a - c * x) ** 2 for wi, (x, y) in zip(w, pts))
+
+
+def _ratio(cand: Profile, ref: Profile, col: int) -> Tuple[Optional[float], Optional[int]]:
+    """Mean candidate/canonical ratio over the inputs of the largest size both finished."""
+    common = cand.points.keys() & ref.points.keys()
+    if not common:
+        return None, None
+    size = max(s for s, _ in common)
+    vals = [cand.points[key][col] / ref.points[key][col] for key in common
+            if key[0] == size and ref.points[key][col] > 0]
+    return (float(f"{sum(vals) / len(vals):.3g}") if vals else None), size
+
+
+def compare(task_id: str, name: str, code: str, problem: dict,
+            ref_cache: Dict[str, Tuple[Dict[int, List[tuple]], Profile]]) -> Optional[EfficiencyReport]:
+    prompt, entry = problem["prompt"], problem["entry_point"]
+    if task_id not in ref_cache:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref_fn = load_candidate(prompt + problem["canonical_solution"], entry)
+        inputs = scaled_inputs(prompt, entry)
+        ref_cache[task_id] = (inputs, profile(ref_fn, inputs))
+    inputs, ref = ref_cache[task_id]
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn = load_candidate(prompt + "\n" + code, entry)
+        if fn is None:
+            return None
+        cand = profile(fn, inputs)
+    slowdown, at = _ratio(cand, ref, 1)
+    mem_ratio, _ = _ratio(cand, ref, 2)
+    c_pts, r_pts = list(cand.points.values()), list(ref.points.values())
+    return EfficiencyReport(
+        task_id, name,
+        fit_class([(n, t) for n, t, _ in c_pts], TIME_FLOOR), fit_class([(n, t) for n, t, _ in r_pts], TIME_FLOOR),
+        fit_class([(n, m) for n, _, m in c_pts], MEM_FLOOR), fit_class([(n, m) for n, _, m in r_pts], MEM_FLOOR),
+        slowdown, mem_ratio, at, cand.timed_out_at)
+
+
+# --------- CANDIDATES ----------
+def passing_candidates(problems: Dict[str, dict], manifest: Optional[str],
+                       samples: List[str]) -> List[Tuple[str, str, str]]:
+    """(task_id, name, code) for candidates that pass their HumanEval check."""
+    out = []
+    if manifest:
+        for rec in json.loads(Path(manifest).read_text()):
+            tid = rec["task_id"] if "/" in rec["task_id"] else f"HumanEval/{rec['task_id']}"
+            out.append((tid, Path(rec["module"]).stem, read_candidate(rec)))
+    for path in samples:
+        results = Path(path + "_results.jsonl")
+        rows = [json.loads(l) for l in open(results if results.exists() else path) if l.strip()]
+        for i, rec in enumerate(rows):
+            if rec.get("passed", True):
+                out.append((rec["task_id"], f"{Path(path).stem}#{i}", rec["completion"]))
+    keep = []
+    for tid, name, code in out:
+        p = problems.get(tid)
+        if p is None:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            verdict = verify(code, p["prompt"], p["test"], p["entry_point"])
+        if verdict.passed:
+            keep.append((tid, name, code))
+    return keep
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Runtime and memory growth of passing candidates vs. the canonical solution.")
+    ap.add_argument("--manifest", default="generated_manifest_qwen.json")
+    ap.add_argument("--samples", action="append", default=[], help="samples JSONL (uses <path>_results.jsonl if present)")
+    ap.add_argument("--out", default=REPORT_PATH)
+    args = ap.parse_args()
+
+    from datasets import load_dataset
+    problems = {p["task_id"]: p for p in load_dataset("openai_humaneval")["test"]}
+    cands = passing_candidates(problems, args.manifest, args.samples)
+    print(f"Profiling {len(cands)} passing candidate(s) at sizes {SIZES}...")
+
+    ref_cache: Dict[str, tuple] = {}
+    with open(args.out, "w") as out:
+        for tid, name, code in cands:
+            rep = compare(tid, name, code, problems[tid], ref_cache)
+            if rep is None:
+                continue
+            out.write(json.dumps(asdict(rep)) + "\n")
+            flag = "🐢" if (rep.slowdown or 0) > 2 or rep.timed_out_at else "  "
+            slow = f"{rep.slowdown:.2f}x" if rep.slowdown is not None else "-"
+            print(f"{flag} {tid:<14} {name:<28} time {rep.time_class:<10} (ref {rep.canonical_time_class:<10}) "
+                  f"{slow:>8} @n={rep.at_size}  mem {rep.memory_class} (ref {rep.canonical_memory_class})"
+                  + (f"  timed out at n={rep.timed_out_at}" if rep.timed_out_at else ""))
+    print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
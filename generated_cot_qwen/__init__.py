@@ -0,0 +1,8 @@
+# Candidates that save_humaneval.py wrote into generated_cot_qwen.pack import from the archive
+# (candidate_pack's import hook); loose .py files here import as usual.
+import os as _os
+
+_PACK = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.abspath(__file__))), "generated_cot_qwen.pack")
+if _os.path.exists(_PACK):
+    from candidate_pack import install as _install
+    _install(_PACK)
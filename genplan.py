@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backends import Backend, SamplingParams, prompt_hash
+from profiling import stage
+
+HTTP_WORKERS = 8     # in-flight requests when the backend is a batching server (model_server.py)
+
+
+@dataclass
+class _Request:
+    prompt: str
+    params: SamplingParams
+    logits_processors: Optional[list] = None
+    generate: Optional[Callable[[str, SamplingParams, Optional[list]], str]] = None
+    callers: List[int] = field(default_factory=list)
+
+
+class GenPlan:
+    """
+    Generations a script needs, declared up front with `add` and run together with `run`.
+
+    Requests with the same prompt, sampling params, `generate` hook and logits processors
+    (the last two by identity) are generated once when the result is reproducible (greedy,
+    or a fixed seed); unseeded sampled requests stay separate samples. Unique requests run sorted by prompt, so prompts sharing a prefix are adjacent
+    (prefix caches stay warm), and concurrently against an HTTP server so its continuous
+    batching sees all of them. Results come back in `add` order, and `timings` holds each
+    one's generation latency in seconds.
+    """
+
+    def __init__(self, backend: Backend, workers: Optional[int] = None):
+        self.backend = backend
+        self.workers = workers or (HTTP_WORKERS if backend.name == "http" else 1)
+        self._requests: List[_Request] = []
+        self._index: Dict[tuple, int] = {}
+        self._added = 0
+        self.timings: List[float] = []
+
+    def add(self, prompt: str, params: Optional[SamplingParams] = None,
+            logits_processors: Optional[list] = None,
+            generate: Optional[Callable[[str, SamplingParams, Optional[list]], str]] = None) -> int:
+        """
+        Declare one generation; returns its position in the list `run` returns. `generate`
+        replaces backend.generate for this request (e.g. a reasoning-capped decode).
+        """
+        params = params or SamplingParams()
+        caller, self._added = self._added, self._added + 1
+        # hooks and processors by identity: a different constraint is a different generation.
+        # The stored request keeps them alive, so their ids cannot be reused while indexed
+        key = (prompt_hash(prompt), params.key(), id(generate) if generate else None,
+               tuple(map(id, logits_processors or ())))
+        reproducible = params.temperature == 0 or params.seed is not None
+        if reproducible and key in self._index:
+            self._requests[self._index[key]].callers.append(caller)
+            return caller
+        if reproducible:
+            self._index[key] = len(self._requests)
+        self._requests.append(_Request(prompt, params, logits_processors, generate, [caller]))
+        return caller
+
+    def __len__(self) -> int:
+        return self._added
+
+    def _generate(self, req: _Request) -> Tuple[str, float]:
+        t0 = time.perf_counter()
+        with stage("decode"):
+            text = (req.generate or self.backend.generate)(req.prompt, req.params, req.logits_processors)
+        return text, time.perf_counter() - t0
+
+    def run(self, verbose: bool = True) -> List[str]:
+        order = sorted(self._requests, key=lambda r: r.prompt)
+        t0 = time.perf_counter()
+        if self.workers > 1:
+            with ThreadPoolExecutor(self.workers) as pool:
+                texts = list(pool.map(self._generate, order))
+        else:
+            texts = [self._generate(r) for r in order]
+        results: List[str] = [""] * self._added
+        self.timings = [0.0] * self._added
+        for req, (text, seconds) in zip(order, texts):
+            for caller in req.callers:
+                results[caller], self.timings[caller] = text, seconds
+        if verbose:
+            print(f"📋 Plan: {self._added} requested → {len(order)} generated "
+                  f"({self._added - len(order)} deduplicated) in {time.perf_counter() - t0:.1f}s")
+        self._requests, self._index, self._added = [], {}, 0
+        return results
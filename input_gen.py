@@ -0,0 +1,263 @@
+import ast, hashlib, pickle, random, re, string
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Generated inputs are cached per task; bump when strategies change so stale caches are ignored.
+GEN_VERSION = 1
+CACHE_DIR = Path(".cache/inputs")
+
+Strategy = Callable[[random.Random, int], Any]
+
+
+@dataclass
+class ArgSpec:
+    name: str
+    annotation: Optional[str]
+    strategy: Strategy = field(repr=False)
+
+
+@dataclass
+class TaskSignature:
+    entry_point: str
+    args: List[ArgSpec]
+    examples: List[tuple]          # argument tuples taken from the docstring
+
+
+# --------- SIGNATURE & DOCSTRING ----------
+def find_function(prompt: str, entry_point: Optional[str] = None) -> ast.FunctionDef:
+    """The entry-point def of a HumanEval prompt (last def if no name is given)."""
+    tree = ast.parse(prompt)
+    defs = [n for n in tree.body if isinstance(n, ast.FunctionDef)]
+    if not defs:
+        raise ValueError("No function definition found in prompt.")
+    if entry_point:
+        for d in defs:
+            if d.name == entry_point:
+                return d
+    return defs[-1]
+
+
+def docstring_examples(fn: ast.FunctionDef) -> List[tuple]:
+    """
+    Argument tuples from `>>> f(...)` lines and `f(...) ==> ...` / `f(...) -> ...` examples.
+    Only literal arguments are kept.
+    """
+    doc = ast.get_docstring(fn) or ""
+    found = []
+    for m in re.finditer(rf"\b{re.escape(fn.name)}\((.*?)\)\s*(?:$|==|=>|->|➞|should)", doc, flags=re.M):
+        try:
+            args = ast.literal_eval(f"({m.group(1)},)")
+        except Exception:
+            continue
+        if len(args) == len(fn.args.args) and args not in found:
+            found.append(args)
+    return found
+
+
+def docstring_cases(prompt: str, entry_point: Optional[str] = None) -> List[Tuple[tuple, Any]]:
+    """
+    (args, expected) pairs from the prompt docstring: `>>> f(...)` followed by a literal
+    output line, or `f(...) ==> out` / `f(...) -> out` / `f(...) ➞ out` on one line.
+    """
+    fn = find_function(prompt, entry_point)
+    lines = (ast.get_docstring(fn) or "").splitlines()
+    call = re.compile(rf"\b{re.escape(fn.name)}\((.*?)\)\s*(?:(?:==>|=>|->|➞|should return|==)\s*(.+))?$")
+    cases = []
+    for i, line in enumerate(lines):
+        m = call.search(line.strip())
+        if not m:
+            continue
+        out = m.group(2)
+        if out is None and line.strip().startswith(">>>") and i + 1 < len(lines):
+            out = lines[i + 1].strip()
+        try:
+            args = ast.literal_eval(f"({m.group(1)},)")
+            expected = ast.literal_eval(out.strip().rstrip(".,")) if out else None
+        except Exception:
+            continue
+        if out and len(args) == len(fn.args.args):
+            cases.append((args, expected))
+    return cases
+
+
+def _hints(doc: str) -> Dict[str, Any]:
+    doc = doc.lower()
+    hints: Dict[str, Any] = {}
+    if re.search(r"\bnon-?negative\b", doc):
+        hints["min_int"] = 0
+    elif re.search(r"\bpositive\b", doc):
+        hints["min_int"] = 1
+    m = re.search(r"at least (one|two|three|\d+)", doc)
+    if m:
+        words = {"one": 1, "two": 2, "three": 3}
+        hints["min_len"] = words.get(m.group(1)) or int(m.group(1))
+    if "lowercase" in doc or "lower case" in doc:
+        hints["alphabet"] = string.ascii_lowercase
+    return hints
+
+
+# --------- STRATEGIES ----------
+def _int_strategy(hints: Dict[str, Any]) -> Strategy:
+    lo = hints.get("min_int")
+    if lo is not None:
+        return lambda rng, size: rng.randint(lo, lo + size)
+    return lambda rng, size: rng.randint(-size, size)
+
+
+def _float_strategy(hints: Dict[str, Any]) -> Strategy:
+    lo = hints.get("min_int")
+
+    def draw(rng: random.Random, size: int) -> float:
+        # Mix round values (ties, duplicates) with arbitrary ones
+        x = float(rng.randint(-size, size)) if rng.random() < 0.3 else round(rng.uniform(-size, size), 2)
+        return abs(x) + lo if lo is not None else x
+    return draw
+
+
+def _str_strategy(hints: Dict[str, Any]) -> Strategy:
+    alphabet = hints.get("alphabet") or string.ascii_letters + string.digits + " "
+    return lambda rng, size: "".join(rng.choice(alphabet) for _ in range(rng.randint(0, size)))
+
+
+def _list_strategy(elem: Strategy, min_len: int = 0) -> Strategy:
+    return lambda rng, size: [elem(rng, size) for _ in range(rng.randint(min_len, max(min_len, size)))]
+
+
+def strategy_for(annotation: Optional[ast.expr], hints: Dict[str, Any]) -> Optional[Strategy]:
+    """Strategy for a typing annotation such as List[float], Tuple[int, int], Optional[str]."""
+    if annotation is None:
+        return None
+    if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+        annotation = ast.parse(annotation.value, mode="eval").body
+    if isinstance(annotation, ast.Name):
+        name = annotation.id
+        if name == "int":
+            return _int_strategy(hints)
+        if name == "float":
+            return _float_strategy(hints)
+        if name == "str":
+            return _str_strategy(hints)
+        if name == "bool":
+            return lambda rng, size: rng.random() < 0.5
+        if name in ("list", "List"):
+            return _list_strategy(_int_strategy(hints), hints.get("min_len", 0))
+        return None
+    if isinstance(annotation, ast.Subscript) and isinstance(annotation.value, ast.Name):
+        outer = annotation.value.id
+        params = annotation.slice.elts if isinstance(annotation.slice, ast.Tuple) else [annotation.slice]
+        variadic = len(params) == 2 and isinstance(params[1], ast.Constant) and params[1].value is Ellipsis
+        inner = [strategy_for(p, hints) for p in params[:1 if variadic else None]]
+        if any(s is None for s in inner):
+            return None
+        if outer in ("List", "list", "Sequence", "Iterable"):
+            return _list_strategy(inner[0], hints.get("min_len", 0))
+        if variadic:
+            elem = _list_strategy(inner[0])
+            return lambda rng, size: tuple(elem(rng, size))
+        if outer in ("Tuple", "tuple"):
+            return lambda rng, size: tuple(s(rng, size) for s in inner)
+        if outer == "Optional":
+            return lambda rng, size: None if rng.random() < 0.1 else inner[0](rng, size)
+        if outer in ("Dict", "dict") and len(inner) == 2:
+            return lambda rng, size: {inner[0](rng, size): inner[1](rng, size) for _ in range(rng.randint(0, size))}
+    return None
+
+
+def strategy_from_value(value: Any, hints: Dict[str, Any]) -> Optional[Strategy]:
+    """Infer a strategy from a docstring example value (used for unannotated args)."""
+    if isinstance(value, bool):
+        return lambda rng, size: rng.random() < 0.5
+    if isinstance(value, int):
+        return _int_strategy(hints)
+    if isinstance(value, float):
+        return _float_strategy(hints)
+    if isinstance(value, str):
+        return _str_strategy(hints)
+    if isinstance(value, (list, tuple)):
+        elems = [v for v in value if v is not None]
+        elem = strategy_from_value(elems[0], hints) if elems else _int_strategy(hints)
+        if elem is None:
+            return None
+        if isinstance(value, tuple):
+            return lambda rng, size: tuple(elem(rng, size) for _ in value)
+        return _list_strategy(elem, hints.get("min_len", 0))
+    return None
+
+
+def infer_signature(prompt: str, entry_point: Optional[str] = None) -> TaskSignature:
+    fn = find_function(prompt, entry_point)
+    hints = _hints(ast.get_docstring(fn) or "")
+    examples = docstring_examples(fn)
+
+    args = []
+    for pos, a in enumerate(fn.args.args):
+        arg_hints = dict(hints)
+        # Restrict string alphabets to the characters seen in examples (e.g. '(' and ')')
+        seen = "".join(ex[pos] for ex in examples if isinstance(ex[pos], str))
+        if seen and "alphabet" not in arg_hints:
+            arg_hints["alphabet"] = "".join(sorted(set(seen)))
+        strat = strategy_for(a.annotation, arg_hints)
+        if strat is None:
+            for ex in examples:
+                strat = strategy_from_value(ex[pos], arg_hints)
+                if strat:
+                    break
+        if strat is None:
+            strat = _int_strategy(arg_hints)
+        ann = ast.unparse(a.annotation) if a.annotation is not None else None
+        args.append(ArgSpec(a.arg, ann, strat))
+    return TaskSignature(fn.name, args, examples)
+
+
+# --------- GENERATION ----------
+def input_size(args: tuple) -> int:
+    """Size measure used to pick the smallest counterexample."""
+    def size(v: Any) -> int:
+        if isinstance(v, (list, tuple, set)):
+            return 1 + sum(size(x) for x in v)
+        if isinstance(v, dict):
+            return 1 + sum(size(k) + size(x) for k, x in v.items())
+        if isinstance(v, str):
+            return 1 + len(v)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return 1 + len(str(abs(v)))
+        return 1
+    return sum(size(a) for a in args)
+
+
+def generate_inputs(sig: TaskSignature, n: int = 1000, seed: int = 0, max_size: int = 20) -> List[tuple]:
+    """
+    Docstring examples first, then random inputs whose size ramps from 0 to max_size,
+    so small counterexamples come early. Duplicates are dropped.
+    """
+    rng = random.Random(seed)
+    out, seen = [], set()
+    for ex in sig.examples:
+        key = repr(ex)
+        if key not in seen:
+            seen.add(key)
+            out.append(ex)
+    attempts = 0
+    while len(out) < n and attempts < n * 10:
+        attempts += 1
+        size = min(max_size, attempts * max_size // max(1, n) + rng.randint(0, 2))
+        args = tuple(a.strategy(rng, size) for a in sig.args)
+        key = repr(args)
+        if key not in seen:
+            seen.add(key)
+            out.append(args)
+    return out
+
+
+def cached_inputs(task_id: str, prompt: str, entry_point: Optional[str] = None,
+                  n: int = 1000, seed: int = 0) -> List[tuple]:
+    """generate_inputs with an on-disk cache keyed by task, prompt hash, n, seed and GEN_VERSION."""
+    key = hashlib.sha256(f"{GEN_VERSION}|{prompt}|{entry_point}|{n}|{seed}".encode()).hexdigest()[:16]
+    path = CACHE_DIR / f"{task_id.replace('/', '_')}__{key}.pkl"
+    if path.exists():
+        return pickle.loads(path.read_bytes())
+    inputs = generate_inputs(infer_signature(prompt, entry_point), n=n, seed=seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(pickle.dumps(inputs))
+    return inputs
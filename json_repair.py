@@ -0,0 +1,138 @@
+import json, re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+# Counts of each repair applied in this process (generate_structured prints them)
+REPAIR_STATS: Counter = Counter()
+
+_NEXT_KEY = re.compile(r"\s*,\s*[\"']\w+[\"']\s*:")
+_KEY_END = re.compile(r"\s*:")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_ESCAPABLE = set('"\\/bfnrtu')
+_CONTROL = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _closes_value(text: str, i: int, depth: int, last_brace: int) -> bool:
+    """Is the quote at text[i] the end of a value string (rather than a quote inside code)?"""
+    rest = text[i + 1:]
+    if _NEXT_KEY.match(rest):
+        return True
+    stripped = rest.lstrip()
+    if not stripped:
+        return True
+    if stripped[0] == "}":
+        # only the object's last brace can follow the closing quote; braces in code are dict literals
+        return depth > 1 or i + 1 + (len(rest) - len(stripped)) == last_brace
+    return stripped[0] in ",]" and depth > 1
+
+
+def repair_json(text: str) -> Tuple[Optional[dict], List[str]]:
+    """
+    Parse the first JSON object in a model generation in one left-to-right pass, fixing
+    what small models get wrong: prose or fences around the object, raw newlines/tabs and
+    unescaped double quotes inside strings, invalid escapes (regexes in code), single-quoted
+    strings, Python True/False/None, trailing commas and a truncated end.
+    Returns (object or None, names of the repairs applied).
+    """
+    repairs: List[str] = []
+    start = text.find("{")
+    if start == -1:
+        return None, ["no_object"]
+    if text[:start].strip():
+        repairs.append("leading_text")
+    last_brace = text.rfind("}")
+
+    out: List[str] = []
+    depth, i, n = 0, start, len(text)
+    in_str, quote, is_key = False, '"', False
+    expect_key = False
+    while i < n:
+        c = text[i]
+        if in_str:
+            if c == "\\":
+                nxt = text[i + 1] if i + 1 < n else ""
+                if quote == "'" and nxt == "'":
+                    out.append("'")
+                    i += 2
+                    continue
+                if nxt in _ESCAPABLE and nxt:
+                    out.append(c + nxt)
+                    i += 2
+                    continue
+                out.append("\\\\")
+                repairs.append("invalid_escape")
+                i += 1
+                continue
+            if c == quote:
+                if is_key:
+                    closes = _KEY_END.match(text, i + 1) is not None
+                else:
+                    closes = _closes_value(text, i, depth, last_brace)
+                if closes:
+                    out.append('"')
+                    in_str = False
+                else:
+                    out.append('\\"')
+                    repairs.append("unescaped_quote")
+            elif c == '"':            # inside a single-quoted string
+                out.append('\\"')
+            elif c in _CONTROL or ord(c) < 0x20:
+                out.append(_CONTROL.get(c, f"\\u{ord(c):04x}"))
+                repairs.append("newline_in_string" if c == "\n" else "control_char")
+            else:
+                out.append(c)
+            i += 1
+            continue
+
+        if c in "\"'":
+            if c == "'":
+                repairs.append("single_quotes")
+            in_str, quote, is_key = True, c, expect_key
+            out.append('"')
+        elif c in "{[":
+            depth += 1
+            expect_key = c == "{"
+            out.append(c)
+        elif c in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                repairs.append("trailing_comma")
+            depth -= 1
+            out.append(c)
+            if depth == 0:
+                i += 1
+                break
+        elif c == ",":
+            expect_key = True
+            out.append(c)
+        elif c == ":":
+            expect_key = False
+            out.append(c)
+        elif c.isalpha():
+            m = re.match(r"[A-Za-z_]+", text[i:])
+            word = m.group(0)
+            if word in _LITERALS:
+                repairs.append("python_literal")
+                word = _LITERALS[word]
+            out.append(word)
+            i += len(m.group(0))
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    if depth > 0 or in_str:
+        repairs.append("truncated")
+        if in_str:
+            out.append('"')
+        out.append("}" * max(depth, 1))
+    elif text[i:].strip():
+        repairs.append("trailing_text")
+
+    try:
+        obj = json.loads("".join(out))
+    except json.JSONDecodeError:
+        return None, sorted(set(repairs)) + ["unrepairable"]
+    return (obj if isinstance(obj, dict) else None), sorted(set(repairs))
@@ -3,7 +3,11 @@ from pathlib import Path
 import pytest
 from datasets import load_dataset
 
-from mlx_lm import load, generate
+from backends import SamplingParams, get_backend
+from genplan import GenPlan
+from prompt_budget import dedupe_assert_shapes, fit_prompt, strip_test_noise
+from profiling import set_task, stage
+from testgen_stream import assert_keys, extract_tests, stream_summary, stream_tests
 
 
 
@@ -16,6 +20,15 @@ def find_first_function_name(src_text: str) -> str:
 
 
 def make_prompt(func, tests):
+    """Coverage prompt; the pasted tests are de-noised and fit to the prompt token budget."""
+    def render(tests):
+        return _render_prompt(func, tests)
+
+    return fit_prompt(render, {"tests": tests}, backend.count_tokens, "coverage prompt",
+                      always={"tests": [strip_test_noise]}, lossy={"tests": [dedupe_assert_shapes]})
+
+
+def _render_prompt(func, tests):
     prompt = f'''
     
 You are an expert Python software tester specializing in coverage-driven test generation.
@@ -85,35 +98,13 @@ Existing tests (HumanEval baseline + LLM iteration 1):
 
 '''.strip()
     messages = [{"role": "user", "content": prompt_pal}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    return backend.apply_chat_template(messages)
 
 
 def finalize_llm_tests(raw_text: str, out_path: str, func_name: str, module_path: str):
 
-    cleaned = re.sub(r"```python|```", "", raw_text).strip()
-    blocks, current = [], []
-
-    for line in cleaned.splitlines():
-        if line.strip().startswith("def test_"):
-            if current:
-                blocks.append("\n".join(current))
-                current = []
-            current.append(line.rstrip())
-        elif current:
-            current.append(line.rstrip())
-
-    if current:
-        blocks.append("\n".join(current))
-
-    blocks = [b for b in blocks if "assert" in b]
-    blocks = [b for b in blocks if b.strip().endswith(")") or b.strip().endswith("]")]
-
-    seen, unique_blocks = set(), []
-    for b in blocks:
-        norm = re.sub(r"\s+", " ", b).strip()
-        if norm not in seen:
-            seen.add(norm)
-            unique_blocks.append(b)
+    # complete, parseable, asserting, non-duplicate test functions (a half-written last one is dropped)
+    unique_blocks = extract_tests(raw_text)
 
     import_block = f"""import importlib, pytest
         mod = importlib.import_module("{module_path}") {func_name} = getattr(mod, "{func_name}") """
@@ -130,7 +121,7 @@ def finalize_llm_tests(raw_text: str, out_path: str, func_name: str, module_path
 
 
 MODEL_ID = "mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit"
-model, tokenizer = load(MODEL_ID)
+backend = get_backend(MODEL_ID)
 
 
 
@@ -144,9 +135,20 @@ PROMPTS = {ex["task_id"]: ex["prompt"] for ex in dataset}
 
 # task_id = ['70', '10']
 task_id = ['20']
+NEW_TESTS = 5           # stop generating once this many new tests have arrived
+
+def tests_generate(seen):
+    """A GenPlan generate hook that streams until NEW_TESTS tests not already in `seen` are out."""
+    def generate(prompt, params, logits_processors=None):
+        return "\n\n".join(stream_tests(backend, prompt, NEW_TESTS, params, seen,
+                                         logits_processors=logits_processors))
+    return generate
 
 candidates = ["c1", "c2", "c3"]
 
+# Declare every generation first; identical greedy prompts are generated once
+plan = GenPlan(backend)
+jobs = []
 for task in task_id:
     if task not in TESTS:
             for k in TESTS.keys():
@@ -164,33 +166,33 @@ for task in task_id:
         func_name = find_first_function_name(prompt)
     except AssertionError:
         func_name = "unknown_function"
+    seen = assert_keys(tests, {"candidate": func_name})
 
+    set_task(task)
+    with stage("prompt"):
+        llm_prompt = make_prompt(prompt, tests)   # the same for every candidate of a task
+    generate = tests_generate(seen)              # one hook per task, so its candidates share the generation
     for cand in candidates:
-        t_id = task.split('/')[1]
-        module_path = f"/Users/ssethi/Documents/cot/generated_cot_qwen/{t_id}__{cand}"
-        output_file = f"{t_id}__{cand}_new_tests.py"
-        llm_prompt = make_prompt(prompt, tests)
-        new_tests = generate(
-            model,
-            tokenizer,
-            prompt=llm_prompt,
-            max_tokens=300,
-        ).strip()
-
-        code = re.sub(r"^```python|```$", "", new_tests, flags=re.MULTILINE).strip()
-        print('==========')
-        print(code)
-        print('==========')
+        slot = plan.add(llm_prompt, SamplingParams(max_tokens=300, temperature=0.0),  # mlx_lm.generate default: greedy
+                        generate=generate)
+        jobs.append((task, cand, func_name, slot))
+
+outputs = plan.run()
+
+for task, cand, func_name, slot in jobs:
+    t_id = task.split('/')[1]
+    module_path = f"/Users/ssethi/Documents/cot/generated_cot_qwen/{t_id}__{cand}"
+    output_file = f"{t_id}__{cand}_new_tests.py"
+    set_task(f"{task}/{cand}")
+    new_tests = outputs[slot].strip()
+
+    code = re.sub(r"^```python|```$", "", new_tests, flags=re.MULTILINE).strip()
+    print('==========')
+    print(code)
+    print('==========')
+    with stage("finalize"):
         finalize_llm_tests(code, output_file, func_name, module_path)
-        print(f"Wrote {output_file} with import from {module_path}")
-
-    print("=" * 80 + "\n")
-
-
-
-
-
-
-
-
+    print(f"Wrote {output_file} with import from {module_path}")
 
+print(f"🧪 {stream_summary()}")
+print("=" * 80 + "\n")
@@ -1,16 +1,35 @@
-import json, re, sys, time, traceback
-from typing import Optional, List
+import ast, json, re, sys, time, traceback
+from collections import Counter, defaultdict
+from dataclasses import replace
+from typing import Dict, Optional, List
 
-# MLX LM
-from mlx_lm import load, generate
-from mlx_lm.sample_utils import make_sampler
+# Generation backend (MLX by default; COT_BACKEND=cpu|http|stub elsewhere)
+from backends import SamplingParams, get_backend
 # Data + eval
 from datasets import load_dataset
 from human_eval.evaluation import evaluate_functional_correctness
 
+# Staged verification (cheap checks before any exec of the HumanEval tests)
+from verify import ASSERT_STATS, AssertHistory, quick_verify, verify
+
+# Declared-up-front, deduplicated generation batches
+from genplan import GenPlan
+
+# Token budgeting for repair prompts
+from prompt_budget import budget_summary, compact_cot_json, compact_traceback, fit_prompt
+
+# Tolerant JSON parsing when strict validation fails
+from json_repair import REPAIR_STATS, repair_json
+
+# Opt-in per-stage profiling (COT_PROFILE=cprofile|sample)
+from profiling import set_task, stage
+
 # Pydantic schema
 from pydantic import BaseModel, ValidationError
 
+# Python-aware masking inside the "code" string (needs numpy and a backend that takes logits processors)
+from code_constraint import HAVE_NUMPY, PythonCodeProcessor, code_stats_summary
+
 # Optional: outlines for stricter JSON enforcement (falls back if not present)
 try:
     from outlines.processors.structured import JSONLogitsProcessor
@@ -19,13 +38,26 @@ except Exception:
     HAVE_OUTLINES = False
 
 
-# --------- MODEL & TOKENIZER (MLX) ----------
+# --------- MODEL & TOKENIZER ----------
 # Recommended tiny coder SLM (fast on M-series). Swap to Llama 3.2 3B if you prefer.
 # MODEL_ID = "mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit"
 MODEL_ID = "mlx-community/gemma-2-2b-it-4bit"
 
-model, tokenizer = load(MODEL_ID)  # downloads if missing
-# (MLX handles Apple GPU/CPU automatically)
+backend = get_backend(MODEL_ID)  # model loads (and downloads if missing) on first generation
+
+# Default sampling for generate_structured (sweep.py overrides it per run)
+SAMPLING = SamplingParams(max_tokens=2024, temperature=0.2, top_p=0.95)
+
+# Mask tokens that would make the "code" field unparseable or break the prompt's quoting rules
+SYNTAX_CONSTRAINED = True
+
+# Generation modes: "cot" (reasoning, then code), "capped" (reasoning cut after
+# REASONING_CAP tokens while decoding) or "code" (code-only schema, no reasoning tokens)
+GEN_MODES = ("cot", "capped", "code")
+GEN_MODE = "cot"
+GEN_MODE_BY_TASK: Dict[str, str] = {}     # task_id -> mode, overrides GEN_MODE for that task
+REASONING_CAP = 48
+CODE_ONLY_MAX_TOKENS = 768                # a code-only answer needs no room for reasoning
 
 
 # --------- STRUCTURE SCHEMA ----------
@@ -34,16 +66,32 @@ class CotOutput(BaseModel):
     code: str
 
 
-def make_cot_prompt(problem_text: str) -> str:
+class CodeOutput(BaseModel):
+    code: str
+
+
+def mode_for(task_id: str) -> str:
+    return GEN_MODE_BY_TASK.get(task_id, GEN_MODE)
+
+
+def schema_block(mode: Optional[str], reasoning: str,
+                 code: str = "a complete Python function starting with 'def ' on the first line") -> str:
+    """The JSON shape a prompt asks for in this mode."""
+    mode = mode or GEN_MODE
+    if mode == "code":
+        return f'{{\n  "code": "{code}"\n}}'
+    if mode == "capped":
+        reasoning = f"one short sentence (it is cut after {REASONING_CAP} tokens)"
+    return f'{{\n  "reasoning": "{reasoning}",\n  "code": "{code}"\n}}'
+
+
+def make_cot_prompt(problem_text: str, mode: Optional[str] = None) -> str:
     user = f"""
 You are an expert Python programmer.
 
 Goal: Return ONLY a single JSON object that validates against:
 
-{{
-  "reasoning": "1–4 concise sentences",
-  "code": "a complete Python function starting with 'def ' on the first line"
-}}
+{schema_block(mode, "1–4 concise sentences")}
 
 Hard rules (critical):
 - Output must be a single JSON object. No markdown, no backticks, no prefixes/suffixes.
@@ -58,12 +106,13 @@ Problem:
 """.strip()
 
     messages = [{"role": "user", "content": user}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    with stage("chat_template"):
+        return backend.apply_chat_template(messages)
 
 
 
 
-def make_reflection_prompt(problem_text: str, first_json: str) -> str:
+def make_reflection_prompt(problem_text: str, first_json: str, mode: Optional[str] = None) -> str:
     """
     Ask the model to self-review the previous JSON (reasoning + code) and return a corrected JSON.
     """
@@ -75,10 +124,7 @@ You previously wrote this JSON (reasoning + code):
 
 Review it for logical, syntax, or efficiency errors.
 Return a corrected JSON object using the same schema:
-{{
-  "reasoning": "1–4 concise sentences",
-  "code": "a complete Python function starting with 'def ' on the first line"
-}}
+{schema_block(mode, "1–4 concise sentences")}
 
 Rules:
 - Output only one JSON object, no markdown or prose.
@@ -94,32 +140,55 @@ Problem:
 {problem_text.strip()}
 """.strip()
     messages = [{"role": "user", "content": user}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    with stage("chat_template"):
+        return backend.apply_chat_template(messages)
+
+
+# Reflection calls made vs. skipped because the first answer already verified
+SELF_EDIT_STATS = {"reflections": 0, "skipped": 0}
+
+# Default `first` of the solvers: generate the draft here. An explicit None is a shared
+# draft that failed (draft_from already spent its retries), so the solver gives up at once.
+FRESH = object()
 
 
-def solve_with_self_edit(problem_text: str) -> Optional[CotOutput]:
+def solve_with_self_edit(problem_text: str, first: Optional[CotOutput] = FRESH,
+                         mode: Optional[str] = None) -> Optional[CotOutput]:
     """
     Two-step pipeline:
-    1. Generate initial reasoning+code (CoT)
-    2. Ask model to reflect and improve the same code
+    1. Generate initial reasoning+code (CoT), unless a shared `first` draft is given
+    2. Cheap verification (parse, compile, docstring examples); if that passes, keep it
+    3. Otherwise (or if nothing could be checked) ask model to reflect and improve the same code
     """
-    first_prompt = make_cot_prompt(problem_text)
-    first = generate_structured(first_prompt)
+    if first is FRESH:
+        first = generate_structured(make_cot_prompt(problem_text, mode), mode=mode)
     if not first:
         return None
 
-    reflection_prompt = make_reflection_prompt(problem_text, first.model_dump_json())
-    second = generate_structured(reflection_prompt)
+    with stage("verify"):
+        verdict = quick_verify(first.code, problem_text)
+    if verdict.passed:
+        SELF_EDIT_STATS["skipped"] += 1
+        print(f"✅ Skipping reflection: {verdict.message}.")
+        return first
+    print(f"🔁 Reflecting ({verdict.stage}: {verdict.message})")
+    SELF_EDIT_STATS["reflections"] += 1
+
+    reflection_prompt = make_reflection_prompt(problem_text, first.model_dump_json(), mode)
+    second = generate_structured(reflection_prompt, mode=mode)
 
     return second or first
 
 
 
-def make_debug_prompt(problem_text: str, prev_json: str, error_msg: str) -> str:
+def make_debug_prompt(problem_text: str, prev_json: str, error_msg: str, mode: Optional[str] = None) -> str:
     """
     Ask the model to fix its previous code based on a runtime or assertion error.
+    The previous JSON and error are compacted (first sentence of reasoning, last frame
+    of a traceback) and the prompt is fit to the token budget.
     """
-    user = f"""
+    def render(prev_json: str, error_msg: str) -> str:
+        user = f"""
 You are a Python debugging assistant.
 
 Your previous solution (as JSON) failed during testing:
@@ -129,10 +198,7 @@ Error message:
 {error_msg.strip()}
 
 Analyze the cause and return a corrected JSON object:
-{{
-  "reasoning": "1–3 concise sentences explaining the bug and fix",
-  "code": "a complete Python function starting with 'def '"
-}}
+{schema_block(mode, "1–3 concise sentences explaining the bug and fix", "a complete Python function starting with 'def '")}
 
 Rules:
 - Keep the same function signature.
@@ -141,45 +207,54 @@ Rules:
 - Output ONE JSON object, no markdown, no prose.
 - Escape backslashes and quotes correctly.
 """
-    messages = [{"role": "user", "content": user}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        messages = [{"role": "user", "content": user}]
+        return backend.apply_chat_template(messages)
 
+    with stage("debug_prompt"):
+        return fit_prompt(render, {"prev_json": prev_json, "error_msg": error_msg}, backend.count_tokens,
+                          "debug prompt",
+                          always={"prev_json": [compact_cot_json], "error_msg": [compact_traceback]})
 
-def solve_with_self_debug(problem_text: str, problem_tests: str, max_rounds: int = 3) -> Optional[CotOutput]:
+
+# List every failing HumanEval assert in the debug prompt instead of only the first
+REPORT_ALL_FAILURES = False
+
+
+def solve_with_self_debug(problem_text: str, problem_tests: str, max_rounds: int = 3,
+                          first: Optional[CotOutput] = FRESH,
+                          all_failures: Optional[bool] = None,
+                          mode: Optional[str] = None) -> Optional[CotOutput]:
     """
-    1. Generate initial reasoning+code.
-    2. Execute it against HumanEval tests.
-    3. On error or assertion failure, feed back the traceback to the model for repair.
+    1. Generate initial reasoning+code (or start from a shared `first` draft).
+    2. Verify it in stages (parse, compile, undefined names, docstring examples, HumanEval tests),
+       stopping at the first failing stage. The HumanEval check runs assert by assert, the
+       asserts that failed in earlier rounds first, stopping at the first failure (or
+       collecting all of them with `all_failures` / REPORT_ALL_FAILURES).
+    3. On failure, feed back the structured error to the model for repair.
     """
-    first = generate_structured(make_cot_prompt(problem_text))
+    if first is FRESH:
+        first = generate_structured(make_cot_prompt(problem_text, mode), mode=mode)
     if not first:
         return None
+    history = AssertHistory()
+    all_failures = REPORT_ALL_FAILURES if all_failures is None else all_failures
 
-    ns = {}
     for round_no in range(1, max_rounds + 1):
-        try:
-            preamble = "from typing import *\n"
-            fn_name_match = re.search(r'def\s+(\w+)\s*\(', first.code)
-            if not fn_name_match:
-                raise ValueError("No function definition found in code.")
-            fn = fn_name_match.group(1)
-            wrapper = f"\ndef candidate(*args, **kwargs):\n    return {fn}(*args, **kwargs)\n"
-            exec(preamble + first.code + wrapper, ns, ns)
-            exec(problem_tests, ns, ns)
-            ns["check"](ns["candidate"])
+        with stage("verify"):
+            verdict = verify(first.code, problem_text, problem_tests, history=history, all_failures=all_failures)
+        if verdict.passed:
             print(f"✅ Passed after {round_no} round(s).")
             return first  # success
-        except Exception as e:
-            error_msg = traceback.format_exc(limit=5)
-            print(f"⚠️ Round {round_no} failed:\n{error_msg}")
-
-            # Generate debug prompt with the captured error
-            debug_prompt = make_debug_prompt(problem_text, first.model_dump_json(), error_msg)
-            fixed = generate_structured(debug_prompt)
-            if not fixed:
-                print("⚠️ Failed to parse fixed JSON, stopping.")
-                break
-            first = fixed
+        error_msg = verdict.for_prompt()
+        print(f"⚠️ Round {round_no} failed:\n{error_msg}")
+
+        # Generate debug prompt with the captured error
+        debug_prompt = make_debug_prompt(problem_text, first.model_dump_json(), error_msg, mode)
+        fixed = generate_structured(debug_prompt, mode=mode)
+        if not fixed:
+            print("⚠️ Failed to parse fixed JSON, stopping.")
+            break
+        first = fixed
     return first
 
 
@@ -194,118 +269,279 @@ def extract_json(text: str) -> Optional[str]:
     return None
 
 
-def generate_structured(prompt: str,
-                        max_new_tokens: int = 2024,
-                        temperature: float = 0.2,
-                        top_p: float = 0.95,
-                        retries: int = 3) -> Optional[CotOutput]:
+def sampling_params(max_new_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                    top_p: Optional[float] = None, mode: Optional[str] = None) -> SamplingParams:
+    """SAMPLING with any explicitly given argument overriding it."""
+    if max_new_tokens is None:
+        max_new_tokens = SAMPLING.max_tokens
+        if (mode or GEN_MODE) == "code":
+            max_new_tokens = min(max_new_tokens, CODE_ONLY_MAX_TOKENS)
+    return SamplingParams(
+        max_tokens=max_new_tokens,
+        temperature=SAMPLING.temperature if temperature is None else temperature,
+        top_p=SAMPLING.top_p if top_p is None else top_p,
+    )
+
+
+def json_logits_processors(mode: Optional[str] = None, prefix: str = "") -> Optional[list]:
     """
-    Use MLX to generate; validate with Pydantic; retry a few times.
-    If `outlines` is available, add a JSON logits processor to strongly bias output to the schema.
+    Decoding constraints for the mode's schema, if this backend takes them: the outlines
+    JSON constraint, then the Python syntax/quoting constraint on the code field. With a
+    `prefix` (answer text already in the prompt) only the code constraint applies.
     """
-    schema = CotOutput.model_json_schema()
-
-    logits_processors = None
-    if HAVE_OUTLINES:
+    if not backend.supports_logits_processors:
+        return None
+    processors = []
+    if HAVE_OUTLINES and not prefix:
+        schema = CodeOutput if (mode or GEN_MODE) == "code" else CotOutput
         try:
             # Stronger JSON constraint (token-level masking)
-            logits_processors = [JSONLogitsProcessor(schema)]
+            processors.append(JSONLogitsProcessor(schema.model_json_schema()))
         except Exception:
-            logits_processors = None
+            pass
+    if SYNTAX_CONSTRAINED and HAVE_NUMPY:
+        processors.append(PythonCodeProcessor(backend.tokenizer, prefix=prefix))
+    return processors or None
 
-    for attempt in range(1, retries + 1):
-        sampler = make_sampler(temperature, top_p=top_p)
-        text = generate(
-            model,
-            tokenizer,
-            prompt=prompt,
-            max_tokens=max_new_tokens,
-            sampler=sampler,
-            verbose=False,
-            logits_processors=logits_processors,  # works if outlines installed
-        ).strip()
-
-        # Helpful for debugging — keep short
-        print(f"\n=== Raw output (attempt {attempt}) ===\n{text[:600]}\n====================")
 
+# Per mode: generations, generated tokens, decode seconds, reasoning cuts (printed by main)
+MODE_STATS: Dict[str, Counter] = defaultdict(Counter)
+
+_REASONING_KEY = re.compile(r'"reasoning"\s*:\s*"')
+
+
+def generate_capped(prompt: str, params: SamplingParams, logits_processors: Optional[list] = None) -> str:
+    """
+    Decode a CoT answer whose reasoning string may run for REASONING_CAP tokens (stream
+    pieces). At the cap the stream is closed, the string is closed for the model, and
+    decoding resumes from prompt + answer so far + '", "code": "' with the tokens left.
+    """
+    stream = backend.stream(prompt, params, logits_processors)
+    text, where, count, escaped = "", "before", 0, False
+    for piece in stream:
+        text += piece
+        if where == "before":
+            m = _REASONING_KEY.search(text)
+            if not m:
+                continue
+            where, piece = "in", text[m.end():]
+        if where == "after":
+            continue
+        for c in piece:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                where = "after"
+                break
+        count += where == "in"
+        if count >= REASONING_CAP:
+            stream.close()
+            MODE_STATS["capped"]["cuts"] += 1
+            head = text.rstrip("\\") + '", "code": "'
+            left = replace(params, max_tokens=max(64, params.max_tokens - backend.count_tokens(head)))
+            return head + backend.generate(prompt + head, left, json_logits_processors("capped", prefix=head))
+    return text
+
+
+def _generate(prompt: str, params: SamplingParams, logits_processors: Optional[list] = None,
+              mode: Optional[str] = None) -> str:
+    """One raw generation in `mode`, with its tokens and time charged to MODE_STATS."""
+    mode = mode or GEN_MODE
+    t0 = time.perf_counter()
+    if mode == "capped":
+        text = generate_capped(prompt, params, logits_processors)
+    else:
+        text = backend.generate(prompt, params, logits_processors=logits_processors)
+    stats = MODE_STATS[mode]
+    stats["generations"] += 1
+    stats["tokens"] += backend.count_tokens(text)
+    stats["ms"] += int((time.perf_counter() - t0) * 1000)
+    return text
+
+
+def parse_structured(text: str, attempt: int = 1, mode: Optional[str] = None) -> Optional[CotOutput]:
+    """
+    Validate one raw generation as CotOutput, repairing malformed JSON; None if unusable.
+    In code-only mode the answer is a CodeOutput, returned as CotOutput with no reasoning.
+    """
+    # Helpful for debugging — keep short
+    print(f"\n=== Raw output (attempt {attempt}) ===\n{text[:600]}\n====================")
+    schema = CodeOutput if (mode or GEN_MODE) == "code" else CotOutput
+
+    with stage("json_repair"):
         candidate = extract_json(text) or text
         try:
-            parsed = CotOutput.model_validate_json(candidate)
+            parsed = schema.model_validate_json(candidate)
             # Minimal sanity check
             if not parsed.code.strip().startswith("def "):
                 raise ValueError("Code does not start with 'def '.")
-            return parsed
+            return CotOutput(reasoning=getattr(parsed, "reasoning", ""), code=parsed.code)
         except ValidationError:
-            # heuristic fix for triple quotes or bad JSON
-            fixed = re.sub(r'"""[\s\S]*?"""', '', candidate)
-            fixed = re.sub(r"'''[\s\S]*?'''", '', fixed)
+            # tolerant re-parse of the same text: raw newlines, stray quotes, prose, ...
+            obj, repairs = repair_json(text)
+            REPAIR_STATS.update(repairs)
             try:
-                parsed = CotOutput.model_validate_json(fixed)
+                parsed = schema.model_validate(obj)
                 if not parsed.code.strip().startswith('def '):
                     raise ValueError("Code does not start with 'def '.")
-                return parsed
+                # closing a cut-off object yields valid JSON around half a function
+                ast.parse(parsed.code)
+                REPAIR_STATS["repaired"] += 1
+                print(f"🩹 Repaired JSON ({', '.join(repairs) or 'no changes'})")
+                return CotOutput(reasoning=getattr(parsed, "reasoning", ""), code=parsed.code)
             except Exception as e2:
-                print(f"⚠️ Secondary JSON repair failed: {e2}")
-                continue
+                REPAIR_STATS["resampled"] += 1
+                print(f"⚠️ Secondary JSON repair failed ({', '.join(repairs)}): {e2}")
+                return None
+
+
+def generate_structured(prompt: str,
+                        max_new_tokens: Optional[int] = None,
+                        temperature: Optional[float] = None,
+                        top_p: Optional[float] = None,
+                        retries: int = 3,
+                        mode: Optional[str] = None) -> Optional[CotOutput]:
+    """
+    Generate with the configured backend; validate with Pydantic; retry a few times.
+    Unset sampling arguments come from SAMPLING, an unset mode from GEN_MODE.
+    If the backend takes logits processors, constrain decoding with json_logits_processors
+    (outlines JSON schema if installed, Python syntax of the code field).
+    """
+    logits_processors = json_logits_processors(mode)
+    params = sampling_params(max_new_tokens, temperature, top_p, mode)
 
+    for attempt in range(1, retries + 1):
+        with stage("decode"):
+            text = _generate(prompt, params, logits_processors, mode).strip()
+        parsed = parse_structured(text, attempt, mode)
+        if parsed:
+            return parsed
 
     return None
 
 
+def plan_drafts(plan: GenPlan, prompt: str, n: int, mode: Optional[str] = None) -> List[int]:
+    """Declare `n` first-draft generations of a CoT prompt; see `draft_from`."""
+    mode = mode or GEN_MODE
+
+    def generate(prompt: str, params: SamplingParams, logits_processors: Optional[list]) -> str:
+        return _generate(prompt, params, logits_processors, mode)
+
+    params, processors = sampling_params(mode=mode), json_logits_processors(mode)
+    # one hook and processor list for all n, so identical greedy drafts still dedupe
+    return [plan.add(prompt, params, processors, generate) for _ in range(n)]
+
+
+def draft_from(text: str, prompt: str, retries: int = 3, mode: Optional[str] = None) -> Optional[CotOutput]:
+    """Parse a planned draft; an unusable one is re-sampled like generate_structured would."""
+    return (parse_structured(text.strip(), mode=mode)
+            or (generate_structured(prompt, retries=retries - 1, mode=mode) if retries > 1 else None))
+
+def mode_report(results_path: str, modes: Dict[str, str], k: List[int]) -> List[str]:
+    """Latency, generated tokens and pass@k per generation mode (from human_eval's per-sample results)."""
+    from human_eval.evaluation import estimate_pass_at_k
+    passed: Dict[str, List[bool]] = defaultdict(list)
+    with open(results_path) as f:
+        for rec in map(json.loads, f):
+            passed[rec["task_id"]].append(rec["passed"])
+    lines = []
+    for mode in GEN_MODES:
+        tasks = [t for t, m in modes.items() if m == mode and passed[t]]
+        st = MODE_STATS[mode]
+        if not st["tasks"]:
+            continue
+        n, c = [len(passed[t]) for t in tasks], [sum(passed[t]) for t in tasks]
+        scores = " ".join(f"pass@{x} {estimate_pass_at_k(n, c, x).mean():.3f}" for x in k if tasks and min(n) >= x)
+        cuts = f" | {st['cuts']} reasoning cuts" if st["cuts"] else ""
+        lines.append(f"🧭 {mode}: {st['tasks']} tasks | {st['task_ms'] / 1000 / st['tasks']:.1f}s/task | "
+                     f"{st['tokens'] / max(1, st['generations']):.0f} tok/generation | {scores or 'no scores'}{cuts}")
+    return lines
+
+
 def main():
     # Load HumanEval (164 tasks)
     dataset = load_dataset("openai_humaneval")["test"]
     samples = [dataset[i] for i in range(0, min(len(dataset), 100), 10)]
     print(f"Evaluating {len(samples)} problems...")
 
-    all_results: List[dict] = []
+    out_path = "samples_custom_structured_gemma.jsonl"
     n_comps_per_task = 3 
     # USE_SELF_EDIT = True 
     USE_DEBUG = True
 
 
-    for idx, s in enumerate(samples, 1):
-        problem_text = s["prompt"]
-        completions: List[str] = []
-
-        # if USE_SELF_EDIT:
-        #     for _ in range(n_comps_per_task):
-        #         result = solve_with_self_edit(problem_text)  
-        #         if result:
-        #             completions.append(result.code.strip() + "\n")
-        if USE_DEBUG:
-            for _ in range(n_comps_per_task):
-                result = solve_with_self_debug(problem_text, s["test"])
-                if result:
-                    completions.append(result.code.strip() + "\n")
-        else:
-            prompt = make_cot_prompt(problem_text)
-            for _ in range(n_comps_per_task):
-                result = generate_structured(prompt)
-                if result:
-                    completions.append(result.code.strip() + "\n")
-
-        for c in completions:
-            all_results.append({"task_id": s["task_id"], "completion": c})
-
-        print(f"Task {idx}/{len(samples)} | completions: {len(completions)}")
+    # First drafts for every task go out as one plan: each CoT prompt is built once per
+    # task and all drafts are generated together (concurrently against model_server.py)
+    # The generation mode (full CoT / capped reasoning / code-only) is chosen per task
+    plan = GenPlan(backend)
+    modes = {s["task_id"]: mode_for(s["task_id"]) for s in samples}
+    prompts = [make_cot_prompt(s["prompt"], modes[s["task_id"]]) for s in samples]
+    slots = [plan_drafts(plan, prompt, n_comps_per_task, modes[s["task_id"]]) for s, prompt in zip(samples, prompts)]
+    set_task("plan")
+    drafts = plan.run()
+
+    with open(out_path, "w") as out:  # streamed per task, so memory stays flat over long sweeps
+        for idx, (s, prompt) in enumerate(zip(samples, prompts), 1):
+            set_task(s["task_id"])
+            problem_text = s["prompt"]
+            mode = modes[s["task_id"]]
+            t0 = time.perf_counter()
+            completions: List[str] = []
+            firsts = [draft_from(drafts[slot], prompt, mode=mode) for slot in slots[idx - 1]]
+
+            # if USE_SELF_EDIT:
+            #     for first in firsts:
+            #         result = solve_with_self_edit(problem_text, first=first)
+            #         if result:
+            #             completions.append(result.code.strip() + "\n")
+            if USE_DEBUG:
+                for first in firsts:
+                    result = solve_with_self_debug(problem_text, s["test"], first=first, mode=mode)
+                    if result:
+                        completions.append(result.code.strip() + "\n")
+            else:
+                for result in firsts:
+                    if result:
+                        completions.append(result.code.strip() + "\n")
+
+            for c in completions:
+                out.write(json.dumps({"task_id": s["task_id"], "completion": c}) + "\n")
+            out.flush()
+            MODE_STATS[mode]["tasks"] += 1
+            MODE_STATS[mode]["task_ms"] += int((time.perf_counter() - t0 + sum(plan.timings[i] for i in slots[idx - 1])) * 1000)
+
+            print(f"Task {idx}/{len(samples)} | completions: {len(completions)}")
 
-    out_path = "samples_custom_structured_gemma.jsonl"
-    with open(out_path, "w") as f:
-        for r in all_results:
-            f.write(json.dumps(r) + "\n")
     print(f"\nSaved: {out_path}")
 
     # HumanEval scoring
-    scores = evaluate_functional_correctness(
-        out_path,
-        n_workers=4,
-        k=[1, 3],
-        timeout=7.0,          # seconds per test to stay snappy
-        ignore_incomplete=True,
-    )
+    with stage("evaluate"):
+        scores = evaluate_functional_correctness(
+            out_path,
+            n_workers=4,
+            k=[1, 3],
+            timeout=7.0,          # seconds per test to stay snappy
+            ignore_incomplete=True,
+        )
     print("\n🎯 Final HumanEval scores:")
     print(scores)
+    for line in mode_report(out_path + "_results.jsonl", modes, [1, 3]):
+        print(line)
+    print(f"⏱️ {backend.name}: {backend.stats.summary()}")
+    print(f"✂️ Prompt budget: {budget_summary()}")
+    if REPAIR_STATS["repaired"] or REPAIR_STATS["resampled"]:
+        print(f"🩹 JSON repair: {REPAIR_STATS['repaired']} repaired, "
+              f"{REPAIR_STATS['resampled']} re-sampled | {dict(REPAIR_STATS)}")
+    if ASSERT_STATS["runs"]:
+        print(f"🎯 Assert runner: {ASSERT_STATS['executed']}/{ASSERT_STATS['total']} asserts executed "
+              f"over {ASSERT_STATS['runs']} check runs")
+    if code_stats_summary():
+        print(f"🐍 Code constraint: {code_stats_summary()}")
+    if SELF_EDIT_STATS["reflections"] or SELF_EDIT_STATS["skipped"]:
+        print(f"🪞 Self-edit: {SELF_EDIT_STATS['reflections']} reflection calls, "
+              f"{SELF_EDIT_STATS['skipped']} skipped")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+import argparse, json, queue, select, socket, threading, time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backends import Backend, SamplingParams, get_backend
+
+MAX_BATCH = 16      # sequences decoded together per model
+CLIENT_POLL = 0.5   # seconds between checks that a waiting client is still connected
+
+
+@dataclass
+class GenRequest:
+    prompt: str
+    params: SamplingParams
+    out: "queue.Queue[Optional[str]]" = field(default_factory=queue.Queue)   # pieces, None = done
+    submitted: float = field(default_factory=time.perf_counter)
+    cancelled: threading.Event = field(default_factory=threading.Event)   # client went away
+    error: Optional[str] = None       # set (before the final None) when the backend failed
+
+
+# --------- ENGINES ----------
+class InterleavedEngine:
+    """
+    Continuous batching over any Backend: every scheduler step advances each active
+    sequence by one piece, and new requests join between steps instead of waiting for
+    the batch to drain. Used for the stub, CPU and HTTP backends.
+    """
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.active: List[Tuple[GenRequest, Iterator[str]]] = []
+        self.cancelled = 0
+
+    def add(self, req: GenRequest):
+        self.active.append((req, self.backend.stream(req.prompt, req.params)))
+
+    def step(self) -> int:
+        tokens, still = 0, []
+        for req, it in self.active:
+            if req.cancelled.is_set():
+                if hasattr(it, "close"):
+                    it.close()      # e.g. lets an HTTP backend drop its upstream stream
+                self.cancelled += 1
+                continue
+            try:
+                req.out.put(next(it))
+                tokens += 1
+                still.append((req, it))
+            except StopIteration:
+                req.out.put(None)
+            except Exception as e:
+                req.error = f"{type(e).__name__}: {e}"
+                req.out.put(None)
+        self.active = still
+        return tokens
+
+
+class MLXBatchEngine:
+    """
+    True batched decoding with mlx_lm's BatchGenerator: one forward pass per step for all
+    active sequences. Requests are grouped by (temperature, top_p) since the sampler is
+    shared per generator; per-request seeds are not honoured inside a shared batch.
+    """
+
+    def __init__(self, backend: Backend):
+        from mlx_lm.generate import BatchGenerator
+        from mlx_lm.sample_utils import make_sampler
+        self.backend = backend
+        self.model, self.tokenizer = backend._load()
+        self._make = lambda t, p: BatchGenerator(self.model, sampler=make_sampler(t, top_p=p),
+                                                 stop_tokens=set(self.tokenizer.eos_token_ids))
+        self.groups: Dict[Tuple[float, float], object] = {}
+        self.seqs: Dict[Tuple[Tuple[float, float], int], Tuple[GenRequest, List[int], str]] = {}
+        self.cancelled = 0
+
+    @property
+    def active(self):
+        return list(self.seqs)
+
+    def add(self, req: GenRequest):
+        key = (req.params.temperature, req.params.top_p)
+        if key not in self.groups:
+            self.groups[key] = self._make(*key)
+        (uid,) = self.groups[key].insert([self.tokenizer.encode(req.prompt)], req.params.max_tokens)
+        self.seqs[(key, uid)] = (req, [], "")
+
+    def _drop_cancelled(self):
+        for key, uid in [k for k, (req, _, _) in self.seqs.items() if req.cancelled.is_set()]:
+            if hasattr(self.groups[key], "remove"):
+                self.groups[key].remove([uid])   # frees its slot in the batch
+            del self.seqs[(key, uid)]
+            self.cancelled += 1
+
+    def step(self) -> int:
+        self._drop_cancelled()
+        tokens = 0
+        for key, gen in list(self.groups.items()):
+            for r in gen.next():
+                if (key, r.uid) not in self.seqs:
+                    continue    # cancelled, on an mlx_lm whose BatchGenerator cannot remove it
+                req, toks, text = self.seqs[(key, r.uid)]
+                if r.finish_reason != "stop":
+                    toks.append(r.token)
+                new_text = self.tokenizer.decode(toks)
+                if len(new_text) > len(text):
+                    req.out.put(new_text[len(text):])
+                tokens += 1
+                if r.finish_reason is not None:
+                    req.out.put(None)
+                    del self.seqs[(key, r.uid)]
+                else:
+                    self.seqs[(key, r.uid)] = (req, toks, new_text)
+        return tokens
+
+
+def make_engine(backend: Backend):
+    if backend.name == "mlx":
+        try:
+            return MLXBatchEngine(backend)
+        except ImportError:
+            pass  # older mlx_lm without BatchGenerator
+    return InterleavedEngine(backend)
+
+
+# --------- SCHEDULER ----------
+class ModelWorker:
+    """One loaded model: a request queue and a scheduler thread feeding its engine."""
+
+    def __init__(self, backend: Backend, max_batch: int = MAX_BATCH):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.pending: "queue.Queue[GenRequest]" = queue.Queue()
+        self.started = time.time()
+        self.requests = self.tokens = 0
+        self.busy_seconds = 0.0
+        self._engine = None
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, prompt: str, params: SamplingParams) -> GenRequest:
+        req = GenRequest(prompt, params)
+        self.pending.put(req)
+        return req
+
+    def _loop(self):
+        self._engine = make_engine(self.backend)
+        engine = self._engine
+        while True:
+            if not engine.active:
+                self._admit(self.pending.get())  # idle: block until work arrives
+            while len(engine.active) < self.max_batch:
+                try:
+                    self._admit(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            t0 = time.perf_counter()
+            self.tokens += engine.step()
+            self.busy_seconds += time.perf_counter() - t0
+
+    def _admit(self, req: GenRequest):
+        if req.cancelled.is_set():
+            req.out.put(None)       # gave up while queued; never decoded
+            return
+        self._engine.add(req)
+        self.requests += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "queue_depth": self.pending.qsize(),
+            "active": len(self._engine.active) if self._engine else 0,
+            "requests": self.requests,
+            "cancelled": self._engine.cancelled if self._engine else 0,
+            "completion_tokens": self.tokens,
+            "tokens_per_second": round(self.tokens / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+
+class ModelRegistry:
+    """Loads each model once, on first request (or at startup with --preload)."""
+
+    def __init__(self, backend_name: str, max_batch: int = MAX_BATCH):
+        self.backend_name = backend_name
+        self.max_batch = max_batch
+        self.workers: Dict[str, ModelWorker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_id: str) -> ModelWorker:
+        with self._lock:
+            if model_id not in self.workers:
+                self.workers[model_id] = ModelWorker(get_backend(model_id, self.backend_name), self.max_batch)
+            return self.workers[model_id]
+
+
+# --------- HTTP ----------
+class Handler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible subset plus llama.cpp-style helpers, so OpenAIHTTPBackend is the client:
+      POST /v1/completions   {"model", "prompt", "max_tokens", "temperature", "top_p", "seed", "stop", "stream"}
+      POST /apply-template   {"model", "messages"} -> {"prompt"}
+      POST /tokenize         {"model", "content"}  -> {"tokens"}  (only the count is meaningful)
+      GET  /stats
+    """
+    protocol_version = "HTTP/1.1"
+    registry: ModelRegistry = None
+    default_model: str = ""
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _client_gone(self) -> bool:
+        """Has the client closed its end? (the socket reads as EOF)"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def _pieces(self, req: GenRequest) -> Iterator[str]:
+        """The request's output; cancels it (so the engine stops decoding) once the client is gone."""
+        while True:
+            try:
+                piece = req.out.get(timeout=CLIENT_POLL)
+            except queue.Empty:
+                piece = ""
+            if piece is None:
+                return
+            if self._client_gone():
+                req.cancelled.set()
+                return
+            if piece:
+                yield piece
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._json(200, {"models": {m: w.stats() for m, w in self.registry.workers.items()}})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError as e:
+            return self._json(400, {"error": f"bad JSON: {e}"})
+        worker = self.registry.get(body.get("model") or self.default_model)
+        path = self.path.rstrip("/")
+        if path == "/apply-template":
+            return self._json(200, {"prompt": worker.backend.apply_chat_template(body["messages"])})
+        if path == "/tokenize":
+            return self._json(200, {"tokens": [0] * worker.backend.count_tokens(body.get("content", ""))})
+        if path != "/v1/completions":
+            return self._json(404, {"error": "not found"})
+
+        params = SamplingParams(max_tokens=body.get("max_tokens", 2024),
+                                temperature=body.get("temperature", 0.2),
+                                top_p=body.get("top_p", 0.95), seed=body.get("seed"),
+                                stop=list(body.get("stop") or []))
+        req = worker.submit(body["prompt"], params)
+        pieces = self._pieces(req)
+        if not body.get("stream"):
+            text = "".join(pieces)
+            if req.cancelled.is_set():
+                self.close_connection = True
+                return
+            if req.error:
+                return self._json(500, {"error": {"message": req.error, "type": "server_error"}})
+            return self._json(200, {"object": "text_completion", "model": body.get("model"),
+                                    "choices": [{"index": 0, "text": text, "finish_reason": "stop"}]})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(data: str):
+            raw = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(raw):X}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for piece in pieces:
+                chunk(json.dumps({"choices": [{"index": 0, "text": piece, "finish_reason": None}]}))
+            if req.cancelled.is_set():
+                return
+            if req.error:   # headers are out already: report it in-band, as OpenAI streams do
+                chunk(json.dumps({"error": {"message": req.error, "type": "server_error"}}))
+            chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            req.cancelled.set()     # the client closed its stream (e.g. an early stop); stop decoding
+            self.close_connection = True
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, backend: str = "mlx",
+          default_model: str = "", preload: Optional[List[str]] = None,
+          max_batch: int = MAX_BATCH) -> ThreadingHTTPServer:
+    """Start the server in a background thread and return it (call .shutdown() to stop)."""
+    registry = ModelRegistry(backend, max_batch)
+    for m in preload or []:
+        registry.get(m)
+    handler = type("BoundHandler", (Handler,), {"registry": registry, "default_model": default_model})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Shared local generation server with continuous batching.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--backend", default="mlx", help="engine behind the server: mlx, cpu or stub")
+    ap.add_argument("--model", default="mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit",
+                    help="model used when a request does not name one")
+    ap.add_argument("--preload", action="append", default=[], help="model id to load at startup")
+    ap.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = ap.parse_args()
+
+    server = serve(args.host, args.port, args.backend, args.model, args.preload, args.max_batch)
+    print(f"🚀 Serving {args.backend} on http://{args.host}:{args.port} "
+          f"(clients: COT_BACKEND=http COT_BASE_URL=http://{args.host}:{args.port})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
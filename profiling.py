@@ -0,0 +1,271 @@
+import atexit, cProfile, json, os, pstats, sys, threading, time, tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+    HAVE_RESOURCE = True
+except Exception:
+    HAVE_RESOURCE = False
+
+# Opt-in: COT_PROFILE=cprofile (deterministic, per-stage self time), COT_PROFILE=sample
+# (a background thread samples stacks every COT_PROFILE_INTERVAL seconds) or
+# COT_PROFILE=memory (tracemalloc peaks per stage, RSS per task). Unset = no-op.
+MODE = os.environ.get("COT_PROFILE", "").strip().lower()
+OUT_DIR = os.environ.get("COT_PROFILE_DIR", ".cache/profile")
+SAMPLE_INTERVAL = float(os.environ.get("COT_PROFILE_INTERVAL", 0.005))
+MEM_SNAPSHOT_EVERY = int(os.environ.get("COT_MEM_EVERY", 20))   # diff snapshots on 1st and every Nth call
+MEM_FRAMES = 5
+TOP_N = 15
+
+# wall time per (stage, task): [seconds, calls]; collected in both modes
+WALL: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0, 0])
+PROFILES: Dict[str, cProfile.Profile] = {}
+SAMPLES: Counter = Counter()            # "stage;frame;frame..." -> samples
+MEM_PEAK: Dict[str, int] = {}           # stage -> highest traced bytes reached inside it
+MEM_SITES: Dict[str, Counter] = defaultdict(Counter)   # stage -> "file:line" -> retained bytes
+MEM_TASKS: List[dict] = []              # one row per task: rss / traced memory when it ended
+
+_stacks: Dict[int, List[str]] = {}      # thread id -> open stages
+_local = threading.local()
+_current_task = ["-"]
+_sampler: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def enabled() -> bool:
+    return MODE in ("cprofile", "sample", "memory")
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable, e.g. macOS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        if not HAVE_RESOURCE:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def set_task(task_id: str):
+    """Attribute the stages that follow to `task_id` (in memory mode, log memory at the switch)."""
+    if MODE == "memory" and _current_task[0] != "-":
+        current, peak = tracemalloc.get_traced_memory()
+        MEM_TASKS.append({"task": _current_task[0], "rss_mb": round(rss_mb(), 1),
+                          "traced_mb": round(current / 2**20, 2), "peak_traced_mb": round(peak / 2**20, 2)})
+    _current_task[0] = task_id
+
+
+@contextmanager
+def stage(name: str):
+    """Time (and profile, if enabled) a named pipeline stage. Nested stages are excluded from their parent."""
+    if not enabled():
+        yield
+        return
+    stack = _stacks.setdefault(threading.get_ident(), [])
+    stack.append(name)
+    parent = getattr(_local, "profile", None)
+    prof = None
+    if MODE == "cprofile" and threading.current_thread() is threading.main_thread():
+        if parent:
+            parent.disable()
+        prof = PROFILES.setdefault(name, cProfile.Profile())
+        prof.enable()
+        _local.profile = prof
+    mem = _mem_enter(name) if MODE == "memory" else None
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        cell = WALL[(name, _current_task[0])]
+        cell[0] += time.perf_counter() - t0
+        cell[1] += 1
+        if mem:
+            _mem_exit(name, *mem)
+        if prof:
+            prof.disable()
+            _local.profile = parent
+            if parent:
+                parent.enable()
+        stack.pop()
+
+
+# --------- MEMORY ----------
+_peaks: List[int] = []      # peak reached by children of each open stage (reset_peak is global)
+_mem_calls: Counter = Counter()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    own = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    return tracemalloc.take_snapshot().filter_traces(own)
+
+
+def _mem_enter(name: str) -> tuple:
+    snap = _snapshot() if _mem_calls[name] % MEM_SNAPSHOT_EVERY == 0 else None
+    _mem_calls[name] += 1
+    current, peak = tracemalloc.get_traced_memory()
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], peak)
+    _peaks.append(0)
+    tracemalloc.reset_peak()
+    return current, snap
+
+
+def _mem_exit(name: str, entry_bytes: int, snap):
+    peak = max(tracemalloc.get_traced_memory()[1], _peaks.pop())
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], peak)
+    MEM_PEAK[name] = max(MEM_PEAK.get(name, 0), peak - entry_bytes)
+    if snap is not None:
+        for diff in _snapshot().compare_to(snap, "lineno"):
+            if diff.size_diff > 0:
+                frame = diff.traceback[0]
+                MEM_SITES[name][f"{os.path.basename(frame.filename)}:{frame.lineno}"] += diff.size_diff
+
+
+def memory_report() -> dict:
+    set_task("-")   # close the last task's row
+    return {
+        "peak_rss_mb": max([t["rss_mb"] for t in MEM_TASKS] + [rss_mb()]),
+        "stage_peak_mb": {s: round(b / 2**20, 2) for s, b in sorted(MEM_PEAK.items(), key=lambda kv: -kv[1])},
+        "top_sites": {s: [(site, round(b / 2**10, 1)) for site, b in c.most_common(5)]
+                      for s, c in MEM_SITES.items()},
+        "tasks": MEM_TASKS,
+    }
+
+
+# --------- SAMPLING ----------
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample_loop():
+    me = threading.get_ident()
+    while not _stop.wait(SAMPLE_INTERVAL):
+        frames = sys._current_frames()
+        for tid, stack in list(_stacks.items()):
+            if tid == me or not stack or tid not in frames:
+                continue
+            labels, f = [], frames[tid]
+            while f is not None:
+                if not f.f_code.co_filename.endswith(("profiling.py", "contextlib.py")):
+                    labels.append(_frame_label(f.f_code))
+                f = f.f_back
+            SAMPLES[";".join(stack[-1:] + labels[::-1])] += 1
+
+
+def start():
+    global _sampler
+    if MODE == "memory" and not tracemalloc.is_tracing():
+        tracemalloc.start(MEM_FRAMES)
+    if MODE == "sample" and _sampler is None:
+        _sampler = threading.Thread(target=_sample_loop, daemon=True)
+        _sampler.start()
+
+
+# --------- REPORTING ----------
+def _own(func: tuple) -> bool:
+    return "_lsprof" in func[2]   # the enable/disable calls made by stage() itself
+
+
+def _func_label(func: tuple) -> str:
+    filename, line, name = func
+    return name if filename == "~" else f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks() -> List[str]:
+    """Collapsed-stack lines ("a;b;c weight") for flamegraph.pl / speedscope / inferno."""
+    if MODE == "sample":
+        return [f"{stack} {n}" for stack, n in SAMPLES.most_common()]
+    lines = []
+    for name, prof in PROFILES.items():
+        # cProfile keeps caller edges, not full stacks: stage;caller;callee weighted by self time (µs)
+        for func, (_, _, tt, _, callers) in pstats.Stats(prof).stats.items():
+            if _own(func):
+                continue
+            if not callers:
+                lines.append(f"{name};{_func_label(func)} {int(tt * 1e6)}")
+            for caller, edge in callers.items():
+                weight = int(edge[2] * 1e6) if isinstance(edge, tuple) else 0
+                if weight:
+                    lines.append(f"{name};{_func_label(caller)};{_func_label(func)} {weight}")
+    return lines
+
+
+def hotspots(n: int = TOP_N) -> List[Tuple[str, str, float]]:
+    """(stage, function, self time in s or sample share) for the `n` hottest functions."""
+    spots = []
+    if MODE == "sample":
+        leaf: Counter = Counter()
+        for stack, count in SAMPLES.items():
+            parts = stack.split(";")
+            leaf[(parts[0], parts[-1])] += count
+        total = sum(leaf.values()) or 1
+        spots = [(s, f, c / total) for (s, f), c in leaf.items()]
+    else:
+        for name, prof in PROFILES.items():
+            for func, (_, _, tt, _, _) in pstats.Stats(prof).stats.items():
+                if not _own(func):
+                    spots.append((name, _func_label(func), tt))
+    return sorted(spots, key=lambda r: -r[2])[:n]
+
+
+def report(verbose: bool = True) -> Optional[str]:
+    """Write <OUT_DIR>/<mode>-<time>.collapsed (+ .prof per stage) and print the stage/hotspot summary."""
+    if not enabled() or not WALL:
+        return None
+    _stop.set()
+    os.makedirs(OUT_DIR, exist_ok=True)
+    base = os.path.join(OUT_DIR, f"{MODE}-{time.strftime('%Y%m%d-%H%M%S')}")
+    if MODE == "memory":
+        return _write_memory_report(base, verbose)
+    with open(base + ".collapsed", "w") as f:
+        f.write("\n".join(collapsed_stacks()) + "\n")
+    for name, prof in PROFILES.items():
+        prof.dump_stats(f"{base}.{name}.prof")
+
+    per_stage: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+    for (name, _), (secs, calls) in WALL.items():
+        per_stage[name][0] += secs
+        per_stage[name][1] += calls
+    out = [f"⏱️ Stages ({MODE}):"]
+    for name, (secs, calls) in sorted(per_stage.items(), key=lambda kv: -kv[1][0]):
+        out.append(f"  {name:<18} {secs:8.2f}s  {calls:5d} calls  {1000 * secs / calls:8.1f} ms/call")
+    slow = sorted(WALL.items(), key=lambda kv: -kv[1][0])[:5]
+    out.append("  slowest (stage, task): " + ", ".join(f"{s}@{t} {v[0]:.2f}s" for (s, t), v in slow))
+    unit = "share" if MODE == "sample" else "self s"
+    out.append(f"🔥 Top {TOP_N} hotspots ({unit}):")
+    out += [f"  {v:8.3f}  {s:<18} {fn}" for s, fn, v in hotspots()]
+    out.append(f"  flamegraph: {base}.collapsed")
+    text = "\n".join(out)
+    with open(base + ".txt", "w") as f:
+        f.write(text + "\n")
+    if verbose:
+        print(text)
+    return base
+
+
+def _write_memory_report(base: str, verbose: bool) -> str:
+    rep = memory_report()
+    with open(base + ".json", "w") as f:
+        json.dump(rep, f, indent=2)
+    out = [f"🧠 Peak RSS {rep['peak_rss_mb']:.0f} MB; traced peak above stage entry:"]
+    for name, mb in rep["stage_peak_mb"].items():
+        sites = ", ".join(f"{site} {kb:.0f} KB" for site, kb in rep["top_sites"].get(name, [])[:3])
+        out.append(f"  {name:<18} {mb:8.2f} MB   {sites}")
+    if rep["tasks"]:
+        first, last = rep["tasks"][0], rep["tasks"][-1]
+        out.append(f"  RSS over {len(rep['tasks'])} tasks: {first['rss_mb']:.0f} → {last['rss_mb']:.0f} MB "
+                   f"(traced {first['traced_mb']:.1f} → {last['traced_mb']:.1f} MB)")
+    out.append(f"  details: {base}.json")
+    if verbose:
+        print("\n".join(out))
+    return base
+
+
+if enabled():
+    start()
+    atexit.register(report)
@@ -0,0 +1,169 @@
+import ast, json, os, re
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+# Default prompt budget in tokens (COT_PROMPT_BUDGET overrides); prefill time grows with it.
+DEFAULT_BUDGET = int(os.environ.get("COT_PROMPT_BUDGET", 1536))
+MAX_REASONING_CHARS = 160
+
+Counter = Callable[[str], int]
+Compressor = Callable[[str], str]
+
+
+@dataclass
+class BudgetReport:
+    label: str
+    before: int
+    after: int
+
+    @property
+    def saved(self) -> int:
+        return self.before - self.after
+
+
+BUDGET_LOG: List[BudgetReport] = []
+
+
+def budget_summary() -> str:
+    before = sum(r.before for r in BUDGET_LOG)
+    saved = sum(r.saved for r in BUDGET_LOG)
+    pct = 100 * saved / before if before else 0.0
+    return f"{len(BUDGET_LOG)} prompts | saved {saved} of {before} tokens ({pct:.0f}%)"
+
+
+# --------- LOSSLESS-ISH COMPRESSORS (always applied) ----------
+def compact_traceback(error_msg: str) -> str:
+    """
+    Keep the exception line and the last frame of a Python traceback; for assertion
+    failures that frame is the failing assert. Non-traceback messages pass through.
+    """
+    if "Traceback (most recent call last)" not in error_msg:
+        return error_msg.strip()
+    lines = error_msg.rstrip().splitlines()
+    frame_idx = [i for i, l in enumerate(lines) if l.lstrip().startswith("File ")]
+    if not frame_idx:
+        return error_msg.strip()
+    last = frame_idx[-1]
+    tail = [l for l in lines[last:] if not set(l.strip()) <= set("^~ ")]
+    return "\n".join(l.strip() for l in tail)
+
+
+def compact_cot_json(prev_json: str, max_chars: int = MAX_REASONING_CHARS) -> str:
+    """Keep the code of a previous CotOutput JSON verbatim, cut its reasoning to the first sentence."""
+    try:
+        obj = json.loads(prev_json)
+    except (json.JSONDecodeError, TypeError):
+        return prev_json
+    reasoning = str(obj.get("reasoning", "")).strip()
+    first = re.split(r"(?<=[.!?])\s", reasoning, maxsplit=1)[0]
+    obj["reasoning"] = first if len(first) <= max_chars else first[:max_chars].rstrip() + "…"
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def strip_test_noise(tests: str) -> str:
+    """Drop comments, blank runs, the METADATA dict and exact duplicate asserts from test code."""
+    out, seen = [], set()
+    skip_metadata = False
+    for line in tests.splitlines():
+        s = line.strip()
+        if s.startswith("METADATA"):
+            skip_metadata = not s.endswith("}")
+            continue
+        if skip_metadata:
+            skip_metadata = not s.endswith("}")
+            continue
+        if not s or s.startswith("#"):
+            continue
+        if s.startswith("assert "):
+            key = re.sub(r"\s+", "", s)
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(line.rstrip())
+    return "\n".join(out)
+
+
+# --------- LOSSY COMPRESSORS (only when over budget) ----------
+def _shape(value) -> tuple:
+    if isinstance(value, (list, tuple, str, dict, set)):
+        n = len(value)
+        return (type(value).__name__, n.bit_length())   # length bucket: 0, 1, 2-3, 4-7, ...
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (type(value).__name__, value < 0, value == 0)
+    return (type(value).__name__,)
+
+
+def dedupe_assert_shapes(tests: str) -> str:
+    """
+    Keep one `assert candidate(...) == ...` per input shape (types, length bucket, sign);
+    asserts with the same shape most likely exercise the same branches.
+    """
+    out, seen = [], set()
+    for line in tests.splitlines():
+        m = re.match(r"\s*assert\s+candidate\((.*)\)\s*(==|is|!=)", line)
+        if m:
+            try:
+                args = ast.literal_eval(f"({m.group(1)},)")
+                key = tuple(_shape(a) for a in args)
+            except Exception:
+                key = None
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+        out.append(line)
+    return "\n".join(out)
+
+
+def trim_middle(text: str, keep_ratio: float = 0.7) -> str:
+    """Keep the head and tail lines, replacing the middle with a marker."""
+    lines = text.splitlines()
+    keep = max(2, int(len(lines) * keep_ratio))
+    if keep >= len(lines):
+        return text
+    head = keep // 2
+    return "\n".join(lines[:head] + ["# ... (trimmed)"] + lines[len(lines) - (keep - head):])
+
+
+# --------- BUDGETING ----------
+def fit_prompt(render: Callable[..., str], parts: Dict[str, str], count: Counter, label: str,
+               always: Dict[str, List[Compressor]] = None, lossy: Dict[str, List[Compressor]] = None,
+               budget: int = DEFAULT_BUDGET, verbose: bool = True) -> str:
+    """
+    Render a prompt from `parts`, compressed to fit `budget` tokens:
+    1. `always` compressors run on their parts unconditionally,
+    2. while over budget, `lossy` compressors run one at a time,
+    3. still over budget: the largest lossy-eligible part is trimmed from the middle.
+    The saving against the uncompressed prompt is logged in BUDGET_LOG.
+    """
+    always, lossy = always or {}, lossy or {}
+    before = count(render(**parts))
+    parts = dict(parts)
+    for name, fns in always.items():
+        for fn in fns:
+            parts[name] = fn(parts[name])
+    prompt = render(**parts)
+    n = count(prompt)
+
+    steps = [(name, fn) for name, fns in lossy.items() for fn in fns]
+    while n > budget and steps:
+        name, fn = steps.pop(0)
+        parts[name] = fn(parts[name])
+        prompt = render(**parts)
+        n = count(prompt)
+    for _ in range(8):
+        if n <= budget or not lossy:
+            break
+        name = max(lossy, key=lambda k: len(parts[k]))
+        trimmed = trim_middle(parts[name])
+        if trimmed == parts[name]:
+            break
+        parts[name] = trimmed
+        prompt = render(**parts)
+        n = count(prompt)
+
+    report = BudgetReport(label, before, n)
+    BUDGET_LOG.append(report)
+    if verbose and report.saved:
+        print(f"✂️ {label}: {before} → {n} tokens (saved {report.saved})")
+    return prompt
@@ -0,0 +1,116 @@
+import json, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from difftest import execute_candidates, output_signature
+from input_gen import cached_inputs, docstring_cases
+
+# Optional: NumPy for clustering the signature matrix (falls back to tuple grouping)
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except Exception:
+    HAVE_NUMPY = False
+
+N_INPUTS = 100      # shared inputs per task; small on purpose, reranking must stay cheap
+
+
+@dataclass
+class RerankResult:
+    task_id: str
+    completion: str
+    index: int              # position of the pick among the task's completions
+    cluster_size: int
+    n_candidates: int
+    doctest_passes: int
+    n_doctests: int
+    score: float
+
+
+def cluster_scores(sig_matrix: List[List[str]], expected: List[str]):
+    """
+    Cluster candidates by identical output rows and score each cluster.
+
+    `sig_matrix` is candidates x inputs, the first len(expected) columns being the
+    docstring examples. Score = size * (1 + doctest passes) * fraction of non-error
+    outputs, so a big cluster of crashing candidates does not win.
+    Returns (cluster id per candidate, score per cluster, doctest passes per cluster, sizes).
+    """
+    n_doc = len(expected)
+    if HAVE_NUMPY:
+        vocab: Dict[str, int] = {}
+        ids = np.array([[vocab.setdefault(s, len(vocab)) for s in row] for row in sig_matrix], dtype=np.int32)
+        errors = np.array([vocab.get(s, -1) for s in vocab if s.startswith("!")], dtype=np.int32)
+        exp = np.array([vocab.get(s, -1) for s in expected], dtype=np.int32)
+        rows, labels, sizes = np.unique(ids, axis=0, return_inverse=True, return_counts=True)
+        labels = labels.reshape(-1)
+        passes = (rows[:, :n_doc] == exp).sum(axis=1)
+        valid = 1.0 - np.isin(rows, errors).mean(axis=1)
+        scores = sizes * (1 + passes) * valid
+        return labels.tolist(), scores.tolist(), passes.tolist(), sizes.tolist()
+
+    keys: Dict[tuple, int] = {}
+    labels = [keys.setdefault(tuple(row), len(keys)) for row in sig_matrix]
+    rows = list(keys)
+    sizes = [labels.count(c) for c in range(len(rows))]
+    passes = [sum(a == b for a, b in zip(r[:n_doc], expected)) for r in rows]
+    valid = [1.0 - sum(s.startswith("!") for s in r) / max(1, len(r)) for r in rows]
+    scores = [sizes[c] * (1 + passes[c]) * valid[c] for c in range(len(rows))]
+    return labels, scores, passes, sizes
+
+
+def rerank_task(problem: dict, completions: Sequence[str], n: int = N_INPUTS,
+                pool: Optional[ProcessPoolExecutor] = None) -> RerankResult:
+    """Pick one completion for a task by execution agreement on a shared input batch."""
+    prompt, entry = problem["prompt"], problem["entry_point"]
+    cases = docstring_cases(prompt, entry)
+    inputs = [args for args, _ in cases] + cached_inputs(problem["task_id"], prompt, entry, n=n)
+    # Completions are whole functions; keep the prompt for its imports and helpers
+    sources = [(str(i), prompt + "\n" + c) for i, c in enumerate(completions)]
+    sigs = execute_candidates(sources, entry, inputs, pool)
+    matrix = [sigs[name] for name, _ in sources]
+
+    labels, scores, passes, sizes = cluster_scores(matrix, [output_signature(e) for _, e in cases])
+    best = max(range(len(scores)), key=lambda c: (scores[c], -labels.index(c)))
+    pick = labels.index(best)
+    return RerankResult(problem["task_id"], completions[pick], pick, int(sizes[best]), len(completions),
+                        int(passes[best]), len(cases), float(scores[best]))
+
+
+def main():
+    in_path = sys.argv[1] if len(sys.argv) > 1 else "samples_custom_structured_gemma.jsonl"
+    out_path = sys.argv[2] if len(sys.argv) > 2 else in_path.replace(".jsonl", "") + "_top1.jsonl"
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    from datasets import load_dataset
+    problems = {ex["task_id"]: ex for ex in load_dataset("openai_humaneval")["test"]}
+
+    by_task: Dict[str, List[str]] = {}
+    with open(in_path) as f:
+        for line in f:
+            rec = json.loads(line)
+            by_task.setdefault(rec["task_id"], []).append(rec["completion"])
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        with open(out_path, "w") as out:
+            for task_id, completions in by_task.items():
+                t0 = time.perf_counter()
+                r = rerank_task(problems[task_id], completions, pool=pool)
+                ms = (time.perf_counter() - t0) * 1000
+                out.write(json.dumps(r.__dict__) + "\n")
+                print(f"{task_id}: picked #{r.index} (cluster {r.cluster_size}/{r.n_candidates}, "
+                      f"doctests {r.doctest_passes}/{r.n_doctests}) in {ms:.1f} ms")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"\nSaved: {out_path}")
+
+    # Top-1 is a single sample per task, so pass@1 is the only meaningful k
+    from human_eval.evaluation import evaluate_functional_correctness
+    print(evaluate_functional_correctness(out_path, n_workers=4, k=[1], timeout=7.0, ignore_incomplete=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse, glob, hashlib, json, os, re, sqlite3, time
+import xml.etree.ElementTree as ET
+from math import comb
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DB_PATH = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, sha TEXT NOT NULL, kind TEXT NOT NULL, rows INTEGER, ingested_at REAL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    file TEXT NOT NULL, kind TEXT NOT NULL,          -- 'samples' or 'results'
+    task_id TEXT NOT NULL, model TEXT, strategy TEXT, sample_idx INTEGER,
+    completion TEXT, result TEXT, passed INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_key ON samples (task_id, model, strategy, sample_idx);
+CREATE INDEX IF NOT EXISTS samples_cell ON samples (model, strategy, kind);
+-- covering index: pass@k reads only these narrow columns, never the completion/result text
+CREATE INDEX IF NOT EXISTS samples_passk ON samples (kind, model, strategy, task_id, passed);
+CREATE TABLE IF NOT EXISTS failures (
+    file TEXT NOT NULL, task_id TEXT NOT NULL, model TEXT, passed_before INTEGER, passed_now INTEGER,
+    entry_point TEXT, failed_assert_line TEXT, trace_tail TEXT
+);
+CREATE INDEX IF NOT EXISTS failures_task ON failures (task_id, model);
+CREATE TABLE IF NOT EXISTS requests (
+    file TEXT NOT NULL, request_id TEXT, title TEXT, body TEXT
+);
+CREATE TABLE IF NOT EXISTS junit (
+    file TEXT NOT NULL, classname TEXT, name TEXT, task_id TEXT, candidate TEXT,
+    outcome TEXT, message TEXT, time REAL
+);
+CREATE INDEX IF NOT EXISTS junit_task ON junit (task_id, candidate);
+CREATE TABLE IF NOT EXISTS coverage (
+    file TEXT NOT NULL, filename TEXT, task_id TEXT, candidate TEXT,
+    line INTEGER, hits INTEGER, branch INTEGER, cond_covered INTEGER, cond_total INTEGER
+);
+CREATE INDEX IF NOT EXISTS coverage_task ON coverage (task_id, candidate);
+"""
+
+DATA_TABLES = ("samples", "failures", "requests", "junit", "coverage")
+
+
+# --------- FILE CLASSIFICATION ----------
+def classify(path: str) -> Optional[str]:
+    name = Path(path).name
+    if name.endswith("_results.jsonl"):
+        return "results"
+    if name.startswith("samples_") and name.endswith(".jsonl"):
+        return "samples"
+    if name.endswith("fail_cases.jsonl"):
+        return "failures"
+    if name == "requests.jsonl":
+        return "requests"
+    if name.endswith(".xml"):
+        head = Path(path).open("rb").read(512)
+        if b"<coverage" in head:
+            return "coverage"
+        if b"<testsuite" in head:
+            return "junit"
+    return None
+
+
+def run_labels(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """(model, strategy) from names like samples_edit_structured_qwen.jsonl[_results.jsonl]."""
+    m = re.match(r"samples_(\w+?)_structured_(\w+?)\.jsonl", Path(path).name)
+    if m:
+        return m.group(2), m.group(1)
+    m = re.match(r"(\w+?)_fail_cases", Path(path).name)
+    return (m.group(1), None) if m else (None, None)
+
+
+def candidate_of(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """('HumanEval/20', '20__c3') from '20__c3', '20__c3.py' or 'test_x[20__c3]'."""
+    m = re.search(r"(\d+)__(c\d+)", text)
+    if not m:
+        return None, None
+    return f"HumanEval/{m.group(1)}", f"{m.group(1)}__{m.group(2)}"
+
+
+def discover() -> List[str]:
+    paths = glob.glob("results/*.jsonl") + glob.glob("*_results.jsonl") + glob.glob("*fail_cases.jsonl")
+    paths += [p for p in ("requests.jsonl",) if os.path.exists(p)]
+    paths += glob.glob("*.xml")
+    return sorted(set(paths))
+
+
+# human_eval keeps only str(exc) in "failed: ...", so the class is recovered from the message
+FAILURE_PATTERNS = [
+    ("SyntaxError", r"invalid syntax|unexpected (character|indent|EOF)|\(<string>, line \d+\)"),
+    ("NameError", r"name '\w+' is not defined"),
+    ("RecursionError", r"maximum recursion depth"),
+    ("Timeout", r"timed out"),
+    ("ValueError", r"not in list|empty|invalid literal"),
+    ("TypeError", r"unsupported operand|not (callable|subscriptable|iterable)|argument"),
+    ("IndexError", r"index out of range"),
+]
+
+
+def failure_class(result: Optional[str]) -> str:
+    """Exception class for a human_eval result string; bare or data-only messages are asserts."""
+    msg = (result or "").split("failed:", 1)[-1].strip()
+    for name, pat in FAILURE_PATTERNS:
+        if re.search(pat, msg):
+            return name
+    return "AssertionError"
+
+
+# --------- ROW READERS ----------
+def _jsonl(path: str) -> Iterable[dict]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _sample_rows(path: str, kind: str):
+    model, strategy = run_labels(path)
+    idx: Dict[str, int] = {}
+    for rec in _jsonl(path):
+        tid = rec["task_id"]
+        idx[tid] = idx.get(tid, -1) + 1
+        passed = rec.get("passed")
+        yield (path, kind, tid, model, strategy, idx[tid], rec.get("completion"), rec.get("result"),
+               None if passed is None else int(passed))
+
+
+def _failure_rows(path: str):
+    model, _ = run_labels(path)
+    for rec in _jsonl(path):
+        yield (path, rec["task_id"], model, int(bool(rec.get("passed_before"))), int(bool(rec.get("passed_now"))),
+               rec.get("entry_point"), rec.get("failed_assert_line"), rec.get("trace_tail"))
+
+
+def _request_rows(path: str):
+    for rec in _jsonl(path):
+        yield (path, rec.get("request_id"), rec.get("title"), rec.get("body"))
+
+
+def _junit_rows(path: str):
+    for _, el in ET.iterparse(path, events=("end",)):
+        if el.tag != "testcase":
+            continue
+        outcome, message = "passed", None
+        for child in el:
+            if child.tag in ("failure", "error", "skipped"):
+                outcome, message = child.tag, child.get("message")
+                break
+        tid, cand = candidate_of(el.get("name", ""))
+        yield (path, el.get("classname"), el.get("name"), tid, cand, outcome, message, float(el.get("time") or 0))
+        el.clear()
+
+
+def _coverage_rows(path: str):
+    for _, el in ET.iterparse(path, events=("end",)):
+        if el.tag != "class":
+            continue
+        filename = el.get("filename")
+        tid, cand = candidate_of(filename or "")
+        for line in el.iter("line"):
+            covered = total = None
+            m = re.search(r"\((\d+)/(\d+)\)", line.get("condition-coverage") or "")
+            if m:
+                covered, total = int(m.group(1)), int(m.group(2))
+            yield (path, filename, tid, cand, int(line.get("number")), int(line.get("hits")),
+                   int(line.get("branch") == "true"), covered, total)
+        el.clear()
+
+
+READERS = {
+    "samples": ("samples", 9, lambda p: _sample_rows(p, "samples")),
+    "results": ("samples", 9, lambda p: _sample_rows(p, "results")),
+    "failures": ("failures", 8, _failure_rows),
+    "requests": ("requests", 4, _request_rows),
+    "junit": ("junit", 8, _junit_rows),
+    "coverage": ("coverage", 9, _coverage_rows),
+}
+
+
+def file_sha(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# --------- STORE ----------
+class ResultsStore:
+    """
+    All run artefacts in one indexed SQLite file, keyed by task_id / model / strategy / sample.
+    Tables are row-oriented (stdlib sqlite3, not Parquet/DuckDB, so there is no new
+    dependency); the hot aggregate queries are answered from covering indexes instead.
+
+        store = ResultsStore()
+        store.ingest()                       # incremental: unchanged files are skipped
+        store.pass_at_k(1, model="qwen")     # {(model, strategy): pass@1}
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ingestion
+    def ingest(self, paths: Optional[List[str]] = None, verbose: bool = True) -> Dict[str, int]:
+        """
+        Load new or changed files; rows of a changed file are replaced, and rows of files that
+        no longer exist are dropped. Returns rows per loaded file.
+        """
+        done = {}
+        for (path,) in self.query("SELECT path FROM files"):
+            if not os.path.exists(path):
+                with self.db:
+                    for t in DATA_TABLES:
+                        self.db.execute(f"DELETE FROM {t} WHERE file = ?", (path,))
+                    self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                if verbose:
+                    print(f"🗑️ {path}: gone, rows removed")
+        for path in paths or discover():
+            kind = classify(path)
+            if kind is None:
+                continue
+            sha = file_sha(path)
+            row = self.db.execute("SELECT sha FROM files WHERE path = ?", (path,)).fetchone()
+            if row and row[0] == sha:
+                continue
+            table, width, reader = READERS[kind]
+            with self.db:
+                for t in DATA_TABLES:
+                    self.db.execute(f"DELETE FROM {t} WHERE file = ?", (path,))
+                cur = self.db.executemany(
+                    f"INSERT INTO {table} VALUES ({', '.join('?' * width)})", reader(path))
+                self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                (path, sha, kind, cur.rowcount, time.time()))
+            done[path] = cur.rowcount
+            if verbose:
+                print(f"📥 {path} ({kind}): {cur.rowcount} rows")
+        return done
+
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return self.db.execute(sql, params).fetchall()
+
+    # analyses
+    def pass_at_k(self, k: int, model: Optional[str] = None, strategy: Optional[str] = None
+                  ) -> Dict[Tuple[str, str], float]:
+        """
+        Unbiased pass@k (HumanEval estimator) per (model, strategy), from *_results.jsonl rows.
+        A cell is left out unless every one of its tasks has at least k samples, so each
+        reported value averages over all of the cell's tasks.
+        """
+        rows = self.query(
+            "SELECT model, strategy, task_id, COUNT(*), SUM(passed) FROM samples "
+            "WHERE kind = 'results' AND (? IS NULL OR model = ?) AND (? IS NULL OR strategy = ?) "
+            "GROUP BY model, strategy, task_id", (model, model, strategy, strategy))
+        per_cell: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        for m, s, _, n, c in rows:
+            per_cell.setdefault((m, s), []).append((n, c))
+        return {cell: sum(1.0 if n - c < k else 1.0 - comb(n - c, k) / comb(n, k) for n, c in v) / len(v)
+                for cell, v in per_cell.items() if min(n for n, _ in v) >= k}
+
+    def failure_breakdown(self, model: Optional[str] = None) -> List[Tuple[str, str, str, int]]:
+        """(model, strategy, error class, count) over failed samples, e.g. NameError, AssertionError."""
+        rows = self.query(
+            "SELECT model, strategy, result FROM samples WHERE kind = 'results' AND passed = 0 "
+            "AND (? IS NULL OR model = ?)", (model, model))
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for m, s, result in rows:
+            err = failure_class(result)
+            counts[(m, s, err)] = counts.get((m, s, err), 0) + 1
+        return sorted(((m, s, e, n) for (m, s, e), n in counts.items()), key=lambda r: -r[3])
+
+    def coverage_by_candidate(self) -> List[Tuple[str, str, float, float, str]]:
+        """(task_id, candidate, line rate, branch rate, test outcome) joining coverage with JUnit."""
+        return self.query("""
+            SELECT c.task_id, c.candidate,
+                   AVG(c.hits > 0),
+                   CAST(SUM(COALESCE(c.cond_covered, 0)) AS REAL) / NULLIF(SUM(COALESCE(c.cond_total, 0)), 0),
+                   j.outcome
+            FROM coverage c LEFT JOIN junit j ON j.candidate = c.candidate
+            WHERE c.candidate IS NOT NULL
+            GROUP BY c.task_id, c.candidate, j.outcome
+            ORDER BY c.task_id, c.candidate""")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest and query run results.")
+    ap.add_argument("command", choices=["ingest", "passk", "failures", "coverage", "sql"])
+    ap.add_argument("args", nargs="*", help="paths for ingest, SQL for sql")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--k", type=int, action="append", help="k for passk (repeatable, default 1 and 3)")
+    opts = ap.parse_intermixed_args()
+
+    store = ResultsStore(opts.db)
+    t0 = time.perf_counter()
+    if opts.command == "ingest":
+        done = store.ingest(opts.args or None)
+        print(f"Ingested {len(done)} changed file(s) into {opts.db}")
+    elif opts.command == "passk":
+        for k in opts.k or [1, 3]:
+            for (m, s), v in sorted(store.pass_at_k(k).items()):
+                print(f"pass@{k}  {m:<8} {s:<8} {v:.3f}")
+    elif opts.command == "failures":
+        for m, s, err, n in store.failure_breakdown():
+            print(f"{m:<8} {s:<8} {err:<20} {n}")
+    elif opts.command == "coverage":
+        for tid, cand, lr, br, outcome in store.coverage_by_candidate():
+            br_s = f"{br:.2f}" if br is not None else "  - "
+            print(f"{tid:<14} {cand:<8} lines {lr:.2f} branches {br_s} {outcome or '-'}")
+    else:
+        for row in store.query(" ".join(opts.args)):
+            print(row)
+    print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
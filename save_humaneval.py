@@ -1,30 +1,60 @@
-import json, re, sys
+import argparse, json, re
 from pathlib import Path
-from datasets import load_dataset
 
-IN_PATH = sys.argv[1] if len(sys.argv) > 1 else "/Users/ssethi/Documents/cot/results/samples_custom_structured_qwen.jsonl"
+from candidate_pack import DEFAULT_PACK, PackWriter
+
+DEFAULT_IN = "/Users/ssethi/Documents/cot/results/samples_custom_structured_qwen.jsonl"
 OUT_DIR = Path("generated_cot_qwen")
-OUT_DIR.mkdir(exist_ok=True)
-
-dataset = load_dataset("openai_humaneval")["test"]
-tests_by_id = {ex["task_id"]: ex["test"] for ex in dataset}
-
-by_task = {}
-with open(IN_PATH) as f:
-    for line in f:
-        rec = json.loads(line)
-        tid = rec["task_id"]
-        by_task.setdefault(tid, []).append(rec["completion"])
-
-manifest = []
-for tid, completions in by_task.items():
-    tid = tid.split('/')[1]
-    for i, code in enumerate(completions, 1):
-        if not re.search(r"^\s*def\s+\w+\s*\(", code):
-            continue
-        mod_path = OUT_DIR / f"{tid}__c{i}.py"
-        mod_path.write_text(code, encoding="utf-8")
-        manifest.append({"task_id": tid, "module": str(mod_path), "index": i})
-
-Path("generated_manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
-print(f"wrote {len(manifest)} generated modules into {OUT_DIR}/ and generated_manifest.json")
+MANIFEST = "generated_manifest_qwen.json"      # what test_humaneval.py / difftest.py / efficiency.py read
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stream a samples JSONL into a candidate pack and manifest.")
+    ap.add_argument("samples", nargs="?", default=DEFAULT_IN)
+    ap.add_argument("--pack", default=DEFAULT_PACK, help="archive to write (rewritten unless --append)")
+    ap.add_argument("--append", action="store_true",
+                    help="add to an existing pack; candidates it already holds for a task are skipped")
+    ap.add_argument("--manifest", default=MANIFEST)
+    ap.add_argument("--files", action="store_true", help=f"write one .py per candidate into {OUT_DIR}/ instead")
+    args = ap.parse_args()
+
+    # one line at a time; only the running per-task counters and manifest rows stay in memory
+    writer = None if args.files else PackWriter(args.pack, append=args.append)
+    if args.files:
+        OUT_DIR.mkdir(exist_ok=True)
+    counters, manifest = {}, []
+    with open(args.samples) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            tid = rec["task_id"].split('/')[1]
+            if tid not in counters:
+                counters[tid] = writer.next_index(tid) if writer else 1
+            i = counters[tid]
+            counters[tid] += 1
+            code = rec["completion"]
+            if not re.search(r"^\s*def\s+\w+\s*\(", code):
+                continue
+            mod_path = OUT_DIR / f"{tid}__c{i}.py"
+            if writer:
+                if not writer.add(mod_path.stem, code, tid, i):
+                    counters[tid] -= 1      # already packed under its old name; don't leave a gap
+            else:
+                mod_path.write_text(code, encoding="utf-8")
+                manifest.append({"task_id": tid, "module": str(mod_path), "index": i})
+    if writer:
+        writer.close()
+        # everything in the pack, including what an --append run found there already
+        for name, (_, _, tid, i) in sorted(writer.index.items(), key=lambda kv: kv[1][0]):
+            manifest.append({"task_id": tid, "module": str(OUT_DIR / f"{name}.py"), "index": i, "pack": args.pack})
+
+    order = {tid: n for n, tid in enumerate(dict.fromkeys(r["task_id"] for r in manifest))}
+    manifest.sort(key=lambda r: (order[r["task_id"]], r["index"]))
+    Path(args.manifest).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    where = f"{args.pack} ({len(writer.index)} in archive)" if writer else f"{OUT_DIR}/"
+    print(f"wrote {len(manifest)} generated modules into {where} and {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import argparse, ast, copy, json, re, signal, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from difftest import PREAMBLE, output_signature
+from input_gen import find_function
+from spec_oracle import SpecError, SpecOracle, load_specs_from_script
+
+LIBRARY_PATH = "spec_library.json"
+MAX_INPUTS = 200        # recorded test calls kept per task
+MAX_VARIANTS = 12       # mutants of the canonical solution tried per task
+MIN_KILL_RATE = 0.5     # share of behaviour-changing variants a spec must reject
+SPEC_BUDGET = 10.0      # seconds to validate one spec
+CALL_BUDGET = 1.0       # seconds for one call of the canonical solution or a variant
+
+
+@dataclass
+class SpecVerdict:
+    task_id: str
+    accepted: bool
+    reason: str                       # "ok" or why the spec was rejected
+    spec: str = ""
+    inputs: int = 0                   # test inputs the canonical solution was checked on
+    variants: int = 0                 # variants whose behaviour differs from the canonical one
+    killed: int = 0                   # of those, how many the spec rejects
+    source: str = "model"
+
+
+# --------- PROMPTS ----------
+def signature_and_description(prompt: str, entry_point: str) -> Tuple[str, str, List[str]]:
+    """`def` line, docstring without examples, and parameter names of a HumanEval prompt."""
+    fn = find_function(prompt, entry_point)
+    header = ast.unparse(fn).split("\n", 1)[0]
+    doc = ast.get_docstring(fn) or ""
+    desc = []
+    for line in doc.splitlines():
+        s = line.strip()
+        if s.startswith(">>>") or re.match(r"(for )?examples?:?$", s, flags=re.I):
+            break
+        desc.append(s)
+    return header, " ".join(x for x in desc if x), [a.arg for a in fn.args.args]
+
+
+def make_spec_prompt(backend, func_sign: str, nl_desc: str, params: List[str]) -> str:
+    names = ", ".join(f"`{p}`" for p in params) or "(no inputs)"
+    user = f"""
+Your task is to write ONLY *formal specifications* in the form of Python `assert`
+statements for the following function.
+
+This is NOT code generation, NOT test-case generation and NOT implementation.
+
+Rules:
+1. Refer to the function inputs ONLY by their parameter names: {names}.
+2. Refer to the function output ONLY as `result`.
+3. Write preconditions on the inputs and postconditions relating `result` to the inputs,
+   following the description exactly.
+4. DO NOT call the function, implement it, or invent constraints not in the description.
+5. DO NOT create helper variables or functions; comprehensions inside all()/any() are fine.
+6. DO NOT mutate data, print, or use randomness or timing.
+
+### Function Signature:
+{func_sign}
+
+### Natural Language Description:
+{nl_desc}
+
+Output ONLY raw Python assert statements, one per line: no text, comments or code fences.
+""".strip()
+    return backend.apply_chat_template([{"role": "user", "content": user}])
+
+
+def clean_spec(text: str) -> str:
+    """Keep the assert statements of a generation that parse; prose and fences are dropped."""
+    text = re.sub(r"```(?:python)?", "", text)
+    chunks, current = [], []
+    for line in text.splitlines():
+        if line.startswith("assert"):
+            if current:
+                chunks.append("\n".join(current))
+            current = [line.rstrip()]
+        elif current and (line.startswith((" ", "\t", ")", "]", "}")) or not line.strip()):
+            current.append(line.rstrip())
+        elif current:
+            chunks.append("\n".join(current))
+            current = []
+    if current:
+        chunks.append("\n".join(current))
+    kept = []
+    for chunk in chunks:
+        try:
+            if isinstance(ast.parse(chunk.strip()).body[0], ast.Assert):
+                kept.append(chunk.strip())
+        except SyntaxError:
+            continue
+    return "\n".join(kept)
+
+
+# --------- KNOWN-BAD VARIANTS ----------
+_SWAP_CMP = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt, ast.Eq: ast.NotEq, ast.NotEq: ast.Eq}
+_SWAP_BIN = {ast.Add: ast.Sub, ast.Sub: ast.Add, ast.Mult: ast.FloorDiv, ast.FloorDiv: ast.Mult}
+
+
+class _Mutate(ast.NodeTransformer):
+    """Applies the `target`-th single-point mutation (comparison, arithmetic, int constant, bool op)."""
+
+    def __init__(self, target: int):
+        self.target, self.seen = target, 0
+
+    def _hit(self) -> bool:
+        self.seen += 1
+        return self.seen - 1 == self.target
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if type(node.ops[0]) in _SWAP_CMP and self._hit():
+            node.ops[0] = _SWAP_CMP[type(node.ops[0])]()
+        return node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if type(node.op) in _SWAP_BIN and self._hit():
+            node.op = _SWAP_BIN[type(node.op)]()
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        if self._hit():
+            node.op = ast.Or() if isinstance(node.op, ast.And) else ast.And()
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, int) and not isinstance(node.value, bool) and self._hit():
+            return ast.copy_location(ast.Constant(node.value + 1), node)
+        return node
+
+
+def variants(prompt: str, canonical: str, entry_point: str, limit: int = MAX_VARIANTS) -> List[str]:
+    """Single-point mutants of the canonical entry point, spread over its mutation points."""
+    tree = ast.parse(prompt + canonical)
+    fn = next(n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == entry_point)
+    counter = _Mutate(-1)
+    counter.visit(copy.deepcopy(fn))
+    points = counter.seen
+    step = max(1, points // limit)
+    out = []
+    for target in range(0, points, step)[:limit]:
+        mutant = copy.deepcopy(tree)
+        idx = tree.body.index(fn)
+        mutant.body[idx] = _Mutate(target).visit(mutant.body[idx])
+        out.append(ast.unparse(ast.fix_missing_locations(mutant)))
+    return out
+
+
+# --------- VALIDATION (runs inside worker processes) ----------
+class _Budget(BaseException):
+    # not an Exception, so the `except Exception` around calls and the oracle cannot swallow it
+    pass
+
+
+_TIMEOUT = object()     # _run's result for a call that ran out of CALL_BUDGET
+
+
+def _on_alarm(signum, frame):
+    raise _Budget()
+
+
+def _load(code: str, entry_point: str):
+    ns: Dict[str, Any] = {}
+    exec(PREAMBLE + code, ns, ns)
+    return ns[entry_point]
+
+
+def record_test_inputs(problem: dict, limit: int = MAX_INPUTS) -> List[tuple]:
+    """Argument tuples the HumanEval check() passes to the canonical solution."""
+    fn = _load(problem["prompt"] + problem["canonical_solution"], problem["entry_point"])
+    calls: List[tuple] = []
+
+    def candidate(*args):
+        if len(calls) < limit:
+            calls.append(copy.deepcopy(args))
+        return fn(*args)
+    ns: Dict[str, Any] = {}
+    exec(problem["test"], ns, ns)
+    ns["check"](candidate)
+    return calls
+
+
+def _arm(deadline: float, cap: float = SPEC_BUDGET):
+    signal.setitimer(signal.ITIMER_REAL, max(min(cap, deadline - time.monotonic()), 1e-3))
+
+
+def _run(fn, args: tuple, deadline: float) -> Tuple[bool, Any]:
+    """One call under its own CALL_BUDGET; the spec's deadline is re-armed afterwards."""
+    _arm(deadline, CALL_BUDGET)
+    try:
+        return True, fn(*copy.deepcopy(args))
+    except _Budget:
+        if time.monotonic() >= deadline:
+            raise
+        return False, _TIMEOUT
+    except Exception as e:
+        return False, type(e).__name__
+    finally:
+        _arm(deadline)
+
+
+def validate_spec(job: Tuple[dict, str, str]) -> SpecVerdict:
+    """
+    Accept a spec if (1) it only names the function's parameters and `result`, (2) the
+    canonical solution satisfies it on every HumanEval test input, and (3) it rejects at
+    least MIN_KILL_RATE of the variants whose outputs differ from the canonical ones.
+    """
+    problem, spec, source = job
+    verdict = SpecVerdict(problem["task_id"], False, "", spec, source=source)
+    try:
+        oracle = SpecOracle(spec)
+    except SpecError as e:
+        verdict.reason = f"parse: {e}"
+        return verdict
+    _, _, params = signature_and_description(problem["prompt"], problem["entry_point"])
+    unknown = [n for n in oracle.inputs if n not in params]
+    if unknown:
+        verdict.reason = f"names: {', '.join(unknown)}"
+        return verdict
+
+    old = signal.signal(signal.SIGALRM, _on_alarm)
+    deadline = time.monotonic() + SPEC_BUDGET
+    _arm(deadline)
+    try:
+        inputs = record_test_inputs(problem)
+        ref = _load(problem["prompt"] + problem["canonical_solution"], problem["entry_point"])
+        expected = []
+        for args in inputs:
+            ok, result = _run(ref, args, deadline)
+            if result is _TIMEOUT:
+                verdict.reason = f"canonical timed out on {args!r}"[:300]
+                return verdict
+            expected.append(output_signature(result) if ok else f"raises {result}")
+            if ok and not oracle.check(dict(zip(params, args)), result).ok:
+                verdict.reason = f"canonical violates spec on {args!r}"[:300]
+                return verdict
+        verdict.inputs = len(inputs)
+        for code in variants(problem["prompt"], problem["canonical_solution"], problem["entry_point"]):
+            try:
+                bad = _load(code, problem["entry_point"])
+            except Exception:
+                continue
+            differs = caught = False
+            for args, exp in zip(inputs, expected):
+                ok, result = _run(bad, args, deadline)
+                if result is _TIMEOUT:
+                    differs = caught = False    # a hang says nothing about the spec; skip the variant
+                    break
+                if (output_signature(result) if ok else f"raises {result}") == exp:
+                    continue
+                differs = True
+                if not ok or not oracle.check(dict(zip(params, args)), result).ok:
+                    caught = True
+                    break
+            verdict.variants += differs
+            verdict.killed += caught
+    except _Budget:
+        verdict.reason = f"timeout after {SPEC_BUDGET}s"
+        return verdict
+    except Exception as e:
+        verdict.reason = f"error: {type(e).__name__}: {e}"[:300]
+        return verdict
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old)
+
+    if verdict.variants and verdict.killed / verdict.variants < MIN_KILL_RATE:
+        verdict.reason = f"too weak: rejects {verdict.killed}/{verdict.variants} bad variants"
+        return verdict
+    verdict.accepted, verdict.reason = True, "ok"
+    return verdict
+
+
+# --------- LIBRARY ----------
+def load_library(path: str = LIBRARY_PATH) -> Dict[str, dict]:
+    p = Path(path)
+    return json.loads(p.read_text())["specs"] if p.exists() else {}
+
+
+def save_library(specs: Dict[str, dict], path: str = LIBRARY_PATH):
+    """Specs keyed by task id (in HumanEval order) plus an entry point -> task id index."""
+    ordered = dict(sorted(specs.items(), key=lambda kv: int(kv[0].split("/")[-1])))
+    index = {rec["entry_point"]: tid for tid, rec in ordered.items()}
+    Path(path).write_text(json.dumps({"specs": ordered, "index": index}, indent=2))
+
+
+def library_specs(path: str = LIBRARY_PATH) -> Dict[str, str]:
+    """{task_id: assert block}, the same shape as assignment_3_test_gen.assertions_correct."""
+    return {tid: rec["spec"] for tid, rec in load_library(path).items()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate and validate assertion specs for HumanEval tasks in batches.")
+    ap.add_argument("--model", default="mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit")
+    ap.add_argument("--tasks", default=":", help="python slice over the 164 tasks")
+    ap.add_argument("--batch-size", type=int, default=16, help="tasks generated per plan")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--out", default=LIBRARY_PATH)
+    ap.add_argument("--manual", default="assignment_3_test_gen.py",
+                    help="script whose assertions_correct specs are validated too ('' to skip)")
+    ap.add_argument("--force", action="store_true", help="regenerate tasks already in the library")
+    args = ap.parse_args()
+
+    from backends import SamplingParams, get_backend
+    from datasets import load_dataset
+    from genplan import GenPlan
+    dataset = load_dataset("openai_humaneval")["test"]
+    problems = [dataset[i] for i in range(len(dataset))][slice(*[int(x) if x else None for x in args.tasks.split(":")])]
+    by_id = {p["task_id"]: p for p in problems}
+    library = {} if args.force else load_library(args.out)
+    backend = get_backend(args.model)
+    reasons: Counter = Counter()
+    t0 = time.perf_counter()
+
+    def collect(verdicts):
+        for v in verdicts:
+            reasons[v.reason.split(":")[0]] += 1
+            if v.accepted:
+                library[v.task_id] = {**asdict(v), "entry_point": by_id[v.task_id]["entry_point"],
+                                      "model": args.model if v.source == "model" else None}
+            print(f"{'✅' if v.accepted else '❌'} {v.task_id:<14} {v.reason}"
+                  + (f"  (kills {v.killed}/{v.variants})" if v.accepted and v.variants else ""))
+        save_library(library, args.out)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.manual:
+            manual = [(by_id[t], s, "manual") for t, s in load_specs_from_script(args.manual).items() if t in by_id]
+            collect(pool.map(validate_spec, manual))
+        todo = [p for p in problems if p["task_id"] not in library]
+        pending = None
+        for start in range(0, len(todo), args.batch_size):
+            batch = todo[start:start + args.batch_size]
+            plan = GenPlan(backend)
+            for p in batch:
+                sign, desc, params = signature_and_description(p["prompt"], p["entry_point"])
+                plan.add(make_spec_prompt(backend, sign, desc, params), SamplingParams(max_tokens=300, temperature=0.0))
+            specs = [clean_spec(text) for text in plan.run()]
+            # validation of this batch overlaps with generation of the next one
+            if pending is not None:
+                collect(pending)
+            pending = pool.map(validate_spec, [(p, s, "model") for p, s in zip(batch, specs)])
+        if pending is not None:
+            collect(pending)
+
+    print(f"\n📚 {len(library)} specs in {args.out} | {dict(reasons)} | {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import ast, builtins, sys, textwrap
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Optional: NumPy for vectorized quantified checks (falls back to plain Python)
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except Exception:
+    HAVE_NUMPY = False
+
+
+# Rows per block when a pairwise check is evaluated by broadcasting,
+# keeps the temporary at PAIR_BLOCK x n instead of n x n.
+PAIR_BLOCK = 1024
+
+_BUILTINS = set(dir(builtins))
+
+
+class SpecError(ValueError):
+    """The assertion block cannot be turned into a checker."""
+
+
+@dataclass
+class SpecResult:
+    ok: bool
+    failed: Optional[str] = None   # source of the first violated assert
+    error: Optional[str] = None    # exception raised while evaluating a check
+
+
+# --------- PARSING ----------
+def parse_assertions(block: str) -> List[ast.Assert]:
+    """
+    Parse an assert-only spec block (as produced by specs_1.py) into Assert nodes.
+    Stray non-assert statements are rejected; model outputs wrapped in fences are unwrapped.
+    """
+    text = textwrap.dedent(block.replace("```python", "").replace("```", "")).strip()
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as e:
+        raise SpecError(f"spec does not parse: {e}") from e
+    asserts = []
+    for node in tree.body:
+        if not isinstance(node, ast.Assert):
+            raise SpecError(f"line {node.lineno}: only assert statements are allowed")
+        asserts.append(node)
+    if not asserts:
+        raise SpecError("spec contains no assertions")
+    return asserts
+
+
+def spec_inputs(asserts: List[ast.Assert]) -> List[str]:
+    """Free names of the spec other than `result` and builtins, i.e. the function inputs."""
+    loaded, bound = [], set()
+    for a in asserts:
+        for node in ast.walk(a):
+            if isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Store):
+                    bound.add(node.id)
+                elif node.id not in loaded:
+                    loaded.append(node.id)
+    return [n for n in loaded if n not in bound and n != "result" and n not in _BUILTINS]
+
+
+# --------- VECTORIZED PAIR CHECKS ----------
+def _pair_loop(test: ast.expr) -> Optional[Tuple[ast.expr, str, str, ast.expr, List[ast.expr]]]:
+    """
+    Match `all(E for i in range(len(A)) for j in range(len(A)) if C...)`.
+    Returns (E, i, j, A, conditions) or None.
+    """
+    if not (isinstance(test, ast.Call) and isinstance(test.func, ast.Name) and test.func.id == "all"
+            and len(test.args) == 1 and isinstance(test.args[0], ast.GeneratorExp)):
+        return None
+    gen = test.args[0]
+    if len(gen.generators) != 2:
+        return None
+    names, arrays, conds = [], [], []
+    for comp in gen.generators:
+        it = comp.iter
+        if not (isinstance(comp.target, ast.Name) and isinstance(it, ast.Call)
+                and isinstance(it.func, ast.Name) and it.func.id == "range" and len(it.args) == 1):
+            return None
+        ln = it.args[0]
+        if not (isinstance(ln, ast.Call) and isinstance(ln.func, ast.Name) and ln.func.id == "len"
+                and len(ln.args) == 1):
+            return None
+        names.append(comp.target.id)
+        arrays.append(ln.args[0])
+        conds.extend(comp.ifs)
+    if ast.dump(arrays[0]) != ast.dump(arrays[1]):
+        return None
+    return gen.elt, names[0], names[1], arrays[0], conds
+
+
+def _uses(node: ast.AST, names: set) -> bool:
+    return any(isinstance(n, ast.Name) and n.id in names for n in ast.walk(node))
+
+
+def _is_item(node: ast.AST, array: ast.expr, var: str) -> bool:
+    return (isinstance(node, ast.Subscript) and ast.dump(node.value) == ast.dump(array)
+            and isinstance(node.slice, ast.Name) and node.slice.id == var)
+
+
+def _is_abs_gap(node: ast.AST, array: ast.expr, i: str, j: str) -> bool:
+    """abs(A[j] - A[i]) or abs(A[i] - A[j])."""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "abs"
+            and len(node.args) == 1 and isinstance(node.args[0], ast.BinOp)
+            and isinstance(node.args[0].op, ast.Sub)):
+        return False
+    d = node.args[0]
+    return ((_is_item(d.left, array, j) and _is_item(d.right, array, i))
+            or (_is_item(d.left, array, i) and _is_item(d.right, array, j)))
+
+
+def _distinct_pairs(conds: List[ast.expr], i: str, j: str) -> Optional[bool]:
+    """True for `if i != j`, False for no condition, None for anything else."""
+    if not conds:
+        return False
+    if len(conds) == 1:
+        c = conds[0]
+        if (isinstance(c, ast.Compare) and len(c.ops) == 1 and isinstance(c.ops[0], ast.NotEq)
+                and isinstance(c.left, ast.Name) and isinstance(c.comparators[0], ast.Name)
+                and {c.left.id, c.comparators[0].id} == {i, j}):
+            return True
+    return None
+
+
+class _PairRewriter(ast.NodeTransformer):
+    """A[i] -> _xi, A[j] -> _xj, abs -> _np.abs, so E evaluates on broadcast blocks."""
+
+    def __init__(self, array: ast.expr, i: str, j: str):
+        self.array, self.i, self.j = array, i, j
+
+    def visit_Subscript(self, node):
+        if _is_item(node, self.array, self.i):
+            return ast.copy_location(ast.Name("_xi", ast.Load()), node)
+        if _is_item(node, self.array, self.j):
+            return ast.copy_location(ast.Name("_xj", ast.Load()), node)
+        return self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id == "abs":
+            return ast.copy_location(
+                ast.Attribute(ast.Name("_np", ast.Load()), "abs", ast.Load()), node)
+        return node
+
+
+# Nodes the broadcast rewrite of E may contain: arithmetic and one comparison over _xi/_xj,
+# scalars and _np.abs. Anything else (min, len, round, and/or, if-else, `in`, chained
+# comparisons) would not broadcast, so such specs keep the plain Python check.
+_BROADCAST_NODES = (ast.Expression, ast.Compare, ast.BinOp, ast.UnaryOp, ast.Name, ast.Constant,
+                    ast.Subscript, ast.Attribute, ast.Call, ast.Load, ast.expr_context,
+                    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+                    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+_EXACT_INT = 2 ** 31    # int arrays stay int64; larger magnitudes could overflow differences or products
+
+
+def _broadcastable(node: ast.AST) -> bool:
+    for n in ast.walk(node):
+        if not isinstance(n, _BROADCAST_NODES):
+            return False
+        if isinstance(n, ast.Compare) and len(n.ops) != 1:
+            return False
+        if isinstance(n, ast.Call) and not (isinstance(n.func, ast.Attribute) and n.func.attr == "abs"
+                                            and isinstance(n.func.value, ast.Name) and n.func.value.id == "_np"):
+            return False
+        if isinstance(n, ast.Attribute) and not (isinstance(n.value, ast.Name) and n.value.id == "_np"):
+            return False
+    return True
+
+
+def _operands(node: ast.AST) -> List[ast.expr]:
+    """Outermost sub-expressions of a rewritten E that come from the environment (names, subscripts)."""
+    if isinstance(node, ast.Subscript) or (isinstance(node, ast.Name) and node.id not in ("_xi", "_xj", "_np")):
+        return [node]
+    return [o for child in ast.iter_child_nodes(node) for o in _operands(child)]
+
+
+def _numeric(values: Any) -> Optional["np.ndarray"]:
+    """
+    `values` as a 1-D int64 or float array, or None unless they are all plain numbers (no
+    str, None, lists) and ints are small enough to stay exact.
+    """
+    try:
+        a = np.asarray(values)
+    except (TypeError, ValueError):
+        return None
+    if a.ndim != 1 or a.dtype.kind not in "biuf":
+        return None
+    if a.dtype.kind == "f":
+        return a
+    a = a.astype(np.int64)      # bools too: numpy refuses to subtract bool arrays
+    return a if not a.size or int(np.abs(a).max()) < _EXACT_INT else None
+
+
+def _compile_pair_check(test: ast.expr) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """
+    Vectorized replacement for an all-pairs `all(...)` assertion, or None if the
+    shape is not recognised. Two tiers:
+    - `all(L <= abs(A[j] - A[i]) ... if i != j)` with L free of i/j reduces to the
+      minimum adjacent gap of sorted(A): O(n log n).
+    - any single comparison over A[i], A[j] is evaluated blockwise by broadcasting:
+      still O(n^2) work, but in NumPy and with O(PAIR_BLOCK * n) memory, if every node of
+      it broadcasts (see _BROADCAST_NODES).
+    Inputs that are not all numbers (e.g. strings), or a vectorized evaluation that raises,
+    take the plain Python check instead.
+    """
+    if not HAVE_NUMPY:
+        return None
+    m = _pair_loop(test)
+    if m is None:
+        return None
+    elt, i, j, array, conds = m
+    distinct = _distinct_pairs(conds, i, j)
+    if distinct is None or not isinstance(elt, ast.Compare) or len(elt.ops) != 1:
+        return None
+    arr_code = compile(ast.Expression(array), "<spec>", "eval")
+    test_code = compile(ast.Expression(test), "<spec>", "eval")
+
+    def python_check(env: Dict[str, Any]) -> bool:
+        return bool(eval(test_code, env))
+
+    op, lhs, rhs = elt.ops[0], elt.left, elt.comparators[0]
+    if (distinct and isinstance(op, (ast.LtE, ast.Lt)) and not _uses(lhs, {i, j})
+            and _is_abs_gap(rhs, array, i, j)):
+        lhs_code = compile(ast.Expression(lhs), "<spec>", "eval")
+        strict = isinstance(op, ast.Lt)
+
+        def min_gap_check(env: Dict[str, Any]) -> bool:
+            a = _numeric(eval(arr_code, env))
+            if a is None:
+                return python_check(env)
+            if a.size < 2:
+                return True
+            try:
+                gap = np.diff(np.sort(a)).min()
+                bound = eval(lhs_code, env)
+                return bool(bound < gap) if strict else bool(bound <= gap)
+            except Exception:
+                return python_check(env)
+        return min_gap_check
+
+    rewritten = _PairRewriter(array, i, j).visit(ast.parse(ast.unparse(elt), mode="eval"))
+    ast.fix_missing_locations(rewritten)
+    if _uses(rewritten, {i, j}):
+        return None  # index used outside a plain A[i]/A[j] lookup
+    if not _broadcastable(rewritten):
+        return None
+    elt_code = compile(rewritten, "<spec>", "eval")
+    # a list among them would broadcast elementwise where Python compares whole objects
+    operand_codes = [compile(ast.Expression(o), "<spec>", "eval") for o in _operands(rewritten.body)]
+
+    def scalar_operands(env: Dict[str, Any]) -> bool:
+        try:
+            return all(isinstance(eval(c, env), (int, float, np.number)) for c in operand_codes)
+        except Exception:
+            return False
+
+    def blockwise_check(env: Dict[str, Any]) -> bool:
+        a = _numeric(eval(arr_code, env))
+        if a is None or not scalar_operands(env):
+            return python_check(env)
+        try:
+            return _blocks(a, env)
+        except Exception:   # e.g. a free name bound to a list; the plain check decides
+            return python_check(env)
+
+    def _blocks(a: "np.ndarray", env: Dict[str, Any]) -> bool:
+        n = a.size
+        local = dict(env, _np=np, _xj=a[None, :])
+        for start in range(0, n, PAIR_BLOCK):
+            stop = min(start + PAIR_BLOCK, n)
+            local["_xi"] = a[start:stop, None]
+            ok = np.broadcast_to(eval(elt_code, local), (stop - start, n))
+            if distinct:
+                ok = ok.copy()
+                rows = np.arange(stop - start)
+                ok[rows, rows + start] = True
+            if not ok.all():
+                return False
+        return True
+    return blockwise_check
+
+
+# --------- ORACLE ----------
+class SpecOracle:
+    """
+    An assertion spec compiled once into a checker over (inputs, result).
+
+        oracle = SpecOracle(assertions_correct["HumanEval/20"])
+        oracle.check({"numbers": [1.0, 2.0, 2.2]}, (2.0, 2.2))
+    """
+
+    def __init__(self, block: str, vectorize: bool = True):
+        self.source = block
+        asserts = parse_assertions(block)
+        self.inputs = spec_inputs(asserts)
+        text = textwrap.dedent(block.replace("```python", "").replace("```", "")).strip()
+        self.checks: List[Tuple[str, Callable[[Dict[str, Any]], bool]]] = []
+        self.vectorized = 0
+        for a in asserts:
+            src = ast.get_source_segment(text, a) or ast.unparse(a)
+            fast = _compile_pair_check(a.test) if vectorize else None
+            if fast is not None:
+                self.vectorized += 1
+                self.checks.append((src, fast))
+            else:
+                code = compile(ast.Expression(a.test), "<spec>", "eval")
+                self.checks.append((src, lambda env, code=code: bool(eval(code, env))))
+
+    def check(self, inputs: Dict[str, Any], result: Any) -> SpecResult:
+        missing = [n for n in self.inputs if n not in inputs]
+        if missing:
+            raise SpecError(f"missing spec inputs: {', '.join(missing)}")
+        env = dict(inputs)
+        env["result"] = result
+        for src, fn in self.checks:
+            try:
+                if not fn(env):
+                    return SpecResult(False, failed=src)
+            except Exception as e:
+                return SpecResult(False, failed=src, error=f"{type(e).__name__}: {e}")
+        return SpecResult(True)
+
+    def check_batch(self, executions: Iterable[Tuple[Dict[str, Any], Any]]) -> List[SpecResult]:
+        """Check many (inputs, result) executions, e.g. every candidate on every input."""
+        return [self.check(inputs, result) for inputs, result in executions]
+
+    def check_candidate(self, fn: Callable, inputs_list: Iterable[Dict[str, Any]]) -> List[SpecResult]:
+        """Run `fn` on each input dict (keyword-less, in spec input order) and check its output."""
+        out = []
+        for inputs in inputs_list:
+            args = [inputs[n] for n in self.inputs]
+            try:
+                result = fn(*args)
+            except Exception as e:
+                out.append(SpecResult(False, error=f"{type(e).__name__}: {e}"))
+                continue
+            out.append(self.check(inputs, result))
+        return out
+
+
+def _literal_str(node: ast.expr) -> str:
+    """A string literal, optionally followed by `.strip()` as in assertions_correct."""
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ("strip", "lstrip", "rstrip") and not node.args):
+        return getattr(_literal_str(node.func.value), node.func.attr)()
+    return ast.literal_eval(node)
+
+
+def load_specs_from_script(path: str, name: str = "assertions_correct") -> Dict[str, str]:
+    """
+    Read a `{task_id: spec}` dict literal out of a script without importing it
+    (assignment_3_test_gen.py loads a model at import time).
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id == name):
+            if not isinstance(node.value, ast.Dict):
+                break
+            return {ast.literal_eval(k): _literal_str(v) for k, v in zip(node.value.keys, node.value.values)}
+    raise KeyError(f"{name} not found in {path}")
+
+
+if __name__ == "__main__":
+    specs = load_specs_from_script(sys.argv[1] if len(sys.argv) > 1 else "assignment_3_test_gen.py")
+    for tid, block in specs.items():
+        oracle = SpecOracle(block)
+        print(f"{tid}: {len(oracle.checks)} asserts over {oracle.inputs} "
+              f"({oracle.vectorized} vectorized)")
@@ -1,4 +1,4 @@
-from mlx_lm import load, generate
+from backends import SamplingParams, get_backend
 
 import importlib.util, json, re, types
 from pathlib import Path
@@ -8,7 +8,7 @@ from datasets import load_dataset
 # MODEL_ID = "mlx-community/gemma-2-2b-it-4bit"
 MODEL_ID = "mlx-community/Qwen2.5-Coder-1.5B-Instruct-4bit"
 
-model, tokenizer = load(MODEL_ID)
+backend = get_backend(MODEL_ID)
 
 
 
@@ -90,7 +90,7 @@ BEGIN OUTPUT NOW:
 
     '''.strip()
     messages = [{"role": "user", "content": prompt}]
-    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    return backend.apply_chat_template(messages)
 
 
 
@@ -105,13 +105,11 @@ func_sign = ['def find_closest_elements(numbers: List[float]) -> Tuple[float, fl
 nl_desc = ['From a supplied list of numbers (of length at least two), select and return two numbers that are the closest to each other and return them in order (smaller number, larger number).','Find the shortest palindrome that begins with a supplied string.The algorithm is: - Find the longest suffix of the input string that is already a palindrome. - Then append the reverse of the prefix that comes before this suffix.']
 
 
-prompt = make_prompt(func_sign[0], nl_desc[1])
+prompt = make_prompt(func_sign[1], nl_desc[1])   # the prompt's required assertions are make_palindrome's
 
-assertions = generate(
-            model,
-            tokenizer,
-            prompt=prompt,
-            max_tokens=300,
+assertions = backend.generate(
+            prompt,
+            SamplingParams(max_tokens=300, temperature=0.0),  # mlx_lm.generate default: greedy
         ).strip()
 
 
@@ -0,0 +1,183 @@
+import argparse, gc, json, os, time
+from collections import Counter
+from dataclasses import asdict, dataclass, field, replace
+from typing import Dict, List
+
+from backends import _INSTANCES, GenStats, get_backend
+from coordinator import STRATEGIES, model_label
+
+SWEEP_CONFIG = "sweep.json"
+
+
+@dataclass
+class SweepConfig:
+    models: List[str]
+    strategies: List[str] = field(default_factory=lambda: list(STRATEGIES))
+    modes: List[str] = field(default_factory=lambda: ["cot"])  # cot | capped | code | per-task
+    mode_by_task: Dict[str, str] = field(default_factory=dict)  # task_id -> mode, for "per-task"
+    n: int = 3                                  # completions per task and cell
+    tasks: str = ":"                            # python slice over the 164 tasks
+    sampling: Dict[str, float] = field(default_factory=dict)   # SamplingParams fields
+    k: List[int] = field(default_factory=lambda: [1, 3])
+    out_dir: str = "."
+
+
+@dataclass
+class Cell:
+    model: str
+    strategy: str
+    path: str
+    mode: str = "cot"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+    completions: int = 0
+    scores: Dict[str, float] = field(default_factory=dict)
+    solved: int = 0
+    tasks: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, cost: GenStats, seconds: float):
+        self.prompt_tokens += cost.prompt_tokens
+        self.completion_tokens += cost.completion_tokens
+        self.seconds += seconds
+
+
+def load_config(path: str) -> SweepConfig:
+    with open(path) as f:
+        return SweepConfig(**json.load(f))
+
+
+def task_slice(spec: str) -> slice:
+    return slice(*[int(x) if x else None for x in spec.split(":")])
+
+
+def _delta(after: GenStats, before: GenStats) -> GenStats:
+    return GenStats(after.requests - before.requests, after.prompt_tokens - before.prompt_tokens,
+                    after.completion_tokens - before.completion_tokens, after.seconds - before.seconds)
+
+
+def _continue(mhs, strategy: str, problem: dict, first, mode: str):
+    """Finish one strategy from the shared first draft."""
+    if first is None or strategy == "cot":
+        return first
+    if strategy == "edit":
+        return mhs.solve_with_self_edit(problem["prompt"], first=first, mode=mode)
+    return mhs.solve_with_self_debug(problem["prompt"], problem["test"], first=first, mode=mode)
+
+
+def _sample_path(cfg: SweepConfig, strategy: str, mode: str, model: str) -> str:
+    tag = strategy if mode == "cot" else f"{strategy}_{mode}"
+    return os.path.join(cfg.out_dir, f"samples_{tag}_structured_{model_label(model)}.jsonl")
+
+
+def run_sweep(cfg: SweepConfig) -> List[Cell]:
+    """
+    Models run one after another, each loaded once and released before the next.
+    Per (task, sample) the CoT draft is generated once and every strategy continues from
+    it (cot keeps it, edit reflects on it, custom debugs it), so strategies are compared on
+    the same drafts. Each cell is charged the draft's tokens and time as if run alone.
+    Generation modes (full CoT, capped reasoning, code-only, or per task from
+    mode_by_task) each get their own drafts and their own row of cells.
+    """
+    import mlx_humaneval_structured as mhs
+    from datasets import load_dataset
+    dataset = load_dataset("openai_humaneval")["test"]
+    problems = [dataset[i] for i in range(len(dataset))][task_slice(cfg.tasks)]
+    mhs.SAMPLING = replace(mhs.SAMPLING, **cfg.sampling)
+    mhs.GEN_MODE_BY_TASK = dict(cfg.mode_by_task)
+    os.makedirs(cfg.out_dir, exist_ok=True)
+
+    cells: List[Cell] = []
+    for model in cfg.models:
+        backend = get_backend(model)
+        mhs.MODEL_ID, mhs.backend = model, backend
+        row = {(m, s): Cell(model, s, _sample_path(cfg, s, m, model), m, tasks=len(problems))
+               for m in cfg.modes for s in cfg.strategies}
+        outs = {key: open(c.path, "w") for key, c in row.items()}
+        for idx, p in enumerate(problems, 1):
+            for m in cfg.modes:
+                mode = mhs.mode_for(p["task_id"]) if m == "per-task" else m
+                for _ in range(cfg.n):
+                    before, t0 = replace(backend.stats), time.perf_counter()
+                    first = mhs.generate_structured(mhs.make_cot_prompt(p["prompt"], mode), mode=mode)
+                    draft_cost, draft_secs = _delta(backend.stats, before), time.perf_counter() - t0
+                    for s in cfg.strategies:
+                        cell = row[m, s]
+                        before, t0 = replace(backend.stats), time.perf_counter()
+                        result = _continue(mhs, s, p, first, mode)
+                        cell.add(draft_cost, draft_secs)
+                        cell.add(_delta(backend.stats, before), time.perf_counter() - t0)
+                        if result:
+                            cell.completions += 1
+                            outs[m, s].write(json.dumps({"task_id": p["task_id"], "completion": result.code.strip() + "\n"}) + "\n")
+            for f in outs.values():
+                f.flush()
+            print(f"🧪 {model_label(model)} | task {idx}/{len(problems)}")
+        for f in outs.values():
+            f.close()
+        cells.extend(row.values())
+        _INSTANCES.pop((backend.name, model), None)   # release the model before loading the next
+        del backend
+        mhs.backend = None
+        gc.collect()
+    return cells
+
+
+def min_samples(path: str) -> int:
+    """Fewest completions any task has in a samples file; pass@k is only defined up to it."""
+    with open(path) as f:
+        per_task = Counter(json.loads(line)["task_id"] for line in f if line.strip())
+    return min(per_task.values(), default=0)
+
+
+def score(cells: List[Cell], k: List[int]):
+    from human_eval.evaluation import evaluate_functional_correctness
+    for cell in cells:
+        if not cell.completions:
+            continue
+        n = min_samples(cell.path)
+        cell.scores = {m: float(v) for m, v in evaluate_functional_correctness(
+            cell.path, n_workers=4, k=[x for x in k if x <= n],
+            timeout=7.0, ignore_incomplete=True).items()}
+        with open(cell.path + "_results.jsonl") as f:
+            cell.solved = len({r["task_id"] for r in map(json.loads, f) if r["passed"]})
+
+
+def table(cells: List[Cell], k: List[int]) -> str:
+    head = ["model", "mode", "strategy"] + [f"pass@{x}" for x in k] + ["solved", "tokens", "out tok", "wall s",
+                                                                       "s/task", "tok/solved"]
+    lines = ["| " + " | ".join(head) + " |", "|" + "---|" * len(head)]
+    for c in cells:
+        per_solved = f"{c.tokens / c.solved:.0f}" if c.solved else "-"
+        passk = [f"{c.scores[f'pass@{x}']:.3f}" if f"pass@{x}" in c.scores else "-" for x in k]
+        lines.append("| " + " | ".join([model_label(c.model), c.mode, c.strategy] + passk +
+                                       [f"{c.solved}/{c.tasks}", str(c.tokens), str(c.completion_tokens),
+                                        f"{c.seconds:.1f}", f"{c.seconds / max(1, c.tasks):.2f}", per_solved]) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a models × modes × strategies matrix and tabulate cost vs. accuracy.")
+    ap.add_argument("config", nargs="?", default=SWEEP_CONFIG)
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    t0 = time.perf_counter()
+    cells = run_sweep(cfg)
+    score(cells, cfg.k)
+    md = table(cells, cfg.k)
+    print("\n" + md)
+    with open(os.path.join(cfg.out_dir, "sweep_table.md"), "w") as f:
+        f.write(md + "\n")
+    with open(os.path.join(cfg.out_dir, "sweep_table.jsonl"), "w") as f:
+        for c in cells:
+            f.write(json.dumps({**asdict(c), "tokens": c.tokens}) + "\n")
+    print(f"⏱️ Sweep finished in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
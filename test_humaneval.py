@@ -1,19 +1,15 @@
-import importlib.util, json, re, types
+import json, re
 from pathlib import Path
 import pytest
 from datasets import load_dataset
 
+from candidate_pack import import_candidate, read_candidate
+from verify import VerificationError, static_verify
+
 MANIFEST = json.loads(Path("generated_manifest_qwen.json").read_text())
 dataset = load_dataset("openai_humaneval")["test"]
 TESTS = {ex["task_id"]: ex["test"] for ex in dataset}
 
-def load_module_from_path(path: str) -> types.ModuleType:
-    spec = importlib.util.spec_from_file_location(Path(path).stem, path)
-    mod = importlib.util.module_from_spec(spec)
-    assert spec.loader is not None
-    spec.loader.exec_module(mod)
-    return mod
-
 def find_first_function_name(src_text: str) -> str:
     m = re.search(r"^\s*def\s+(\w+)\s*\(", src_text, flags=re.M)
     assert m, "No function definition found"
@@ -21,14 +17,19 @@ def find_first_function_name(src_text: str) -> str:
 
 CASES = []
 for rec in MANIFEST:
-    p = Path(rec["module"])
-    src = p.read_text(encoding="utf-8")
+    src = read_candidate(rec)
     fn = find_first_function_name(src)
-    CASES.append(pytest.param(rec["task_id"], str(p), fn, id=f"{rec['task_id']}__c{rec['index']}"))
+    CASES.append(pytest.param(rec["task_id"], rec, fn, id=f"{rec['task_id']}__c{rec['index']}"))
+
+@pytest.mark.parametrize("task_id, rec, fn_name", CASES)
+def test_humaneval_candidate(task_id, rec, fn_name):
+    # Reject unparseable code and undefined names (e.g. `List`) without importing the module;
+    # the module is loaded as-is, so no typing preamble is assumed
+    verdict = static_verify(read_candidate(rec), context="")
+    if verdict is not None:
+        raise VerificationError(verdict)
 
-@pytest.mark.parametrize("task_id, module_path, fn_name", CASES)
-def test_humaneval_candidate(task_id, module_path, fn_name):
-    mod = load_module_from_path(module_path)
+    mod = import_candidate(rec)
     assert hasattr(mod, fn_name)
     target_fn = getattr(mod, fn_name)
 
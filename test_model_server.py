@@ -0,0 +1,89 @@
+import json, time
+from http.client import HTTPConnection
+
+import pytest
+
+from backends import _INSTANCES, OpenAIHTTPBackend, SamplingParams, StubBackend
+from model_server import serve
+
+TEXT = " ".join(f"w{i}" for i in range(400))
+
+
+def _fail(prompt):
+    raise RuntimeError("model fell over")
+
+
+@pytest.fixture
+def server():
+    # the registry loads models through get_backend, so seed its cache with stubs
+    _INSTANCES[("stub", "echo")] = StubBackend("echo", responses=[TEXT])
+    _INSTANCES[("stub", "slow")] = StubBackend("slow", responses=[TEXT], delay_per_token=0.01)
+    _INSTANCES[("stub", "broken")] = StubBackend("broken", responses=_fail)
+    srv = serve(port=0, backend="stub", default_model="echo")
+    yield srv
+    srv.shutdown()
+    for model in ("echo", "slow", "broken"):
+        _INSTANCES.pop(("stub", model), None)
+
+
+def _post(srv, payload: dict):
+    conn = HTTPConnection(*srv.server_address[:2], timeout=30)
+    conn.request("POST", "/v1/completions", body=json.dumps(payload), headers={"Content-Type": "application/json"})
+    return conn, conn.getresponse()
+
+
+def _client(srv, model: str) -> OpenAIHTTPBackend:
+    host, port = srv.server_address[:2]
+    return OpenAIHTTPBackend(model, base_url=f"http://{host}:{port}")
+
+
+def _stats(srv, model: str) -> dict:
+    return srv.RequestHandlerClass.registry.workers[model].stats()
+
+
+def test_completion(server):
+    conn, resp = _post(server, {"model": "echo", "prompt": "p", "max_tokens": 1000, "temperature": 0})
+    assert resp.status == 200
+    assert json.loads(resp.read())["choices"][0]["text"].split() == TEXT.split()
+    conn.close()
+
+
+def test_streaming_matches_completion(server):
+    params = SamplingParams(max_tokens=1000, temperature=0.0)
+    assert "".join(_client(server, "echo").stream("p", params)).split() == TEXT.split()
+
+
+def test_client_close_cancels_decoding(server):
+    stream = _client(server, "slow").stream("p", SamplingParams(max_tokens=1000, temperature=0.0))
+    for _, _ in zip(range(3), stream):
+        pass
+    stream.close()                  # an early stop, as stream_tests and the reasoning cap do
+    deadline = time.time() + 5
+    while _stats(server, "slow")["cancelled"] == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    stats = _stats(server, "slow")
+    assert stats["cancelled"] == 1 and stats["active"] == 0
+    assert stats["completion_tokens"] < 100
+
+
+def test_non_streaming_disconnect_cancels_decoding(server):
+    conn = HTTPConnection(*server.server_address[:2], timeout=30)
+    conn.request("POST", "/v1/completions", body=json.dumps({"model": "slow", "prompt": "p", "max_tokens": 1000}))
+    time.sleep(0.2)
+    conn.close()
+    deadline = time.time() + 5
+    while _stats(server, "slow")["cancelled"] == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert _stats(server, "slow")["cancelled"] == 1
+
+
+def test_backend_error_is_a_500(server):
+    conn, resp = _post(server, {"model": "broken", "prompt": "p", "max_tokens": 10})
+    assert resp.status == 500
+    assert "model fell over" in json.loads(resp.read())["error"]["message"]
+    conn.close()
+
+
+def test_backend_error_in_stream_raises(server):
+    with pytest.raises(RuntimeError, match="model fell over"):
+        "".join(_client(server, "broken").stream("p", SamplingParams(max_tokens=10)))
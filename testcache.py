@@ -0,0 +1,232 @@
+"""
+pytest execution cache: `pytest -p testcache --testcache [--junitxml=...] test_humaneval.py *_a3_tests.py`
+
+Each test's outcome is cached together with the files it read (its test module, the
+candidate module it imports or loads, anything else under the repo). On the next run a
+test whose recorded files all hash the same, under the same interpreter, is not executed:
+its reports (outcome, failure text, duration, captured output) are replayed, so terminal
+output and --junitxml stay complete. Data outside the repo (e.g. the HumanEval dataset
+cache) is not tracked; use --testcache-clear after changing it.
+"""
+import hashlib, json, sys, types
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+CACHE_PATH = ".cache/testcache.json"
+_IGNORED_DIRS = {".cache", ".git", ".pytest_cache", ".venv"}
+
+# open() / io.open_code() paths seen while a collector or test is running; the audit hook
+# stays installed for the process, so it only appends while something is recording
+_recording: List[Set[str]] = []
+
+
+def _audit(event: str, args: tuple):
+    if event == "open" and _recording and isinstance(args[0], str):
+        _recording[-1].add(args[0])
+
+
+class _Replayed:
+    """Stored failure text that junitxml/terminal reporting can use like a TerminalRepr."""
+
+    class _Crash:
+        def __init__(self, message: str):
+            self.message = message
+
+    def __init__(self, text: str, message: str):
+        self.text, self.reprcrash = text, self._Crash(message)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def toterminal(self, tw):
+        for line in self.text.splitlines():
+            tw.line(line)
+
+
+class TestCache:
+    __test__ = False   # not a test class, despite the name
+
+    def __init__(self, config):
+        self.root = Path(str(config.rootpath)).resolve()
+        self.path = self.root / CACHE_PATH
+        self.interpreter = sys.version
+        self.entries: Dict[str, dict] = {}
+        if self.path.exists() and not config.getoption("testcache_clear"):
+            data = json.loads(self.path.read_text())
+            if data.get("interpreter") == self.interpreter:
+                self.entries = data["tests"]
+        self.module_deps: Dict[str, Dict[str, Optional[str]]] = {}
+        self.reports: Dict[str, List[dict]] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._module: Dict[str, Tuple[str, str]] = {}    # test nodeid -> (module nodeid, test file)
+        self._fresh_ids: Set[str] = set()
+        self._next_run: Dict[str, object] = {}            # test nodeid -> next item that is not replayed
+        self._replaying = self._forwarding = False
+        self._executed: Set[str] = set()
+        self.replayed = self.ran = 0
+
+    # --------- DEPENDENCIES ----------
+    def _relative(self, raw: str) -> Optional[str]:
+        p = Path(raw)
+        if not p.is_absolute():
+            p = Path.cwd() / p
+        if p.suffix == ".pyc" and p.parent.name == "__pycache__":
+            # imports read the bytecode cache; depend on the source it was compiled from
+            p = p.parent.parent / (p.name.split(".")[0] + ".py")
+        try:
+            rel = p.resolve().relative_to(self.root)
+        except (ValueError, OSError):
+            return None
+        return None if rel.parts[0] in _IGNORED_DIRS else str(rel)
+
+    def _hash(self, rel: str) -> Optional[str]:
+        if rel not in self._hashes:
+            try:
+                self._hashes[rel] = hashlib.sha256((self.root / rel).read_bytes()).hexdigest()
+            except OSError:
+                self._hashes[rel] = None
+        return self._hashes[rel]
+
+    def _deps(self, raw: Set[str]) -> Dict[str, Optional[str]]:
+        rels = {r for r in map(self._relative, raw) if r}
+        return {r: self._hash(r) for r in sorted(rels)}
+
+    def _fresh(self, entry: dict) -> bool:
+        return all(self._hash(rel) == h for rel, h in entry["deps"].items())
+
+    # --------- HOOKS ----------
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_make_collect_report(self, collector):
+        if not isinstance(collector, pytest.Module):
+            yield
+            return
+        seen: Set[str] = {str(collector.path)}
+        _recording.append(seen)
+        try:
+            yield
+        finally:
+            _recording.pop()
+        try:
+            # modules it imported that were already loaded (so not read again) still count
+            seen.update(v.__file__ for v in vars(collector.obj).values()
+                        if isinstance(v, types.ModuleType) and getattr(v, "__file__", None))
+        except Exception:
+            pass
+        self.module_deps[collector.nodeid] = self._deps(seen)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        self._fresh_ids = {i.nodeid for i in items if i.nodeid in self.entries and self._fresh(self.entries[i.nodeid])}
+        nxt = None
+        for item in reversed(items):
+            module = item.getparent(pytest.Module)
+            self._module[item.nodeid] = (module.nodeid if module else "", str(item.path))
+            self._next_run[item.nodeid] = nxt
+            if item.nodeid not in self._fresh_ids:
+                nxt = item
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        if self._forwarding:
+            return None
+        if item.nodeid not in self._fresh_ids:
+            # fixtures are torn down against the next test that actually runs, not a replayed one
+            nxt = self._next_run.get(item.nodeid, nextitem)
+            if nxt is nextitem:
+                return None
+            self._forwarding = True
+            try:
+                item.ihook.pytest_runtest_protocol(item=item, nextitem=nxt)
+            finally:
+                self._forwarding = False
+            return True
+        entry = self.entries[item.nodeid]
+        self._replaying = True
+        item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        for rec in entry["reports"]:
+            longrepr = rec["longrepr"]
+            if rec["outcome"] == "failed" and longrepr is not None:
+                longrepr = _Replayed(longrepr, rec.get("message") or longrepr)
+            elif isinstance(longrepr, list):
+                longrepr = tuple(longrepr)
+            report = pytest.TestReport(item.nodeid, item.location, {k: 1 for k in item.keywords},
+                                       rec["outcome"], longrepr, rec["when"],
+                                       sections=[tuple(s) for s in rec["sections"]], duration=rec["duration"])
+            if "wasxfail" in rec:
+                report.wasxfail = rec["wasxfail"]
+            item.ihook.pytest_runtest_logreport(report=report)
+        item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+        self._replaying = False
+        self.replayed += 1
+        return True
+
+    def pytest_runtest_logstart(self, nodeid):
+        if not self._replaying:
+            _recording.append(set())
+
+    def pytest_runtest_logfinish(self, nodeid):
+        if self._replaying:
+            return
+        seen = _recording.pop()
+        reports = self.reports.pop(nodeid, [])
+        self.ran += 1
+        if any(r["outcome"] == "failed" and r["when"] != "call" for r in reports):
+            self.entries.pop(nodeid, None)    # setup/teardown errors are not cached
+            return
+        self._executed.add(nodeid)
+        module, path = self._module.get(nodeid, ("", None))
+        if path:
+            seen.add(path)
+        self.entries[nodeid] = {"module": module, "own": self._deps(seen), "reports": reports}
+
+    def pytest_runtest_logreport(self, report):
+        if self._replaying:
+            return
+        rec = {"when": report.when, "outcome": report.outcome, "duration": report.duration,
+               "sections": [list(s) for s in report.sections], "longrepr": None}
+        if report.longrepr is not None:
+            if isinstance(report.longrepr, tuple):
+                rec["longrepr"] = list(report.longrepr)
+            else:
+                rec["longrepr"] = str(report.longrepr)
+                crash = getattr(report.longrepr, "reprcrash", None)
+                rec["message"] = crash.message if crash is not None else None
+        if hasattr(report, "wasxfail"):
+            rec["wasxfail"] = report.wasxfail
+        self.reports.setdefault(report.nodeid, []).append(rec)
+
+    def pytest_sessionfinish(self, session):
+        """
+        A test depends on the files it read itself plus the files its module read at
+        collection that no test of that module read (e.g. the candidate imported at the top
+        of a *_a3_tests.py). test_humaneval.py reads every candidate at collection but each
+        test loads only its own, so each test ends up depending on one candidate.
+        """
+        claimed: Dict[str, Set[str]] = {}
+        for entry in self.entries.values():
+            claimed.setdefault(entry["module"], set()).update(entry["own"])
+        for nodeid in self._executed:
+            entry = self.entries[nodeid]
+            module = self.module_deps.get(entry["module"], {})
+            shared = {rel: h for rel, h in module.items() if rel not in claimed[entry["module"]]}
+            entry["deps"] = {**shared, **entry["own"]}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"interpreter": self.interpreter, "tests": self.entries}))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        terminalreporter.write_line(f"♻️ testcache: {self.replayed} replayed, {self.ran} executed ({CACHE_PATH})")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("testcache")
+    group.addoption("--testcache", action="store_true",
+                    help="replay cached outcomes of tests whose test/candidate files are unchanged")
+    group.addoption("--testcache-clear", action="store_true", help="ignore and overwrite the cache")
+
+
+def pytest_configure(config):
+    if config.getoption("testcache") or config.getoption("testcache_clear"):
+        sys.addaudithook(_audit)
+        config.pluginmanager.register(TestCache(config), "testcache-plugin")
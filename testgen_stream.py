@@ -0,0 +1,193 @@
+import ast, io, re, textwrap, tokenize
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from backends import Backend, SamplingParams
+
+# What the extractor did in this process (the test-generation scripts print it)
+STREAM_STATS: Counter = Counter()
+
+MAX_ROUNDS = 4          # generation windows of params.max_tokens while tests keep arriving
+
+_FENCE = re.compile(r"^\s*```")
+_TEST_DEF = re.compile(r"(async\s+)?def\s+test_\w*\s*\(")
+
+
+def _unclosed(lines: List[str]) -> bool:
+    """Do these lines end inside brackets or a triple-quoted string (so the next line continues them)?"""
+    try:
+        for _ in tokenize.generate_tokens(io.StringIO(textwrap.dedent("\n".join(lines)) + "\n").readline):
+            pass
+    except tokenize.TokenError:
+        return True
+    except SyntaxError:
+        pass
+    return False
+
+
+def assert_keys(source: str, rename: Optional[Dict[str, str]] = None) -> Set[str]:
+    """Normalized `assert` statements of some test code, e.g. HumanEval's with `candidate` renamed."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return set()
+    keys = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assert):
+            for n in ast.walk(node):
+                if rename and isinstance(n, ast.Name) and n.id in rename:
+                    n.id = rename[n.id]
+            keys.add(ast.unparse(node))
+    return keys
+
+
+class TestExtractor:
+    """
+    Pulls `def test_*` functions (with their decorators) out of generated text as it comes
+    in. A test is complete once a later line starts at or left of its `def` (the next test,
+    a decorator, prose, a closing fence) outside any open bracket or string, or the text ends. It is kept if it parses, asserts
+    something, and is new: not the same function body as a kept test, and not only asserts
+    that `seen` (existing tests) or kept tests already make. Clashing names get a suffix.
+    """
+    __test__ = False    # not a test class, despite the name
+
+    def __init__(self, seen: Iterable[str] = ()):
+        self.seen: Set[str] = set(seen)
+        self.tests: List[str] = []
+        self.rejected: Counter = Counter()
+        self._bodies: Set[str] = set()
+        self._names: Set[str] = set()
+        self._pending = ""              # last, unfinished line
+        self._decorators: List[str] = []
+        self._block: List[str] = []
+        self._indent = -1               # indentation of the open test's `def`; -1 if none is open
+
+    @property
+    def open(self) -> bool:
+        return self._indent >= 0
+
+    def feed(self, text: str) -> List[str]:
+        """Tests completed by this piece of text."""
+        *lines, self._pending = (self._pending + text).split("\n")
+        new: List[str] = []
+        for line in lines:
+            new.extend(self._line(line))
+        return new
+
+    def close(self) -> List[str]:
+        """End of text: the open test, if any, is complete."""
+        new = self._line(self._pending) if self._pending else []
+        self._pending = ""
+        return new + self._end()
+
+    def _line(self, line: str) -> List[str]:
+        if _FENCE.match(line):
+            self._decorators = []
+            return self._end()
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        new: List[str] = []
+        if self.open:
+            if not stripped or indent > self._indent or _unclosed(self._block):
+                self._block.append(line)
+                return new
+            new = self._end()
+        if stripped.startswith("@"):
+            self._decorators.append(line)
+        elif _TEST_DEF.match(stripped):
+            self._block, self._decorators, self._indent = self._decorators + [line], [], indent
+        elif stripped:
+            self._decorators = []       # imports, helpers or prose between tests
+        return new
+
+    def _end(self) -> List[str]:
+        if not self.open:
+            return []
+        source = textwrap.dedent("\n".join(self._block)).strip()
+        self._block, self._indent = [], -1
+        return [source] if self._keep(source) else []
+
+    def _keep(self, source: str) -> bool:
+        try:
+            fn = ast.parse(source).body[0]
+        except (SyntaxError, IndexError):
+            self.rejected["unparseable"] += 1
+            return False
+        asserts = assert_keys(source)
+        raises = any(isinstance(n, ast.Attribute) and n.attr == "raises" for n in ast.walk(fn))
+        if not asserts and not raises:
+            self.rejected["no_assert"] += 1
+            return False
+        name, fn.name = fn.name, "_"
+        body = ast.dump(fn)
+        if body in self._bodies or (asserts and asserts <= self.seen):
+            self.rejected["duplicate"] += 1
+            return False
+        self._bodies.add(body)
+        self.seen |= asserts
+        if name in self._names:
+            n = 2
+            while f"{name}_{n}" in self._names:
+                n += 1
+            source = re.sub(rf"\bdef\s+{name}\b", f"def {name}_{n}", source, count=1)
+            name = f"{name}_{n}"
+        self._names.add(name)
+        self.tests.append(source)
+        return True
+
+
+def extract_tests(text: str, seen: Iterable[str] = ()) -> List[str]:
+    """All new, complete tests in a finished generation."""
+    ex = TestExtractor(seen)
+    ex.feed(text)
+    ex.close()
+    return ex.tests
+
+
+def stream_tests(backend: Backend, prompt: str, want: int, params: Optional[SamplingParams] = None,
+                 seen: Iterable[str] = (), max_rounds: int = MAX_ROUNDS,
+                 logits_processors: Optional[list] = None) -> List[str]:
+    """
+    Generate until `want` new tests have arrived (the stream is closed right there) or the
+    model stops. A window that runs into params.max_tokens while tests are still arriving
+    (one completed in it, or one is open) continues from prompt + text so far, for up to
+    `max_rounds` windows, so the last test is not cut in half by the cap; a test still open
+    when the rounds run out is dropped.
+    """
+    params = params or SamplingParams(max_tokens=300, temperature=0.0)
+    ex = TestExtractor(seen)
+    text, done, at_cap = "", False, False
+    for n in range(max_rounds):
+        STREAM_STATS["continued"] += n > 0
+        window, pieces, got = "", 0, 0
+        stream = backend.stream(prompt + text, params, logits_processors)
+        for piece in stream:
+            window += piece
+            pieces += 1
+            got += len(ex.feed(piece))
+            if len(ex.tests) >= want:
+                stream.close()
+                STREAM_STATS["early_stops"] += 1
+                done = True
+                break
+        text += window
+        STREAM_STATS["windows"] += 1
+        if done:
+            break
+        at_cap = max(pieces, backend.count_tokens(window)) >= params.max_tokens
+        if not (at_cap and (got or ex.open)):
+            break
+    if at_cap and ex.open:
+        ex.rejected["truncated"] += 1     # out of rounds mid-test: it may well parse, but it is cut off
+    elif not done:
+        ex.close()
+    STREAM_STATS["tests"] += min(want, len(ex.tests))
+    STREAM_STATS.update({f"rejected_{k}": v for k, v in ex.rejected.items()})
+    return ex.tests[:want]
+
+
+def stream_summary() -> str:
+    rejected = {k[9:]: v for k, v in STREAM_STATS.items() if k.startswith("rejected_")}
+    return (f"{STREAM_STATS['tests']} tests from {STREAM_STATS['windows']} windows "
+            f"({STREAM_STATS['early_stops']} early stops, {STREAM_STATS['continued']} continued past the cap)"
+            + (f" | rejected {rejected}" if rejected else ""))